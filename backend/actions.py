@@ -1,9 +1,23 @@
 # backend/actions.py
-from typing import Dict, Any, List
+import itertools, os, queue, random, threading, time
+from typing import Dict, Any, List, Callable, Optional, Set
+
+# Simulated runners can be given latency and a failure rate so fan-out can be exercised
+# locally, e.g. ACTIONS_SIM_LATENCY_MS=50,400 ACTIONS_SIM_FAILURE_RATE=0.02.
+SIM_LATENCY_MS = tuple(float(x) for x in os.environ.get("ACTIONS_SIM_LATENCY_MS", "0,0").split(","))
+SIM_FAILURE_RATE = float(os.environ.get("ACTIONS_SIM_FAILURE_RATE", "0"))
+
+def _simulate(target: str):
+    lo, hi = SIM_LATENCY_MS[0], SIM_LATENCY_MS[-1]
+    if hi > 0:
+        time.sleep(random.uniform(lo, hi) / 1000.0)
+    if SIM_FAILURE_RATE and random.random() < SIM_FAILURE_RATE:
+        raise RuntimeError(f"[{target}] simulated failure")
 
 # Simulated action registry. Each action returns a list of "commands/output"
 def clear_spooler(params: Dict[str, Any]) -> List[str]:
     target = params.get("printer", "PRN-01")
+    _simulate(target)
     return [
         f"[{target}] net stop spooler",
         f"[{target}] del %SystemRoot%\\System32\\spool\\PRINTERS\\* /Q",
@@ -13,20 +27,123 @@ def clear_spooler(params: Dict[str, Any]) -> List[str]:
 
 def restart_service(params: Dict[str, Any]) -> List[str]:
     svc = params.get("service", "SomeService")
-    return [f"sc stop {svc}", f"sc start {svc}", f"[SIMULATION] {svc} restarted."]
+    host = params.get("host")
+    _simulate(host or svc)
+    pre = f"[{host}] " if host else ""
+    return [f"{pre}sc stop {svc}", f"{pre}sc start {svc}", f"[SIMULATION] {svc} restarted{' on ' + host if host else ''}."]
 
 def unlock_user(params: Dict[str, Any]) -> List[str]:
     user = params.get("user", "tech2345")
+    _simulate(user)
     return [f"[SIMULATION] Unlocked user {user} in directory."]
 
 REGISTRY = {
-    "clear_spooler": {"title":"Clear Spooler","runner": clear_spooler},
-    "restart_service": {"title":"Restart Service","runner": restart_service},
-    "unlock_user": {"title":"Unlock User","runner": unlock_user},
+    "clear_spooler": {"title":"Clear Spooler","runner": clear_spooler, "target": "printer"},
+    "restart_service": {"title":"Restart Service","runner": restart_service, "target": "host"},
+    "unlock_user": {"title":"Unlock User","runner": unlock_user, "target": "user"},
 }
 
 def run_action(action_id: str, params: Dict[str, Any]) -> List[str]:
     act = REGISTRY.get(action_id)
     if not act:
         return ["[ERROR] Unknown action"]
-    return act["runner"](params or {})
\ No newline at end of file
+    return act["runner"](params or {})
+
+# ------------- Fan-out -------------
+def expand(action_id: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One job per combination of list-valued params: {"printer": ["P1", "P2"]} -> two jobs."""
+    params = params or {}
+    keys = [k for k, v in params.items() if isinstance(v, list)]
+    if not keys:
+        return [params]
+    return [dict(params, **dict(zip(keys, combo))) for combo in itertools.product(*(params[k] for k in keys))]
+
+def target_of(action_id: str, params: Dict[str, Any]) -> str:
+    key = REGISTRY.get(action_id, {}).get("target")
+    if key and key in params:
+        return str(params[key])
+    return ",".join(f"{k}={v}" for k, v in params.items()) or action_id
+
+class RateLimiter:
+    """Token bucket: `rate` starts per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.ts = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+def fan_out(action_id: str, targets: List[Dict[str, Any]], on_result: Callable[[Dict[str, Any]], None],
+            runner: Callable[[str, Dict[str, Any]], List[str]] = run_action, concurrency: int = 16,
+            timeout: float = 30.0, rate: Optional[float] = None) -> Dict[str, int]:
+    """Run action_id once per target params on at most `concurrency` threads, at most `rate`
+    starts per second. on_result gets {"target", "status" (ok|failed|timeout), "logs", "ms"}
+    as each target finishes. A target that overruns `timeout` (counted from its start) is
+    reported and abandoned; its thread is not interrupted and keeps its slot until it
+    returns. Once every slot is held by an abandoned runner the remaining targets fail."""
+    counts = {"ok": 0, "failed": 0, "timeout": 0}
+    if not targets:
+        return counts
+    bucket = RateLimiter(rate) if rate else None
+    finished: "queue.Queue" = queue.Queue()
+    started: Dict[int, float] = {}
+    pending: Set[int] = set()  # running and still awaited
+    live: Set[int] = set()     # running, awaited or abandoned: each holds a slot
+
+    def run(i: int):
+        try:
+            finished.put((i, "ok", runner(action_id, targets[i])))
+        except Exception as e:
+            finished.put((i, "failed", [f"[ERROR] {type(e).__name__}: {e}"]))
+
+    def report(i: int, status: str, logs: List[str]):
+        counts[status] += 1
+        ms = round((time.monotonic() - started.get(i, time.monotonic())) * 1000, 1)
+        on_result({"target": target_of(action_id, targets[i]), "status": status, "logs": logs, "ms": ms})
+
+    nxt = 0
+    while nxt < len(targets) or pending:
+        while nxt < len(targets) and len(live) < concurrency and (bucket is None or bucket.take()):
+            started[nxt] = time.monotonic()
+            pending.add(nxt)
+            live.add(nxt)
+            threading.Thread(target=run, args=(nxt,), name=f"action-{action_id}-{nxt}", daemon=True).start()
+            nxt += 1
+        if nxt < len(targets) and not pending and len(live) >= concurrency:
+            for i in range(nxt, len(targets)):
+                report(i, "failed", [f"[ERROR] not started: all {concurrency} runners are stuck after timing out"])
+            break
+        now = time.monotonic()
+        waits = [started[i] + timeout - now for i in pending]
+        if bucket is not None and nxt < len(targets) and len(live) < concurrency:
+            waits.append(bucket.wait_time())
+        got = []
+        try:
+            got.append(finished.get(timeout=max(0.0, min(waits)) if waits else None))
+            while True:
+                got.append(finished.get_nowait())
+        except queue.Empty:
+            pass
+        for i, status, logs in got:
+            live.discard(i)
+            if i in pending:  # else it had been reported as a timeout already
+                pending.discard(i)
+                report(i, status, logs)
+        now = time.monotonic()
+        for i in sorted(pending):
+            if now - started[i] > timeout:
+                pending.discard(i)
+                report(i, "timeout", [f"[TIMEOUT] no result after {timeout:g}s"])
+    return counts
@@ -0,0 +1,246 @@
+# backend/admission.py
+import asyncio, heapq, itertools, json, math, os, time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ENABLED = os.environ.get("TICKETPILOT_ADMISSION", "1") != "0"
+SLOTS = int(os.environ.get("TICKETPILOT_ADMISSION_SLOTS", "32"))  # requests in the app at once (threadpool is 40)
+MAX_QUEUE = int(os.environ.get("TICKETPILOT_ADMISSION_QUEUE", "256"))
+# peers whose X-Forwarded-For is believed (the dev proxy); anyone else is keyed by their own address
+TRUSTED_PROXIES = {a.strip() for a in os.environ.get("TICKETPILOT_TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if a.strip()}
+
+# rate/s and burst per caller, and for the endpoint class as a whole (agents and admins skip both)
+USER_LIMITS = {"create": (1.0, 10), "triage": (2.0, 20), "read": (20.0, 100), "write": (5.0, 30)}
+ENDPOINT_LIMITS = {"create": (20.0, 100), "triage": (50.0, 200), "read": (2000.0, 4000), "write": (200.0, 400)}
+# most slots a class may hold at once, so a storm of slow writes cannot take them all (staff are not capped)
+CLASS_SLOTS = {"create": 8, "triage": 12, "write": 12}
+# queue priority (lower first) and the longest a request of that priority may wait for a slot
+STAFF, URGENT, READ, OTHER = 0, 1, 2, 3
+TARGETS = {STAFF: 5.0, URGENT: 5.0, READ: 2.0, OTHER: 1.0}
+STAFF_ROLES = {"agent", "admin"}
+
+def endpoint_class(method: str, path: str) -> str:
+    if method == "POST" and path.rstrip("/") == "/api/tickets":
+        return "create"
+    if method == "POST" and path.rstrip("/") == "/api/triage":
+        return "triage"
+    return "read" if method in ("GET", "HEAD") else "write"
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "ts")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate, self.burst, self.tokens, self.ts = rate, burst, float(burst), time.monotonic()
+
+    def take(self, now: float) -> float:
+        """0 if a token was taken, else the seconds until one will be available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class Admission:
+    """Admission control in front of the (sync, threadpool-bound) API: token buckets per
+    caller and per endpoint class, then at most `slots` requests in the app at once, and at
+    most CLASS_SLOTS of one class. The rest wait in a bounded priority queue (agents/admins,
+    then urgent creates, then reads, then everything else). A request is turned away at
+    once, with Retry-After, when its bucket is empty (429) or when the queue ahead of it is
+    longer than its latency target (503)."""
+
+    def __init__(self, slots: int = SLOTS, max_queue: int = MAX_QUEUE, max_callers: int = 50_000):
+        self.slots = slots
+        self.max_queue = max_queue
+        self.max_callers = max_callers
+        self.busy = 0
+        self.running: Dict[str, int] = {}
+        self.service_time: Dict[str, float] = {}  # EWMA of time in the app per class, seconds
+        self._waiting: List[Tuple[int, int, str, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._users: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._endpoints = {cls: TokenBucket(*lim) for cls, lim in ENDPOINT_LIMITS.items()}
+        self.stats: Dict[str, Any] = {"admitted": {}, "shed": {}, "queued": 0, "wait_s": 0.0, "max_wait_s": 0.0}
+
+    def _count(self, kind: str, key: str):
+        self.stats[kind][key] = self.stats[kind].get(key, 0) + 1
+
+    def shed(self, reason: str, cls: str, retry: float) -> Tuple[int, float]:
+        self._count("shed", f"{reason}/{cls}")
+        return (429 if reason == "rate_limited" else 503), retry
+
+    # ---- token buckets ----
+    def limit(self, user: str, cls: str, now: float) -> float:
+        """0 if within the caller's and the endpoint's rates, else the seconds to wait."""
+        b = self._users.get((user, cls))
+        if b is None:
+            b = self._users[(user, cls)] = TokenBucket(*USER_LIMITS[cls])
+            if len(self._users) > self.max_callers:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end((user, cls))
+        wait = b.take(now)
+        return wait or self._endpoints[cls].take(now)
+
+    # ---- slots ----
+    def _cap(self, prio: int, cls: str) -> int:
+        return self.slots if prio == STAFF else min(self.slots, CLASS_SLOTS.get(cls, self.slots))
+
+    def _fits(self, prio: int, cls: str) -> bool:
+        return self.busy < self.slots and self.running.get(cls, 0) < self._cap(prio, cls)
+
+    def _take(self, cls: str):
+        self.busy += 1
+        self.running[cls] = self.running.get(cls, 0) + 1
+        self._count("admitted", cls)
+
+    async def acquire(self, prio: int, cls: str) -> Optional[Tuple[int, float]]:
+        """None once a slot is held (release() it), else (status, retry_after)."""
+        if self._fits(prio, cls):  # waiters never fit (release() grants those that do), so none is passed over
+            self._take(cls)
+            return None
+        ahead = sum(1 for p, _, c, f in self._waiting if p <= prio and (c == cls or p < prio) and not f.done())
+        target = TARGETS[prio]
+        expected = (ahead + 1) * self.service_time.get(cls, 0.05) / self._cap(prio, cls)
+        if expected > target:
+            return self.shed("overloaded", cls, expected)
+        if len(self._waiting) >= self.max_queue:
+            self._waiting = [w for w in self._waiting if not w[3].done()]  # drop waiters that already left
+            heapq.heapify(self._waiting)
+        if len(self._waiting) >= self.max_queue:
+            worst = max(self._waiting)
+            if worst[0] <= prio:
+                return self.shed("queue_full", cls, expected)
+            self._waiting.remove(worst)  # make room by dropping the least important waiter
+            heapq.heapify(self._waiting)
+            worst[3].set_result(False)
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (prio, next(self._seq), cls, fut))
+        self.stats["queued"] += 1
+        t0 = time.monotonic()
+        try:
+            await asyncio.wait({fut}, timeout=target)
+        except asyncio.CancelledError:  # client went away; hand the slot on if it was already ours
+            if fut.done() and not fut.cancelled() and fut.result():
+                self.release(cls)
+            fut.cancel()
+            raise
+        waited = time.monotonic() - t0
+        self.stats["wait_s"] += waited
+        self.stats["max_wait_s"] = max(self.stats["max_wait_s"], waited)
+        if not fut.done():
+            fut.cancel()
+            return self.shed("timeout", cls, expected)
+        return None if fut.result() else self.shed("queue_full", cls, expected)
+
+    def release(self, cls: str, elapsed: Optional[float] = None):
+        if elapsed is not None:
+            st = self.service_time.get(cls, elapsed)
+            self.service_time[cls] = st + 0.1 * (elapsed - st)
+        self.busy -= 1
+        self.running[cls] -= 1
+        if not self._waiting:
+            return
+        keep = []
+        for w in sorted(self._waiting):  # best first; grant every waiter that now fits
+            prio, _, c, fut = w
+            if fut.done():
+                continue
+            if self._fits(prio, c):
+                self._take(c)
+                fut.set_result(True)
+            else:
+                keep.append(w)
+        self._waiting = keep  # sorted, so still a heap
+
+    def status(self) -> Dict[str, Any]:
+        return dict(self.stats, busy=self.busy, slots=self.slots, running=dict(self.running),
+                    waiting=sum(1 for *_, f in self._waiting if not f.done()),
+                    service_time_ms={c: round(t * 1000, 2) for c, t in self.service_time.items()}, callers=len(self._users))
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an Admission to /api requests. `session_of(token)` gives the
+    (username, role) behind a bearer token the server issued, or None; callers without one
+    are keyed by address. `urgent(payload)` says whether a ticket create is P1/P2 (the body
+    is read here for creates only, and replayed to the app)."""
+
+    def __init__(self, app, admission: Admission, session_of: Callable[[str], Optional[Tuple[str, Optional[str]]]],
+                 urgent: Callable[[Dict[str, Any]], bool]):
+        self.app = app
+        self.admission = admission
+        self.session_of = session_of
+        self.urgent = urgent
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/") or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        adm = self.admission
+        cls = endpoint_class(scope["method"], scope["path"])
+        token = _bearer(scope)
+        session = self.session_of(token) if token else None
+        user = f"user:{session[0]}" if session else f"addr:{_address(scope)}"
+        staff = session is not None and (session[1] or "") in STAFF_ROLES
+        if not staff:
+            wait = adm.limit(user, cls, time.monotonic())
+            if wait:
+                return await _reject(send, *adm.shed("rate_limited", cls, wait))
+        prio = STAFF if staff else READ if cls == "read" else OTHER
+        if cls == "create" and not staff:
+            body, receive = await _buffer(receive)
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                payload = {}
+            if isinstance(payload, dict) and self.urgent(payload):
+                prio = URGENT
+        denied = await adm.acquire(prio, cls)
+        if denied:
+            return await _reject(send, *denied)
+        t0 = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            adm.release(cls, time.monotonic() - t0)
+
+def _bearer(scope) -> Optional[str]:
+    for k, v in scope.get("headers", ()):
+        if k == b"authorization":
+            scheme, _, tok = v.decode("latin-1").partition(" ")
+            return (tok.strip() or None) if scheme.lower() == "bearer" else None
+    return None
+
+def _address(scope) -> str:
+    """The client address; behind a trusted proxy, the hop it appended to X-Forwarded-For."""
+    client = scope.get("client")
+    peer = client[0] if client else "-"
+    if peer in TRUSTED_PROXIES:
+        for k, v in scope.get("headers", ()):
+            if k == b"x-forwarded-for":
+                return v.decode("latin-1").rsplit(",", 1)[-1].strip() or peer
+    return peer
+
+async def _buffer(receive) -> Tuple[bytes, Callable]:
+    chunks, more = [], True
+    while more:
+        msg = await receive()
+        if msg["type"] != "http.request":
+            break
+        chunks.append(msg.get("body", b""))
+        more = msg.get("more_body", False)
+    body = b"".join(chunks)
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+    return body, replay
+
+async def _reject(send, status: int, retry_after: float):
+    body = json.dumps({"ok": False, "error": "rate_limited" if status == 429 else "overloaded"}).encode()
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                            (b"retry-after", str(max(1, math.ceil(retry_after))).encode())]})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,181 @@
+# backend/archive.py
+import heapq, re, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+import partitions, snapshot
+
+BLOCK = 10_000  # tickets per compressed block: a lookup decompresses one block, not a segment
+_SEG = re.compile(r"seg-(\d+)" + re.escape(snapshot.SUFFIX) + "$")
+
+def _counts(tickets: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    out: Dict[str, Dict[str, int]] = {"service": {}, "priority": {}, "status": {}}
+    for t in tickets:
+        for field, dflt in (("service", "Unknown"), ("priority", "P3"), ("status", "open")):
+            key = t.get(field) or dflt
+            out[field][key] = out[field].get(key, 0) + 1
+    return out
+
+class ArchiveStore:
+    """Cold tier: closed tickets moved out of the working set into immutable, append-only
+    segment files (the snapshot container). A segment holds its id column, its tickets in
+    blocks and its own fitted similarity index. Loading reads only manifests and id columns;
+    blocks and indexes are decompressed on first use and kept in small LRU caches."""
+
+    def __init__(self, root: Path, blocks: int = 16, indexes: int = 8):
+        self.root = root
+        self.max_blocks = blocks
+        self.max_indexes = indexes
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self, names: Optional[List[str]] = None):
+        """Open every segment in root (or only `names`)."""
+        self.segments: List[Dict[str, Any]] = []
+        for p in sorted(self.root.glob("seg-*" + snapshot.SUFFIX)):
+            if _SEG.search(p.name) and (names is None or p.name in names):
+                man = snapshot.read_manifest(p)
+                ids = np.frombuffer(snapshot.read_section(p, "ids", man), dtype=np.int64)
+                self.segments.append({"name": p.name, "path": p, "manifest": man, "meta": man["meta"], "ids": ids})
+        self._blocks: OrderedDict = OrderedDict()
+        self._indexes: OrderedDict = OrderedDict()
+        self._reindex()
+
+    def _reindex(self):
+        ids = [s["ids"] for s in self.segments]
+        seg = [np.full(len(s["ids"]), i, dtype=np.int32) for i, s in enumerate(self.segments)]
+        pos = [np.arange(len(s["ids"]), dtype=np.int32) for s in self.segments]
+        all_ids = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+        order = np.argsort(all_ids, kind="stable")
+        self._ids = all_ids[order]
+        self._seg = np.concatenate(seg)[order] if seg else np.zeros(0, dtype=np.int32)
+        self._pos = np.concatenate(pos)[order] if pos else np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @property
+    def max_id(self) -> int:
+        return int(self._ids[-1]) if len(self._ids) else 0
+
+    def names(self) -> List[str]:
+        return [s["name"] for s in self.segments]
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        if not len(self._ids):
+            return np.zeros(len(ids), dtype=bool)
+        i = np.minimum(np.searchsorted(self._ids, ids), len(self._ids) - 1)
+        return self._ids[i] == ids
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """service / priority / status counts over all segments, from the manifests."""
+        out: Dict[str, Dict[str, int]] = {"service": {}, "priority": {}, "status": {}}
+        for s in self.segments:
+            for field, c in s["meta"]["counts"].items():
+                for k, n in c.items():
+                    out[field][k] = out[field].get(k, 0) + n
+        return out
+
+    # ---- lazy reads ----
+    def _cached(self, cache: OrderedDict, cap: int, key: Tuple[str, Any], read: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        val = read()
+        with self._lock:
+            cache[key] = val
+            while len(cache) > cap:
+                cache.popitem(last=False)
+        return val
+
+    def _block(self, seg: Dict[str, Any], b: int) -> List[Dict[str, Any]]:
+        return self._cached(self._blocks, self.max_blocks, (seg["name"], b),
+                            lambda: snapshot.read_section(seg["path"], f"tickets/{b}", seg["manifest"]))
+
+    def _index(self, seg: Dict[str, Any]):
+        return self._cached(self._indexes, self.max_indexes, (seg["name"], "index"),
+                            lambda: snapshot.read_section(seg["path"], "index", seg["manifest"]))
+
+    def get(self, ticket_id: int) -> Optional[Dict[str, Any]]:
+        i = int(np.searchsorted(self._ids, ticket_id))
+        if i >= len(self._ids) or self._ids[i] != ticket_id:
+            return None
+        pos = int(self._pos[i])
+        return self._block(self.segments[int(self._seg[i])], pos // BLOCK)[pos % BLOCK]
+
+    def select(self, match: Callable[[Dict[str, Any]], bool], skip: Optional[Callable[[Dict[str, Any]], bool]] = None,
+               limit: Optional[int] = None, known: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Archived tickets for which match(t) holds; segments whose meta satisfies skip(meta)
+        are not read. With `limit` (newest-first listings) blocks are read newest first and
+        reading stops once `limit` matches, counting the caller's own `known` ids, are newer
+        than anything left unread."""
+        top: List[int] = []
+        if limit is not None and known is not None and len(known):
+            top = sorted(np.sort(known)[-limit:].tolist())
+        out = []
+        for seg in sorted(self.segments, key=lambda s: s["meta"]["max_id"], reverse=True):
+            if skip is not None and skip(seg["meta"]):
+                continue
+            ids = seg["ids"]
+            if limit is not None and len(top) >= limit and ids[-1] < top[0]:
+                break  # segments are visited by max id: none further can hold a newer match
+            for b in reversed(range((len(ids) + BLOCK - 1) // BLOCK)):
+                if limit is not None and len(top) >= limit and ids[min(len(ids), (b + 1) * BLOCK) - 1] < top[0]:
+                    break  # blocks are in id order, so the earlier ones are older still
+                for t in self._block(seg, b):
+                    if match(t):
+                        out.append(t)
+                        if limit is not None:
+                            (heapq.heappush if len(top) < limit else heapq.heappushpop)(top, t["id"])
+        return out
+
+    def search(self, text: str, k: int = 3, service: Optional[str] = None) -> List[Tuple[int, float]]:
+        """(ticket_id, cosine similarity) of the k best matches over all segment indexes,
+        optionally among one service's tickets. Merged tickets are not indexed."""
+        best: List[Tuple[float, int]] = []
+        for seg in self.segments:
+            index = self._index(seg)
+            if index is None:
+                continue
+            vect, mat, ids, services = index if len(index) == 4 else (*index, seg["ids"], None)
+            sims = (mat @ normalize(vect.transform([text])).T).toarray().ravel()
+            if service is not None and services is not None:
+                sims[services != partitions.service_key(service)] = -1.0
+            top = np.argpartition(-sims, k - 1)[:k] if len(sims) > k else np.arange(len(sims))
+            best += [(float(sims[i]), int(ids[i])) for i in top if sims[i] >= 0]
+        best.sort(key=lambda x: (-x[0], x[1]))
+        return [(tid, sim) for sim, tid in best[:k]]
+
+    # ---- writes ----
+    def append(self, tickets: List[Dict[str, Any]], codec: str = snapshot.DEFAULT_CODEC) -> Dict[str, Any]:
+        """Write `tickets` as one new segment and open it; returns its manifest."""
+        tickets = sorted(tickets, key=lambda t: t["id"])
+        ids = np.fromiter((t["id"] for t in tickets), dtype=np.int64, count=len(tickets))
+        index = None
+        similar = [t for t in tickets if partitions.status_class(t) != "merged"]  # never offered as duplicates
+        if similar:
+            vect = TfidfVectorizer(ngram_range=(1, 2), max_features=20000)
+            mat = normalize(vect.fit_transform([f"{t['subject']}\n{t['body']}" for t in similar]))
+            if hasattr(vect, "stop_words_"):
+                del vect.stop_words_  # every pruned term; not needed to transform
+            index = (vect, mat, np.fromiter((t["id"] for t in similar), dtype=np.int64, count=len(similar)),
+                     np.array([partitions.service_key(t.get("service")) for t in similar], dtype=object))
+        n = max([int(m.group(1)) for p in self.root.glob("seg-*") if (m := _SEG.search(p.name))] + [0]) + 1
+        path = self.root / f"seg-{n:06d}{snapshot.SUFFIX}"
+        w = snapshot.Writer(path, codec, {"count": len(tickets), "min_id": int(ids[0]), "max_id": int(ids[-1]), "counts": _counts(tickets)})
+        try:
+            w.add_encoded("ids", "raw", ids.tobytes())
+            for b in range(0, len(tickets), BLOCK):
+                w.add(f"tickets/{b // BLOCK}", "pickle", tickets[b:b + BLOCK])
+            w.add("index", "pickle", index)
+            man = w.close()
+        except BaseException:
+            w.abort()
+            raise
+        self.segments.append({"name": path.name, "path": path, "manifest": man, "meta": man["meta"], "ids": ids})
+        self._reindex()
+        return man
@@ -0,0 +1,812 @@
+"""
+Micro-benchmarks for backend subsystems.
+Usage: python bench.py <name> [--n N]   (python bench.py --list for names)
+"""
+import argparse, random, time, tracemalloc
+
+BENCHES = {}
+
+def bench(fn):
+    BENCHES[fn.__name__.replace("bench_", "")] = fn
+    return fn
+
+def _timed(label, fn, *args):
+    t0 = time.perf_counter()
+    res = fn(*args)
+    dt = time.perf_counter() - t0
+    print(f"{label:<40} {dt * 1000:10.1f} ms")
+    return res, dt
+
+@bench
+def bench_timer_wheel(n=500_000):
+    from scheduler import TimerWheel
+    now = time.time()
+    tracemalloc.start()
+    wheel = TimerWheel(tick=1.0, start=now)
+    deadlines = [now + random.uniform(1, 8 * 3600) for _ in range(n)]
+    _, dt = _timed(f"arm {n} timers", lambda: [wheel.add(d, i, None) for i, d in enumerate(deadlines)])
+    print(f"{'  per arm':<40} {dt / n * 1e6:10.2f} us")
+    print(f"{'  traced memory':<40} {tracemalloc.get_traced_memory()[0] / 2**20:10.1f} MiB")
+    tracemalloc.stop()
+    _timed(f"cancel {n // 10} timers", lambda: [wheel.cancel(i) for i in range(0, n, 10)])
+    t0 = time.perf_counter()
+    for s in range(1, 61):
+        wheel.advance(now + s)
+    print(f"{'idle tick (avg of 60)':<40} {(time.perf_counter() - t0) / 60 * 1e6:10.2f} us")
+    fired, _ = _timed("advance 8h (fire all)", wheel.advance, now + 8 * 3600 + 1)
+    print(f"{'  fired':<40} {len(fired):10d}")
+
+def _synthetic_texts(n, families=2000, seed=7):
+    rnd = random.Random(seed)
+    words = [f"w{i}" for i in range(20000)]
+    base = [rnd.sample(words, 12) for _ in range(families)]
+    out = []
+    for _ in range(n):
+        toks = list(rnd.choice(base))
+        for k in rnd.sample(range(len(toks)), 3):
+            toks[k] = rnd.choice(words)
+        out.append(" ".join(toks))
+    return out
+
+def _ticket_matrix(texts):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import normalize
+    return normalize(TfidfVectorizer(ngram_range=(1, 2), max_features=20000).fit_transform(texts))
+
+@bench
+def bench_cluster(n=200_000):
+    from clustering import cluster
+    texts = _synthetic_texts(n)
+    X, _ = _timed(f"tf-idf fit {n} tickets", _ticket_matrix, texts)
+    res, _ = _timed(f"cluster {n} tickets (th=0.5)", cluster, X, list(range(1, n + 1)), 0.5, 0.95, 3)
+    print(f"{'  edges / groups / merges':<40} {res['edges']} / {len(res['groups'])} / {len(res['merge_candidates'])}")
+
+def _synthetic_tickets(n, seed=11):
+    from datetime import datetime, timezone, timedelta
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    texts = _synthetic_texts(n, seed=seed)
+    return [{
+        "id": i + 1, "subject": texts[i][:40], "body": texts[i], "service": rnd.choice(["VPN", "SAP Basis", "Identity", "Email/Outlook"]),
+        "assignment_group": "EUC", "priority": rnd.choice(["P1", "P2", "P3"]), "status": rnd.choice(["open", "open", "resolved", "merged"]),
+        "triage_confidence": 0.8, "created_at": (now - timedelta(seconds=rnd.randint(0, 86400 * 3))).isoformat(),
+        "attachments": [], "type": "Incident", "location": "", "asset": "", "urgency": "Medium", "worklogs": [], "assigned_to": "",
+    } for i in range(n)]
+
+@bench
+def bench_serialise(n=None):
+    import json
+    import fastjson
+    from fastjson import FragmentCache
+    try:
+        from fastapi.encoders import jsonable_encoder
+    except Exception:
+        jsonable_encoder = None
+    for size in ([n] if n else [10_000, 100_000]):
+        rows = [dict(t, risk=0.7) for t in _synthetic_tickets(size)]
+        print(f"-- {size} tickets")
+        if jsonable_encoder is not None:
+            _timed("jsonable_encoder + json.dumps", lambda: json.dumps(jsonable_encoder(rows)).encode())
+        _timed("json.dumps(indent=2) (old _save_json)", lambda: json.dumps(rows, ensure_ascii=False, indent=2).encode())
+        _timed("fastjson.dumps", fastjson.dumps, rows)
+        cache = FragmentCache()
+        pairs = [(t, b',"risk":0.7') for t in rows]
+        _timed("fragments (cold)", cache.join, pairs)
+        _timed("fragments (warm)", cache.join, pairs)
+
+def _load(port, path, body, stop, lat):
+    import http.client, json
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    payload = json.dumps(body)
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        conn.request("POST", path, payload, {"Content-Type": "application/json"})
+        conn.getresponse().read()
+        lat.append(time.perf_counter() - t0)
+
+@bench
+def bench_workers(n=None, seconds=10):
+    """POST /api/triage throughput against uvicorn with 1/4/8 workers sharing one data dir."""
+    import os, shutil, subprocess, sys, tempfile, threading, urllib.request
+    from pathlib import Path
+    import shared_state
+    here = Path(__file__).resolve().parent
+    for w in ([n] if n else [1, 4, 8]):
+        data = Path(tempfile.mkdtemp()) / "data"
+        shutil.copytree(here.parent / "data", data)
+        env = dict(os.environ, TICKETPILOT_DATA_DIR=str(data), TICKETPILOT_WORKERS=str(w))
+        port = 8800 + w
+        proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(w), "--log-level", "warning"],
+                                cwd=here, env=env)
+        try:
+            for _ in range(600):
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/api/metrics", timeout=1).read()
+                    break
+                except Exception:
+                    time.sleep(0.1)
+            stop, lat = threading.Event(), []
+            body = {"subject": "VPN error 619", "body": "AnyConnect fails from the north office since this morning"}
+            clients = [threading.Thread(target=_load, args=(port, "/api/triage", body, stop, lat)) for _ in range(4 * w)]
+            for c in clients:
+                c.start()
+            time.sleep(seconds)
+            stop.set()
+            for c in clients:
+                c.join()
+            lat.sort()
+            print(f"{f'{w} worker(s), {4 * w} clients':<40} {len(lat) / seconds:8.1f} req/s  p50 {lat[len(lat) // 2] * 1000:.1f} ms  p99 {lat[int(len(lat) * 0.99)] * 1000:.1f} ms")
+        finally:
+            proc.terminate()
+            proc.wait()
+            shared_state.cleanup(data)
+            shutil.rmtree(data.parent, ignore_errors=True)
+
+def _load_as(port, method, path, body, caller, stop, lat, codes):
+    """Like _load, with caller headers (a callable gives fresh ones per request) and status
+    counts; a 429/503 is retried after its Retry-After, as a well-behaved client would."""
+    import http.client, json
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    payload = json.dumps(body) if body is not None else None
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        conn.request(method, path, payload, {"Content-Type": "application/json", **(caller() if callable(caller) else caller)})
+        r = conn.getresponse()
+        r.read()
+        lat.append(time.perf_counter() - t0)
+        codes[r.status] = codes.get(r.status, 0) + 1
+        if r.status in (429, 503):
+            stop.wait(float(r.getheader("Retry-After") or 1))
+
+@bench
+def bench_admission(seconds=10, agents=4, storm=40):
+    """Agent reads (GET /api/tickets) alone, then during a create storm of `storm` clients
+    (10x the agents), with admission control off and on."""
+    import itertools, json, os, shutil, subprocess, sys, tempfile, threading, urllib.request
+    from pathlib import Path
+    here = Path(__file__).resolve().parent
+    seq = itertools.count()
+
+    def run(port, phases):
+        stop, out = threading.Event(), []
+        threads = []
+        for n, method, path, body, caller in phases:
+            lat, codes = [], {}
+            out.append((path, lat, codes))
+            threads += [threading.Thread(target=_load_as, args=(port, method, path, body, caller, stop, lat, codes), daemon=True) for _ in range(n)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        return out
+
+    def report(label, lat, codes):
+        lat = sorted(lat)
+        ok = codes.get(200, 0)
+        print(f"{label:<40} {ok / seconds:8.1f} ok/s  p50 {lat[len(lat) // 2] * 1000:7.1f} ms  p99 {lat[int(len(lat) * 0.99)] * 1000:7.1f} ms  {dict(sorted(codes.items()))}")
+
+    # the storm arrives anonymously through the (trusted, loopback) proxy, one address per request
+    create = (storm, "POST", "/api/tickets", {"subject": "Outlook keeps asking for password", "body": "Since the update Outlook prompts again and again"},
+              lambda: {"X-Forwarded-For": "10.0.%d.%d" % divmod(next(seq) % 62500, 250)})
+    for on in ("0", "1"):
+        data = Path(tempfile.mkdtemp()) / "data"
+        shutil.copytree(here.parent / "data", data)
+        env = dict(os.environ, TICKETPILOT_DATA_DIR=str(data), TICKETPILOT_ADMISSION=on, TICKETPILOT_SHARED_STATE="1")  # writes serialised
+        port = 8700 + int(on)
+        proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], cwd=here, env=env)
+        try:
+            for _ in range(600):
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/api/metrics", timeout=1).read()
+                    break
+                except Exception:
+                    time.sleep(0.1)
+            req = urllib.request.Request(f"http://127.0.0.1:{port}/api/auth/login", json.dumps({"username": "agent1", "password": "agent123"}).encode(),
+                                         {"Content-Type": "application/json"})
+            agent = (agents, "GET", "/api/tickets?limit=50&sort=risk", None,
+                     {"Authorization": "Bearer " + json.loads(urllib.request.urlopen(req, timeout=5).read())["token"]})
+            tag = "on" if on == "1" else "off"
+            report(f"admission {tag}: agents alone", *run(port, [agent])[0][1:])
+            (_, alat, acodes), (_, clat, ccodes) = run(port, [agent, create])
+            report(f"admission {tag}: agents during storm", alat, acodes)
+            report(f"admission {tag}: storm creates", clat, ccodes)
+            if on == "1":
+                print(f"{'  shed':<40} {urllib.request.urlopen(f'http://127.0.0.1:{port}/api/admin/admission', timeout=5).read().decode()}")
+        finally:
+            proc.terminate()
+            proc.wait()
+            shutil.rmtree(data.parent, ignore_errors=True)
+
+@bench
+def bench_triage_service(seconds=5):
+    """POST /triage throughput on triage_service at 1/50/500 concurrent clients, with the
+    micro-batcher on and off (TRIAGE_BATCH_MAX=1)."""
+    import os, subprocess, sys, threading, urllib.request
+    from pathlib import Path
+    here = Path(__file__).resolve().parent
+    for batch in (1, 64):
+        port = 8900 + batch
+        env = dict(os.environ, TRIAGE_BATCH_MAX=str(batch))
+        proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "triage_service:app", "--port", str(port), "--log-level", "warning",
+                                 "--limit-concurrency", "2000", "--backlog", "2048"], cwd=here, env=env)
+        try:
+            for _ in range(600):
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=1).read()
+                    break
+                except Exception:
+                    time.sleep(0.1)
+            body = {"text": "SCADA real-time data not updating for Substation-12. IEC-104 connection lost"}
+            for n in (1, 50, 500):
+                stop, lat = threading.Event(), []
+                clients = [threading.Thread(target=_load, args=(port, "/triage", body, stop, lat), daemon=True) for _ in range(n)]
+                for c in clients:
+                    c.start()
+                time.sleep(seconds)
+                stop.set()
+                for c in clients:
+                    c.join()
+                lat.sort()
+                print(f"{f'batch {batch}, {n} clients':<40} {len(lat) / seconds:8.1f} req/s  p50 {lat[len(lat) // 2] * 1000:.1f} ms  p99 {lat[int(len(lat) * 0.99)] * 1000:.1f} ms")
+            stats = urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=5).read().decode()
+            print(f"{'  server batches':<40} {stats}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+@bench
+def bench_tokens(n=1_000_000):
+    """Elevation lookups with n tokens ever issued (half expired): old list scan vs TokenStore."""
+    import uuid
+    from tokens import TokenStore
+    now = time.time()
+    recs = [{"token": uuid.uuid4().hex, "user": "u", "scope": "s", "exp": now + (-60 if i % 2 else 900)} for i in range(n)]
+    probe = [recs[random.randrange(n)]["token"] for _ in range(200)]
+
+    def scan():
+        for tok in probe[:20]:
+            any(e.get("token") == tok and time.time() <= e.get("exp", 0) for e in recs)
+
+    store, _ = _timed(f"TokenStore load ({n} tokens)", TokenStore, recs)
+    _timed("list scan, 20 lookups", scan)
+    _timed("TokenStore, 200 lookups", lambda: [store.get(t) for t in probe])
+    dropped, _ = _timed("gc", store.gc)
+    print(f"dropped {dropped}, live {len(store)}")
+
+@bench
+def bench_notifications(users=10_000, per_user=1000):
+    """Per-user notification segments at users x per_user, vs the old single list (capped at 1M rows)."""
+    import shutil, tempfile
+    from pathlib import Path
+    import fastjson
+    from notifications import NotificationStore
+    root = Path(tempfile.mkdtemp()) / "notifications"
+    root.mkdir()
+    nid = 1
+    t0 = time.perf_counter()
+    for u in range(users):
+        lines = []
+        for k in range(per_user):
+            lines.append(fastjson.dumps({"id": nid + k * users, "username": f"user{u}", "message": f"note {k}", "type": "info",
+                                         "ts": "2026-01-01T00:00:00+00:00"}) + b"\n")
+        (root / f"u_user{u}.jsonl").write_bytes(b"".join(lines))
+        nid += 1
+    (root / "_seq").write_text(str(users * per_user + 1))
+    print(f"{'write ' + str(users * per_user) + ' notifications':<40} {(time.perf_counter() - t0) * 1000:10.1f} ms")
+    try:
+        ns, _ = _timed("open store", NotificationStore, root, per_user * 2, 3650)
+        probe = [f"user{random.randrange(users)}" for _ in range(200)]
+        _timed("200 cold reads (segment load)", lambda: [ns.list(u, limit=50) for u in probe])
+        _timed("200 warm reads since_id+limit", lambda: [ns.list(u, since_id=users * per_user // 2, limit=50) for u in probe])
+        _timed("200 unread counts", lambda: [ns.unread(u) for u in probe])
+        lat = []
+        for u in probe * 5:
+            t1 = time.perf_counter()
+            ns.add(u, "hello")
+            lat.append(time.perf_counter() - t1)
+        lat.sort()
+        print(f"{'add x1000':<40} p50 {lat[500] * 1e6:.0f} us  p99 {lat[990] * 1e6:.0f} us")
+        _timed(f"compact ({users} segments, nothing due)", ns.compact)
+
+        n = min(users * per_user, 1_000_000)
+        old = [{"id": i, "username": f"user{i % users}", "message": "m", "type": "info"} for i in range(1, n + 1)]
+        _timed(f"old: next id, max() over {n}", lambda: max(x.get("id", 0) for x in old) + 1)
+        _timed(f"old: one read, filter+sort {n}", lambda: sorted([x for x in old if x.get("username") == "user1"], key=lambda x: x["id"], reverse=True))
+    finally:
+        shutil.rmtree(root.parent, ignore_errors=True)
+
+@bench
+def bench_collection(n=None, ops=1000):
+    """Per-record create (id allocation + append) and update (find by id) at 1k..1M records,
+    then what a create costs once persisted: the sequences.json write and the collection rewrite."""
+    import os, shutil, tempfile
+    from pathlib import Path
+    from collection import Collection
+    tmp = Path(tempfile.mkdtemp())
+    os.environ["TICKETPILOT_DATA_DIR"] = str(tmp)
+    import store
+
+    def per_op(fn, k):
+        t0 = time.perf_counter()
+        for _ in range(k):
+            fn()
+        return (time.perf_counter() - t0) / k * 1e6
+
+    for size in ([n] if n else [1_000, 10_000, 100_000, 1_000_000]):
+        recs = [{"id": i, "status": "open"} for i in range(1, size + 1)]
+        coll = Collection(recs)
+        probe = [random.randint(1, size) for _ in range(ops)]
+        it = iter(probe)
+        create = per_op(lambda: coll.append({"id": coll.next_id(), "status": "open"}), ops)
+        update = per_op(lambda: coll.get(next(it)).update(status="resolved"), ops)
+        k = max(3, min(ops, 10_000_000 // size))
+        old_create = per_op(lambda: recs.append({"id": max([r["id"] for r in recs]) + 1, "status": "open"}), k)
+        old_probe = iter(probe)
+
+        def old_update_one():
+            key = next(old_probe)
+            for r in recs:
+                if r["id"] == key:
+                    r["status"] = "resolved"
+                    return
+
+        old_update = per_op(old_update_one, k)
+        print(f"{size:>9} records  create {create:7.2f} us  update {update:6.2f} us   |  old: create {old_create:10.1f} us  update {old_update:10.1f} us")
+        seq = per_op(lambda: store._next_id("bench", coll), ops)
+        save = per_op(lambda: store._save_json(tmp / "bench.json", coll), max(3, min(ops, 1_000_000 // size)))
+        print(f"{'':>9}          persisted: id sequence {seq:7.1f} us  collection rewrite {save / 1000:10.1f} ms  (O(n) per write)")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+@bench
+def bench_mi_index(n=5000, members=200, tickets=1_000_000):
+    """Ticket -> MI lookups with n MIs of `members` tickets each: list scan vs reverse index."""
+    import numpy as np
+    import mi_index
+    rng = np.random.default_rng(3)
+    mis = [{"id": i + 1, "members": sorted(set(rng.integers(1, tickets, members).tolist()))} for i in range(n)]
+    idx = mi_index.MiIndex()
+    _timed(f"build index ({n} MIs)", idx.rebuild, mis)
+    probe = rng.integers(1, tickets, 200).tolist()
+    _timed("200 lookups, list scan", lambda: [next((m for m in mis if t in m["members"]), None) for t in probe])
+    _timed("200 lookups, reverse index", lambda: [idx.for_ticket(t) for t in probe])
+    ids = np.arange(1, tickets + 1, dtype=np.int64)
+    mask, _ = _timed(f"in-active-MI mask over {tickets} ids", idx.in_active, ids)
+    print(f"{int(mask.sum())} tickets in an active MI")
+    _timed("union of 100 member arrays", lambda: [mi_index.union(idx.members[1], idx.members[k]) for k in range(2, 102)])
+
+@bench
+def bench_worklog(rate=1000, seconds=5, tickets=10_000):
+    """Worklog appends paced at `rate`/s into the log store, vs embedding and rewriting tickets.json."""
+    import shutil, tempfile
+    from pathlib import Path
+    import fastjson
+    from worklogs import WorklogStore
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        wl = WorklogStore(tmp / "worklogs.jsonl")
+        lat, t0 = [], time.perf_counter()
+        for i in range(rate * seconds):
+            delay = t0 + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            t1 = time.perf_counter()
+            wl.append(random.randint(1, tickets), "agent1", f"note {i}: checked logs, restarted the service")
+            lat.append(time.perf_counter() - t1)
+        lat.sort()
+        n = len(lat)
+        print(f"{f'paced {rate}/s for {seconds}s':<40} p50 {lat[n // 2] * 1e6:.0f} us  p99 {lat[int(n * 0.99)] * 1e6:.0f} us  (total {n})")
+        _, dt = _timed("unpaced 20k appends", lambda: [wl.append(random.randint(1, tickets), "a", "n") for _ in range(20_000)])
+        print(f"{'':<40} {20_000 / dt:10.0f} notes/s")
+        _timed("page of 50 for a busy ticket", wl.page, 1, 0, 50)
+
+        docs = [{"id": i, "subject": "s" * 40, "body": "b" * 200, "worklogs": []} for i in range(1, tickets + 1)]
+        path = tmp / "tickets.json"
+
+        def embedded():
+            docs[random.randrange(tickets)]["worklogs"].append({"author": "a", "note": "n", "ts": "2026-01-01T00:00:00+00:00"})
+            path.write_bytes(fastjson.dumps(docs))
+        _, dt = _timed(f"old: 100 embedded notes, {tickets} tickets", lambda: [embedded() for _ in range(100)])
+        print(f"{'':<40} {100 / dt:10.0f} notes/s")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+@bench
+def bench_fanout(n=300, latency_ms=(50, 200)):
+    """clear_spooler over n printers with simulated per-target latency, at several pool sizes."""
+    import actions
+    actions.SIM_LATENCY_MS = latency_ms
+    targets = actions.expand("clear_spooler", {"printer": [f"PRN-{i:04}" for i in range(n)]})
+    for conc, rate in ((1, None), (16, None), (64, None), (64, 100.0)):
+        sub = targets[:50] if conc == 1 else targets  # serial baseline on a slice
+        counts, dt = _timed(f"{len(sub)} targets, pool {conc}" + (f", {rate:g}/s" if rate else ""),
+                            actions.fan_out, "clear_spooler", sub, lambda r: None, actions.run_action, conc, 5.0, rate)
+        print(f"{'':<40} {len(sub) / dt:8.1f} targets/s  {counts}")
+
+@bench
+def bench_online(n=20_000, batch=32, every=4000, families=400):
+    """Per-ticket cost of online micro-batch updates, and category accuracy on a holdout vs. a full
+    TF-IDF + LogisticRegression retrain on the same tickets. The second half of the stream adds
+    new families and a new category, so the online model has to pick up labels it never saw."""
+    import numpy as np
+    from online import OnlineModel
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    rnd = random.Random(5)
+    words = [f"w{i}" for i in range(20000)]
+    fam = [(rnd.sample(words, 12), f"C{i % 8 if i < families // 2 else 8 + i % 2}", f"P{i % 4 + 1}") for i in range(families)]
+
+    def draw(k, hi):
+        out = []
+        for _ in range(k):
+            toks, cat, pri = fam[rnd.randrange(hi)]
+            toks = list(toks)
+            for j in rnd.sample(range(len(toks)), 4):
+                toks[j] = rnd.choice(words)
+            out.append((" ".join(toks), cat, pri))
+        return out
+    stream = draw(n // 2, families // 2) + draw(n - n // 2, families)
+    holdout = draw(2000, families)
+    hx, hy = [t for t, _, _ in holdout], np.array([c for _, c, _ in holdout])
+    model, fit_s = OnlineModel(), 0.0
+    for i in range(0, n, batch):
+        chunk = stream[i:i + batch]
+        t0 = time.perf_counter()
+        model.partial_fit([t for t, _, _ in chunk], {"category": [c for _, c, _ in chunk], "priority": [p for _, _, p in chunk]})
+        fit_s += time.perf_counter() - t0
+        seen = i + len(chunk)
+        if seen % every == 0 or seen == n:
+            acc = np.mean([o["category"] for o in model.classify_batch(hx)] == hy)
+            t0 = time.perf_counter()
+            vect = TfidfVectorizer(ngram_range=(1, 2))
+            full = LogisticRegression(max_iter=200).fit(vect.fit_transform([t for t, _, _ in stream[:seen]]), [c for _, c, _ in stream[:seen]])
+            full_s = time.perf_counter() - t0
+            full_acc = np.mean(full.predict(vect.transform(hx)) == hy)
+            print(f"{f'after {seen} tickets':<40} online {acc:.3f}  full {full_acc:.3f}  (retrain {full_s:.1f}s)")
+    print(f"{'online update, per ticket':<40} {fit_s / n * 1e6:10.1f} us  (batches of {batch})")
+
+@bench
+def bench_classify(n=5000):
+    """Compiled classifier vs. the sklearn pipelines: agreement on n synthetic texts built from
+    the training vocabulary, and per-call latency for one short text."""
+    import warnings
+    import numpy as np
+    warnings.filterwarnings("ignore")
+    import utils
+    compiled = utils.get_compiled()
+    if compiled is None:
+        print("no current classifier_compiled.joblib; run nlp_train.export_compiled() first")
+        return
+    cat_pipe, pri_pipe, *_ = utils.get_pipelines()
+    rnd = random.Random(3)
+    words = [t for t in compiled["vocab"] if " " not in t] + ["unknown", "xyz"]
+    texts = [" ".join(rnd.choice(words) for _ in range(rnd.randint(0, 20))) for _ in range(n)]
+    fast = utils.classify_compiled(compiled, texts)
+    cat_p, pri_p = cat_pipe.predict_proba(texts), pri_pipe.predict_proba(texts)
+    same = sum(f["category"] == cat_pipe.classes_[c.argmax()] and f["priority"] == pri_pipe.classes_[p.argmax()]
+               for f, c, p in zip(fast, cat_p, pri_p))
+    err = max(max(abs(f["category_conf"] - c.max()), abs(f["priority_conf"] - p.max())) for f, c, p in zip(fast, cat_p, pri_p))
+    print(f"{'identical labels':<40} {same}/{n}  (max confidence diff {err:.1e})")
+
+    def sklearn_one(text):
+        cat_pipe.predict([text]), pri_pipe.predict([text])
+        return cat_pipe.predict_proba([text]), pri_pipe.predict_proba([text])
+    text = "SCADA real-time data not updating for Substation-12. IEC-104 connection lost"
+    for label, fn in (("sklearn, 4 calls", sklearn_one), ("compiled", lambda t: utils.classify_compiled(compiled, [t]))):
+        fn(text)
+        k = 200 if label.startswith("sklearn") else 5000
+        _, dt = _timed(f"{label} x{k}", lambda: [fn(text) for _ in range(k)])
+        print(f"{'  per call':<40} {dt / k * 1e6:10.1f} us")
+    _timed(f"compiled batch of {n}", utils.classify_compiled, compiled, texts)
+    _timed(f"sklearn predict_proba batch of {n}", lambda: (cat_pipe.predict_proba(texts), pri_pipe.predict_proba(texts)))
+
+@bench
+def bench_snapshot(n=1_000_000):
+    """n tickets with a fitted similarity index: cold boot (tickets.json + refit) vs. writing a
+    snapshot in the background and restoring from it."""
+    import os, shutil, tempfile
+    from pathlib import Path
+    tmp = Path(tempfile.mkdtemp())
+    os.environ["TICKETPILOT_DATA_DIR"] = str(tmp)
+    try:
+        import fastjson, store
+        tickets = _synthetic_tickets(n)
+        for t in tickets:
+            del t["worklogs"]
+        store.TICKETS.reset(tickets)
+        del tickets
+        _timed(f"write tickets.json ({n})", store._save_json, store.TICKETS_JSON, store.TICKETS)
+        print(f"{'  size':<40} {store.TICKETS_JSON.stat().st_size / 2**20:10.1f} MiB")
+        _timed("cold: json.loads tickets.json", lambda: fastjson.loads(store.TICKETS_JSON.read_bytes()))
+        store.TICKET_SIM, _ = _timed("cold: refit similarity index", store._fit_ticket_index)
+        job, _ = _timed("snapshot (fork, writer paused)", store.start_snapshot, None, True)
+        if job["error"]:
+            print(job["error"])
+            return
+        res = job["result"]
+        print(f"{'  writers paused':<40} {res['paused_ms']:10.1f} ms")
+        print(f"{'  size / raw':<40} {res['size'] / 2**20:10.1f} MiB / {res['raw_size'] / 2**20:.1f} MiB ({job['params']['codec']})")
+        store.TICKETS.reset([])
+        store.TICKET_SIM = (None, None)
+        out, _ = _timed("restore (memory + data files)", store.restore_snapshot, Path(res["path"]))
+        _timed("restore (memory only, extra worker)", store.restore_snapshot, Path(res["path"]), False)
+        print(f"{'  tickets / index rows':<40} {len(store.TICKETS):10d} / {store.TICKET_SIM[1].shape[0]}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+@bench
+def bench_archive(n=500_000, open_share=0.05):
+    """History of n tickets of which open_share are still open: cold boot and hot-set size with
+    everything in the working set vs. after the closed history moved to the archive tier."""
+    import os, shutil, tempfile
+    from datetime import datetime, timezone, timedelta
+    from pathlib import Path
+    tmp = Path(tempfile.mkdtemp())
+    os.environ["TICKETPILOT_DATA_DIR"] = str(tmp)
+    try:
+        import fastjson, store
+        old = (datetime.now(timezone.utc) - timedelta(days=90)).isoformat()
+        tickets = _synthetic_tickets(n)
+        rnd = random.Random(5)
+        for t in tickets:
+            del t["worklogs"]
+            if rnd.random() >= open_share:
+                t["status"], t["closed_at"] = rnd.choice(["resolved", "merged"]), old
+            else:
+                t["status"] = "open"
+        store.TICKETS.reset(tickets)
+        del tickets
+        store._save_json(store.TICKETS_JSON, store.TICKETS)
+
+        def boot():
+            store.ARCHIVE.load()
+            store.TICKETS.reset(fastjson.loads(store.TICKETS_JSON.read_bytes()))
+            store.TICKET_SIM = store._fit_ticket_index()
+
+        for tier in ("one tier", "hot + archive"):
+            if tier == "hot + archive":
+                res, _ = _timed("archive closed tickets", store.archive_tickets, 30, True)
+                print(f"{'  archived / segment size':<40} {res['archived']:10d} / {res['size'] / 2**20:.1f} MiB")
+            print(f"-- {tier}")
+            _timed("cold boot (json + refit index)", boot)
+            print(f"{'  hot tickets / tickets.json':<40} {len(store.TICKETS):10d} / {store.TICKETS_JSON.stat().st_size / 2**20:.1f} MiB")
+            print(f"{'  index rows / nnz':<40} {store.TICKET_SIM[1].shape[0]:10d} / {store.TICKET_SIM[1].nnz}")
+            text = f"{store.TICKETS[0]['subject']}\n{store.TICKETS[0]['body']}"
+            _timed("dedup (both tiers)", store.dedup, text, 3)
+            _timed("dedup (archive index cached)", store.dedup, text, 3)
+            _timed("list tickets limit=50", store.list_tickets_json, None, None, None, None, 50)
+            _timed("list resolved limit=50", store.list_tickets_json, None, None, "resolved", None, 50)
+            _timed("get oldest ticket", store.get_ticket, 1)
+            _timed("get oldest ticket (cached block)", store.get_ticket, 2)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+@bench
+def bench_partitions(n=200_000, queries=200):
+    """dedup over one global index vs. (service, status class) partitions, per scope."""
+    import store
+    tickets = _synthetic_tickets(n)
+    store.TICKETS.reset(tickets)
+    store.TICKET_SIM, _ = _timed(f"fit index ({n})", store._fit_ticket_index)
+    _timed("partition index", store._parts)
+    print(f"{'  partitions':<40} {store.TICKET_PARTS.sizes()}")
+    rnd = random.Random(3)
+    sample = [tickets[rnd.randrange(n)] for _ in range(queries)]
+    texts = [f"{t['subject']}\n{t['body']}" for t in sample]
+    vect, matrix = store.TICKET_SIM
+
+    def global_index():
+        for text in texts:
+            q = store.normalize(vect.transform([text]))
+            sims = (matrix @ q.T).toarray().ravel()
+            store.np.argsort(sims)[::-1][:3]
+
+    _, base = _timed(f"global matrix x{queries}", global_index)
+    for scope in store.DEDUP_SCOPES:
+        _, dt = _timed(f"scope={scope} x{queries}", lambda: [store.dedup(x, 3, t["service"], scope) for x, t in zip(texts, sample)])
+        print(f"{'  vs global':<40} {base / dt:10.2f}x")
+    t = sample[0]
+    _timed("status change (move partition)", lambda: (t.update(status="merged"), store.ticket_changed(t)))
+    _timed("next query (re-slice 2 partitions)", store.dedup, texts[1], 3, t["service"], "service")
+
+@bench
+def bench_depgraph(n=10_000, queries=1000):
+    """Blast radius on a synthetic n-service graph (~3 dependencies each, a few cycles):
+    closure build, per-query lookups vs. a BFS per query, and incremental edits."""
+    import depgraph
+    rnd = random.Random(5)
+    names = [f"svc{i}" for i in range(n)]
+    # services depend mostly on lower-numbered ones (layers of a stack); 1% point back up
+    services = {name: {"users_affected": rnd.randrange(10, 1000),
+                       "depends_on": [names[rnd.randrange(i)] if i and rnd.random() > 0.01 else names[rnd.randrange(n)]
+                                      for _ in range(rnd.randrange(1, 6) if i else 0)]}
+                for i, name in enumerate(names)}
+    g, _ = _timed(f"closure build ({n} nodes)", depgraph.ServiceGraph, services)
+    parents: dict = {}
+    for name, meta in services.items():
+        for dep in meta["depends_on"]:
+            parents.setdefault(dep, []).append(name)
+
+    def bfs_users(name):
+        seen, todo = {name}, [name]
+        while todo:
+            for p in parents.get(todo.pop(), ()):
+                if p not in seen:
+                    seen.add(p)
+                    todo.append(p)
+        return sum(services[s]["users_affected"] for s in seen)
+
+    sample = [names[rnd.randrange(n // 10)] for _ in range(queries)]  # low layers: big blast radius
+    _, base = _timed(f"BFS users affected x{queries}", lambda: [bfs_users(x) for x in sample])
+    _, dt = _timed(f"graph users affected x{queries}", lambda: [g.users_affected(x) for x in sample])
+    print(f"{'  vs BFS':<40} {base / dt:10.1f}x")
+    assert all(g.users_affected(x) == bfs_users(x) for x in sample[:50])
+    _timed(f"dependents listing x{queries}", lambda: [g.dependents(x) for x in sample])
+    _timed(f"common upstream of 20 services x{queries // 10}", lambda: [g.common_upstream(rnd.sample(names, 20)) for _ in range(queries // 10)])
+    top = names[-1]
+    _timed("users change (incremental)", g.set_service, top, services[top]["depends_on"], 5)
+    _timed("dependency added (incremental)", g.set_service, top, services[top]["depends_on"] + [names[1]], 5)
+    _timed("dependency removed (full closure)", g.set_service, top, services[top]["depends_on"], 5)
+
+@bench
+def bench_changes(n=1_000_000, services=2000, queries=1000):
+    """Per-triage change lookups with n historical changes: the old scan + sort vs. the calendar
+    (latest change, plus correlation over the service and its dependencies)."""
+    from datetime import datetime, timedelta, timezone
+    import change_index, depgraph
+    rnd = random.Random(9)
+    names = [f"svc{i}" for i in range(services)]
+    now = datetime.now(timezone.utc)
+    changes = []
+    for i in range(n):
+        start = now - timedelta(minutes=rnd.randrange(2 * 365 * 24 * 60))
+        c = {"id": i + 1, "service": rnd.choice(names), "title": f"change {i}", "ts": start.isoformat()}
+        if rnd.random() < 0.3:
+            c["end"] = (start + timedelta(minutes=rnd.randrange(15, 480))).isoformat()
+        changes.append(c)
+    cal, _ = _timed(f"calendar build ({n})", change_index.ChangeCalendar, changes)
+    # apps -> platform -> infra -> core, each service on two of the tier below
+    tiers = [names[:services // 50], names[services // 50:services // 10], names[services // 10:services // 3], names[services // 3:]]
+    graph = depgraph.ServiceGraph({s: {"depends_on": rnd.sample(tiers[t - 1], 2) if t else []} for t, tier in enumerate(tiers) for s in tier})
+    sample = [rnd.choice(names) for _ in range(queries)]
+
+    def scan(service):
+        items = [c for c in changes if isinstance(c, dict) and (c.get("service", "").lower() == service.lower())]
+        items.sort(key=lambda x: x.get("ts", ""), reverse=True)
+        return items[0] if items else None
+
+    _, base = _timed(f"scan + sort x{queries // 100}", lambda: [scan(x) for x in sample[:queries // 100]])
+    _, dt = _timed(f"calendar latest x{queries}", lambda: [cal.latest(x) for x in sample])
+    print(f"{'  per lookup':<40} {dt / queries * 1e6:10.1f} us   ({base / (queries // 100) / (dt / queries):.0f}x)")
+    at = now.timestamp()
+    _, dt = _timed(f"correlate 24h, service + deps x{queries}", lambda: [cal.correlate({x: graph.depends_on(x)}, at, 86400) for x in sample])
+    print(f"{'  per triage':<40} {dt / queries * 1e6:10.1f} us")
+    _timed(f"add x{queries} (out of order)", lambda: [cal.add({"service": x, "ts": (now - timedelta(days=rnd.randrange(700))).isoformat()}) for x in sample])
+
+@bench
+def bench_rebuilds(n=5000, creates=1000, threads=16):
+    """A burst of ticket creates on n tickets from concurrent threads: the old refit of the
+    similarity index per create vs. coalesced, debounced rebuilds off the request path."""
+    import os, shutil, tempfile, threading
+    from pathlib import Path
+    tmp = Path(tempfile.mkdtemp())
+    os.environ["TICKETPILOT_DATA_DIR"] = str(tmp)
+    try:
+        import store
+        flight = store.TICKET_INDEX
+        tri = {"service": "VPN", "assignment_group": "Network", "priority": "P3", "confidence": 0.9}
+
+        def burst():
+            def worker(k):
+                for i in range(k):
+                    store.add_ticket(f"vpn drops every {i} minutes", "anyconnect reconnect loop", tri)
+            ts = [threading.Thread(target=worker, args=(creates // threads + (i < creates % threads),)) for i in range(threads)]
+            [t.start() for t in ts]
+            [t.join() for t in ts]
+            flight.flush()
+
+        for label, inline in (("old: refit per create", True), ("coalesced", False)):
+            tickets = _synthetic_tickets(n)
+            for t in tickets:
+                del t["worklogs"]
+            store.TICKETS.reset(tickets)
+            store.build_ticket_index()
+            if inline:
+                flight.request = flight.run
+            builds, c0, t0 = flight.stats["builds"], time.process_time(), time.perf_counter()
+            burst()
+            cpu, wall = time.process_time() - c0, time.perf_counter() - t0
+            flight.__dict__.pop("request", None)
+            print(f"{f'{label} ({creates} creates)':<40} cpu {cpu * 1000:9.1f} ms  wall {wall * 1000:9.1f} ms  builds {flight.stats['builds'] - builds}")
+            print(f"{'  index rows / tickets':<40} {store.TICKET_SIM[1].shape[0]:10d} / {len(store.TICKETS)}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _mock_ticketing(latency):
+    """Local stand-in for the ticketing API: single and bulk create, fixed service latency, call counter."""
+    import json, threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    calls = {"single": 0, "bulk": 0}
+    seq = iter(range(1, 10**9))
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(latency)
+            with lock:
+                if self.path.endswith("create_many.json"):
+                    calls["bulk"] += 1
+                    out = {"tickets": [{"id": next(seq)} for _ in body["tickets"]]}
+                else:
+                    calls["single"] += 1
+                    out = {"ticket": {"id": next(seq)}}
+            data = json.dumps(out).encode()
+            self.send_response(201)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *a):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, calls
+
+@bench
+def bench_escalation_batching(rate=200, seconds=5, latency=0.02):
+    """Escalations/sec into a mock ticketing API, one call each vs coalesced bulk creates."""
+    import asyncio
+    srv, calls = _mock_ticketing(latency)
+    base = f"http://127.0.0.1:{srv.server_address[1]}/api/v2/tickets.json"
+    import external_ticket as et
+    et.TICKET_API_URL = base
+
+    async def drive(max_batch):
+        client = et.EscalationClient()
+        batcher = et.EscalationBatcher(client, max_batch=max_batch, bulk_url=base.replace("tickets.json", "tickets/create_many.json"))
+        lat, tasks = [], []
+
+        async def one(i):
+            t0 = time.perf_counter()
+            await batcher.submit({"ticket": {"subject": f"escalation {i}", "comment": {"body": "x"}}})
+            lat.append(time.perf_counter() - t0)
+
+        t_start = time.perf_counter()
+        for i in range(rate * seconds):
+            delay = t_start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(i)))
+        await asyncio.gather(*tasks)
+        await client.close()
+        return sorted(lat)
+
+    for label, max_batch in (("single calls", 1), (f"batched (<= {et.BATCH_MAX}, {et.BATCH_WAIT * 1000:.0f} ms)", et.BATCH_MAX)):
+        calls["single"] = calls["bulk"] = 0
+        lat = asyncio.run(drive(max_batch))
+        n = len(lat)
+        print(f"{label:<40} {(calls['single'] + calls['bulk']) / n:.3f} calls/escalation  "
+              f"p50 {lat[n // 2] * 1000:.1f} ms  p99 {lat[int(n * 0.99)] * 1000:.1f} ms")
+    srv.shutdown()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("name", nargs="?")
+    ap.add_argument("--n", type=int, default=None)
+    ap.add_argument("--list", action="store_true")
+    args = ap.parse_args()
+    if args.list or not args.name:
+        print("\n".join(sorted(BENCHES)))
+        return
+    fn = BENCHES[args.name]
+    fn(args.n) if args.n else fn()
+
+if __name__ == "__main__":
+    main()
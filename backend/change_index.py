@@ -0,0 +1,135 @@
+# backend/change_index.py
+import math
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+RELATION_WEIGHT = {"service": 1.0, "upstream": 0.6}  # a change on the service itself vs. on something it depends on
+
+def _key(service: Optional[str]) -> str:
+    return (service or "").strip().lower()
+
+def _ts(value: Any) -> Optional[float]:
+    """ISO timestamp -> epoch seconds; naive timestamps are taken as UTC."""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+def window(c: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """(start, end) of a change: `start`/`end` when given, else the instant `ts`."""
+    start = _ts(c.get("start") or c.get("ts"))
+    if start is None:
+        return None
+    end = _ts(c.get("end"))
+    return start, max(start, end) if end is not None else start
+
+class _Lane:
+    """One service's changes, ordered by start time."""
+    __slots__ = ("starts", "items", "span")
+
+    def __init__(self):
+        self.starts: List[float] = []
+        self.items: List[Tuple[float, int, float, Dict[str, Any]]] = []  # (start, seq, end, change)
+        self.span = 0.0  # longest window, bounds how far back an overlapping change can start
+
+class ChangeCalendar:
+    """Changes per service in start-time order. "Latest change", "changes overlapping
+    [since, until]" and correlation are bisects into one lane per service, so their cost
+    depends on the matches, not on the size of the history."""
+
+    def __init__(self, changes: Iterable[Dict[str, Any]] = ()):
+        self.load(changes)
+
+    def load(self, changes: Iterable[Dict[str, Any]]):
+        self._lanes: Dict[str, _Lane] = {}
+        self._seq = 0
+        rows: Dict[str, List[Tuple[float, int, float, Dict[str, Any]]]] = {}
+        for c in changes:
+            w = isinstance(c, dict) and window(c)
+            if w:
+                rows.setdefault(_key(c.get("service")), []).append((w[0], self._next(), w[1], c))
+        for svc, items in rows.items():
+            items.sort(key=lambda x: x[:2])
+            lane = self._lanes[svc] = _Lane()
+            lane.items = items
+            lane.starts = [x[0] for x in items]
+            lane.span = max(x[2] - x[0] for x in items)
+
+    def _next(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def __len__(self) -> int:
+        return sum(len(lane.items) for lane in self._lanes.values())
+
+    def services(self) -> List[str]:
+        return list(self._lanes)
+
+    def add(self, c: Dict[str, Any]) -> bool:
+        w = window(c)
+        if w is None:
+            return False
+        lane = self._lanes.setdefault(_key(c.get("service")), _Lane())
+        item = (w[0], self._next(), w[1], c)
+        if not lane.starts or w[0] >= lane.starts[-1]:
+            lane.starts.append(w[0])
+            lane.items.append(item)
+        else:
+            i = bisect_right(lane.starts, w[0])
+            lane.starts.insert(i, w[0])
+            lane.items.insert(i, item)
+        lane.span = max(lane.span, w[1] - w[0])
+        return True
+
+    def latest(self, service: str, until: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The service's most recently started change (started by `until`, if given)."""
+        lane = self._lanes.get(_key(service))
+        if lane is None or not lane.items:
+            return None
+        i = len(lane.starts) if until is None else bisect_right(lane.starts, until)
+        return lane.items[i - 1][3] if i else None
+
+    def _overlapping(self, lane: _Lane, since: float, until: float) -> Iterable[Tuple[float, int, float, Dict[str, Any]]]:
+        lo = bisect_left(lane.starts, since - lane.span)
+        hi = bisect_right(lane.starts, until)
+        return (x for x in lane.items[lo:hi] if x[2] >= since)
+
+    def between(self, services: Iterable[str], since: float, until: float) -> List[Dict[str, Any]]:
+        """Changes on any of `services` whose window overlaps [since, until], newest start first."""
+        hits = []
+        for svc in dict.fromkeys(_key(s) for s in services):
+            lane = self._lanes.get(svc)
+            if lane is not None:
+                hits += self._overlapping(lane, since, until)
+        hits.sort(key=lambda x: x[:2], reverse=True)
+        return [x[3] for x in hits]
+
+    def correlate(self, services: Dict[str, Iterable[str]], at: float, lookback: float, k: int = 5) -> List[Dict[str, Any]]:
+        """Changes likely behind trouble on `services` ({service: its upstream components})
+        at time `at`. A change scores by relation (on the service or upstream of it) times
+        recency (1 while its window is open, halving every lookback/4 after it closed);
+        a change shared by several services adds up over them."""
+        half = lookback / 4 or 1.0
+        scored: Dict[int, List[Any]] = {}
+        for svc, upstream in services.items():
+            best: Dict[int, Tuple[float, str]] = {}
+            for rel, names in (("service", [svc]), ("upstream", upstream)):
+                for name in dict.fromkeys(_key(n) for n in names):
+                    lane = self._lanes.get(name)
+                    if lane is None:
+                        continue
+                    for start, seq, end, c in self._overlapping(lane, at - lookback, at):
+                        s = RELATION_WEIGHT[rel] * (1.0 if end >= at else math.pow(0.5, (at - end) / half))
+                        if s > best.get(seq, (0.0, ""))[0]:
+                            best[seq] = (s, rel)
+                        scored.setdefault(seq, [0.0, start, c, []])
+            for seq, (s, rel) in best.items():
+                entry = scored[seq]
+                entry[0] += s
+                entry[3].append({"service": svc, "relation": rel})
+        ranked = sorted(scored.values(), key=lambda e: (-e[0], -e[1]))[:k]
+        return [{"change": c, "score": round(s, 4), "services": via} for s, _, c, via in ranked]
@@ -0,0 +1,56 @@
+# backend/clustering.py
+from typing import Dict, Any, List, Tuple
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+def similar_pairs(X, th: float, row_block: int = 1024, col_block: int = 16384) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """All (i, j, sim) with i < j and cosine sim >= th for L2-normalised rows of X.
+    Only the upper triangle is computed, tile by tile, so peak memory is bounded by
+    one row_block x col_block product regardless of backlog size."""
+    X = sp.csr_matrix(X, dtype=np.float32)
+    n = X.shape[0]
+    I: List[np.ndarray] = []; J: List[np.ndarray] = []; V: List[np.ndarray] = []
+    for r0 in range(0, n, row_block):
+        r1 = min(n, r0 + row_block)
+        A = X[r0:r1]
+        for c0 in range(r0, n, col_block):
+            c1 = min(n, c0 + col_block)
+            S = (A @ X[c0:c1].T).tocoo()
+            i = S.row.astype(np.int64) + r0
+            j = S.col.astype(np.int64) + c0
+            keep = (S.data >= th) & (j > i)
+            if keep.any():
+                I.append(i[keep]); J.append(j[keep]); V.append(S.data[keep])
+    if not I:
+        e = np.zeros(0, dtype=np.int64)
+        return e, e, np.zeros(0, dtype=np.float32)
+    return np.concatenate(I), np.concatenate(J), np.concatenate(V)
+
+def cluster(X, ids: List[int], th: float = 0.85, merge_th: float = 0.95, min_size: int = 3) -> Dict[str, Any]:
+    """One pass over the backlog: connected components of the thresholded similarity
+    graph become MI proposals, near-identical pairs become merge candidates."""
+    n = len(ids)
+    if n == 0 or X is None:
+        return {"groups": [], "merge_candidates": [], "tickets": 0, "edges": 0}
+    i, j, v = similar_pairs(X, th)
+    ids_arr = np.asarray(ids, dtype=np.int64)
+    adj = sp.coo_matrix((np.ones(len(i), dtype=np.int8), (i, j)), shape=(n, n))
+    ncomp, labels = connected_components(adj, directed=False)
+    deg = np.bincount(np.concatenate([i, j]), minlength=n)
+    sizes = np.bincount(labels, minlength=ncomp)
+    groups = []
+    order = np.argsort(labels, kind="stable")
+    bounds = np.cumsum(sizes)
+    for c in np.nonzero(sizes >= min_size)[0]:
+        rows = order[bounds[c] - sizes[c]:bounds[c]]
+        seed = rows[np.argmax(deg[rows])]
+        groups.append({"seed": int(ids_arr[seed]), "members": sorted(int(x) for x in ids_arr[rows]), "size": int(sizes[c])})
+    groups.sort(key=lambda g: g["size"], reverse=True)
+    m = v >= merge_th
+    merges = [
+        {"source_id": int(min(a, b)), "duplicate_id": int(max(a, b)), "similarity": round(float(s), 4)}
+        for a, b, s in zip(ids_arr[i[m]], ids_arr[j[m]], v[m])
+    ]
+    merges.sort(key=lambda x: (-x["similarity"], x["source_id"], x["duplicate_id"]))
+    return {"groups": groups, "merge_candidates": merges, "tickets": n, "edges": int(len(i))}
@@ -0,0 +1,81 @@
+# backend/collection.py
+from typing import Dict, Any, Iterable, Optional
+
+class Collection(list):
+    """A list of records that also keeps a primary-key index and an id sequence in step with
+    its contents. Existing code keeps treating it as a plain list (iteration, slicing,
+    json dumps); lookups by id and new-id allocation are O(1) instead of a scan or max()."""
+
+    def __init__(self, records: Iterable[Dict[str, Any]] = (), pk: str = "id"):
+        super().__init__(records)
+        self.pk = pk
+        self.seq = 0
+        self._reindex()
+
+    def __reduce__(self):
+        return (type(self), (list(self), self.pk))
+
+    def _reindex(self):
+        pk = self.pk
+        self.by_pk: Dict[Any, Dict[str, Any]] = {r[pk]: r for r in self if pk in r}
+        self.seq = max([self.seq] + [k for k in self.by_pk if isinstance(k, int)])
+
+    def _track(self, rec: Dict[str, Any]):
+        key = rec.get(self.pk)
+        if key is not None:
+            self.by_pk[key] = rec
+            if isinstance(key, int) and key > self.seq:
+                self.seq = key
+
+    def get(self, key: Any) -> Optional[Dict[str, Any]]:
+        return self.by_pk.get(key)
+
+    def next_id(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def reset(self, records: Iterable[Dict[str, Any]]):
+        """Replace the contents (reloads); the sequence never moves backwards."""
+        super().clear()
+        super().extend(records)
+        self._reindex()
+
+    # ---- list mutators that keep the index in step ----
+    def append(self, rec: Dict[str, Any]):
+        super().append(rec)
+        self._track(rec)
+
+    def extend(self, recs: Iterable[Dict[str, Any]]):
+        start = len(self)
+        super().extend(recs)
+        for rec in self[start:]:
+            self._track(rec)
+
+    def __iadd__(self, recs: Iterable[Dict[str, Any]]):
+        self.extend(recs)
+        return self
+
+    def insert(self, i: int, rec: Dict[str, Any]):
+        super().insert(i, rec)
+        self._track(rec)
+
+    def clear(self):
+        super().clear()
+        self.by_pk.clear()
+
+    def __setitem__(self, i, value):
+        super().__setitem__(i, value)
+        self._reindex()
+
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self._reindex()
+
+    def pop(self, i: int = -1) -> Dict[str, Any]:
+        rec = super().pop(i)
+        self.by_pk.pop(rec.get(self.pk), None)
+        return rec
+
+    def remove(self, rec: Dict[str, Any]):
+        super().remove(rec)
+        self.by_pk.pop(rec.get(self.pk), None)
@@ -0,0 +1,214 @@
+# backend/depgraph.py
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+_CHUNK = 1024  # rows unpacked at a time when totals are recomputed
+
+class ServiceGraph:
+    """Service dependency graph with its transitive closure held as packed bitsets: for each
+    node the nodes it depends on (down) and the nodes that depend on it (up), plus the users
+    affected if it fails (its own and every dependent's). Lookups are a row read. Adding a
+    dependency or changing a user count updates only the affected rows; removing a dependency,
+    or adding one that closes a cycle, recomputes the closure."""
+
+    def __init__(self, services: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.load(services or {})
+
+    # ---- build ----
+    def load(self, services: Dict[str, Dict[str, Any]]):
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.children: List[List[int]] = []
+        self.parents: List[List[int]] = []
+        self.users = np.zeros(64, dtype=np.int64)
+        self.down = np.zeros((64, 1), dtype=np.uint64)
+        self.up = np.zeros((64, 1), dtype=np.uint64)
+        self.total = np.zeros(64, dtype=np.int64)
+        for name, meta in services.items():
+            i = self._node(name)  # may grow self.users
+            self.users[i] = int(meta.get("users_affected") or 0)
+        for name, meta in services.items():
+            u = self.index[name]
+            for dep in dict.fromkeys(meta.get("depends_on") or []):
+                v = self._node(dep)
+                if v != u:
+                    self.children[u].append(v)
+                    self.parents[v].append(u)
+        self._close()
+
+    def _node(self, name: str) -> int:
+        i = self.index.get(name)
+        if i is not None:
+            return i
+        i = len(self.names)
+        if i == len(self.users):
+            cap = 2 * len(self.users)
+            words = cap // 64
+            self.users = np.concatenate([self.users, np.zeros(cap - i, dtype=np.int64)])
+            self.total = np.concatenate([self.total, np.zeros(cap - i, dtype=np.int64)])
+            for attr in ("down", "up"):
+                grown = np.zeros((cap, words), dtype=np.uint64)
+                old = getattr(self, attr)
+                grown[:old.shape[0], :old.shape[1]] = old
+                setattr(self, attr, grown)
+        self.names.append(name)
+        self.index[name] = i
+        self.children.append([])
+        self.parents.append([])
+        return i
+
+    def _bits(self, nodes: Iterable[int]) -> np.ndarray:
+        row = np.zeros(self.down.shape[1], dtype=np.uint64)
+        for i in nodes:
+            row[i >> 6] |= np.uint64(1 << (i & 63))
+        return row
+
+    def _members(self, row: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(np.unpackbits(row.view(np.uint8), bitorder="little")[:len(self.names)])
+
+    def _close(self):
+        """Full closure: strongly connected components, then one pass over the condensed DAG
+        in each direction (a node in a cycle depends on the rest of its cycle)."""
+        n = len(self.names)
+        self.down[:] = 0
+        self.up[:] = 0
+        if n:
+            src = [u for u in range(n) for _ in self.children[u]]
+            dst = [v for u in range(n) for v in self.children[u]]
+            adj = csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n, n))
+            ncomp, label = connected_components(adj, directed=True, connection="strong")
+            members: List[List[int]] = [[] for _ in range(ncomp)]
+            for i, c in enumerate(label.tolist()):
+                members[c].append(i)
+            kids: List[set] = [set() for _ in range(ncomp)]
+            for u, v in zip(src, dst):
+                if label[u] != label[v]:
+                    kids[label[u]].add(int(label[v]))
+            order = self._topo(kids)
+            own = [self._bits(m) for m in members]
+            down = [None] * ncomp
+            for c in reversed(order):  # dependencies before their dependents
+                row = own[c].copy() if len(members[c]) > 1 else np.zeros_like(own[c])
+                for d in kids[c]:
+                    row |= down[d] | own[d]
+                down[c] = row
+            up = [None] * ncomp
+            folks: List[set] = [set() for _ in range(ncomp)]
+            for c in range(ncomp):
+                for d in kids[c]:
+                    folks[d].add(c)
+            for c in order:
+                row = own[c].copy() if len(members[c]) > 1 else np.zeros_like(own[c])
+                for p in folks[c]:
+                    row |= up[p] | own[p]
+                up[c] = row
+            for c, nodes in enumerate(members):
+                self.down[nodes] = down[c]
+                self.up[nodes] = up[c]
+                if len(nodes) > 1:  # cycle members reach each other, not themselves
+                    for i in nodes:
+                        self.down[i, i >> 6] &= ~np.uint64(1 << (i & 63))
+                        self.up[i, i >> 6] &= ~np.uint64(1 << (i & 63))
+        self._retotal(np.arange(n))
+
+    @staticmethod
+    def _topo(kids: List[set]) -> List[int]:
+        indeg = [0] * len(kids)
+        for ks in kids:
+            for d in ks:
+                indeg[d] += 1
+        order = [c for c, k in enumerate(indeg) if k == 0]
+        for c in order:  # grows while iterating (Kahn)
+            for d in kids[c]:
+                indeg[d] -= 1
+                if indeg[d] == 0:
+                    order.append(d)
+        return order
+
+    def _retotal(self, rows: np.ndarray):
+        n = len(self.names)
+        users = self.users[:n]
+        for i in range(0, len(rows), _CHUNK):
+            part = rows[i:i + _CHUNK]
+            bits = np.unpackbits(self.up[part].view(np.uint8), axis=1, bitorder="little")[:, :n]
+            self.total[part] = users[part] + bits @ users
+
+    # ---- incremental changes ----
+    def set_service(self, name: str, depends_on: Iterable[str], users_affected: int):
+        u = self._node(name)
+        new = [self._node(d) for d in dict.fromkeys(depends_on)]
+        new = [v for v in new if v != u]
+        delta = int(users_affected) - int(self.users[u])
+        if delta:
+            self.users[u] += delta
+            self.total[u] += delta
+            self.total[self._members(self.down[u])] += delta  # everything x depends on now has these users downstream
+        old = set(self.children[u])
+        added = [v for v in new if v not in old]
+        self._set_children(u, new)
+        if old - set(new) or any(self.down[v, u >> 6] & np.uint64(1 << (u & 63)) for v in added):
+            self._close()  # a dependency went away, or a new one closes a cycle
+            return
+        for v in added:
+            anc = np.append(self._members(self.up[u]), u)
+            desc = np.append(self._members(self.down[v]), v)
+            self.down[anc] |= self.down[v] | self._bits([v])
+            self.up[desc] |= self.up[u] | self._bits([u])
+            self._retotal(desc)
+
+    def _set_children(self, u: int, new: List[int]):
+        for v in self.children[u]:
+            self.parents[v].remove(u)
+        self.children[u] = list(new)
+        for v in new:
+            self.parents[v].append(u)
+
+    # ---- queries ----
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def users_affected(self, name: str) -> int:
+        i = self.index.get(name)
+        return int(self.total[i]) if i is not None else 0
+
+    def dependents(self, name: str) -> List[str]:
+        """Everything that (transitively) depends on `name`: its blast radius."""
+        i = self.index.get(name)
+        return [self.names[j] for j in self._members(self.up[i])] if i is not None else []
+
+    def depends_on(self, name: str) -> List[str]:
+        i = self.index.get(name)
+        return [self.names[j] for j in self._members(self.down[i])] if i is not None else []
+
+    def impacted(self, names: Iterable[str]) -> List[str]:
+        """The named nodes and all their dependents."""
+        idx = [self.index[n] for n in names if n in self.index]
+        if not idx:
+            return []
+        row = np.bitwise_or.reduce(self.up[idx], axis=0) | self._bits(idx)
+        return [self.names[j] for j in self._members(row)]
+
+    def users_affected_by(self, names: Iterable[str]) -> int:
+        """Users affected if all the named nodes are down (each user counted once per service)."""
+        idx = [self.index[n] for n in names if n in self.index]
+        if not idx:
+            return 0
+        row = np.bitwise_or.reduce(self.up[idx], axis=0) | self._bits(idx)
+        return int(self.users[self._members(row)].sum())
+
+    def common_upstream(self, names: Iterable[str], min_share: int = 2) -> List[Tuple[str, int]]:
+        """Nodes at least `min_share` of the named services depend on, most shared first: the
+        likely common cause when those services spike or share an incident together."""
+        idx = [self.index[n] for n in dict.fromkeys(names) if n in self.index]
+        if len(idx) < min_share:
+            return []
+        n = len(self.names)
+        counts = np.unpackbits(self.down[idx].view(np.uint8), axis=1, bitorder="little")[:, :n].sum(axis=0, dtype=np.int64)
+        hits = np.flatnonzero(counts >= min_share)
+        hits = hits[np.lexsort((hits, -counts[hits]))]
+        return [(self.names[j], int(counts[j])) for j in hits]
@@ -1,13 +1,27 @@
 # external_ticket.py
-import requests
-from fastapi import APIRouter, Body
+import asyncio, os, random, time
+from typing import Dict, Any, List, Optional, Tuple
+import httpx
+from fastapi import APIRouter
 from pydantic import BaseModel
+import store
 
 router = APIRouter()
 
-TICKET_API_URL = "https://your-ticketing-service.com/api/v2/tickets.json"
-API_USERNAME = "your_api_user@email.com"
-API_PASSWORD = "your_api_token"
+TICKET_API_URL = os.environ.get("TICKET_API_URL", "https://your-ticketing-service.com/api/v2/tickets.json")
+API_USERNAME = os.environ.get("TICKET_API_USER", "your_api_user@email.com")
+API_PASSWORD = os.environ.get("TICKET_API_TOKEN", "your_api_token")
+TICKET_BULK_URL = os.environ.get("TICKET_BULK_URL", TICKET_API_URL.replace("tickets.json", "tickets/create_many.json"))
+
+OUTBOX_KIND = "external_ticket"
+TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+MAX_CONCURRENCY = 8
+MAX_ATTEMPTS = 8
+BACKOFF_BASE, BACKOFF_CAP = 1.0, 300.0
+IDLE_POLL = 5.0
+BATCH_MAX = int(os.environ.get("TICKET_BATCH_MAX", "50"))
+BATCH_WAIT = float(os.environ.get("TICKET_BATCH_WAIT_MS", "50")) / 1000.0
+BULK_COOLDOWN = 60.0
 
 class TicketRequest(BaseModel):
     user_email: str
@@ -15,9 +29,48 @@ class TicketRequest(BaseModel):
     issue_summary: str
     chat_history: str
 
-@router.post("/external_ticket")
-def create_external_ticket(req: TicketRequest):
-    ticket_data = {
+class RetryableError(Exception):
+    def __init__(self, msg: str, retry_after: Optional[float] = None):
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `reset_after` seconds lets one trial call through."""
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._trial = False
+
+    def allow(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state, self._trial = "half_open", False
+        if self.state == "half_open" and not self._trial:
+            self._trial = True
+            return True
+        return self.state == "closed"
+
+    def retry_in(self) -> float:
+        return max(0.1, self.reset_after - (time.monotonic() - self.opened_at)) if self.state == "open" else 0.5
+
+    def success(self):
+        self.failures, self.state = 0, "closed"
+
+    def failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            self.state, self.opened_at = "open", time.monotonic()
+
+def backoff(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Exponential backoff with full jitter, never sooner than the server's Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+def build_ticket_data(req: TicketRequest) -> Dict[str, Any]:
+    return {
         "ticket": {
             "subject": f"Chatbot Escalation: {req.issue_summary}",
             "comment": {
@@ -28,18 +81,193 @@ def create_external_ticket(req: TicketRequest):
             "tags": ["chatbot-auto-create"]
         }
     }
-    headers = { "Content-Type": "application/json" }
-    auth = (API_USERNAME, API_PASSWORD)
+
+class EscalationClient:
+    """Pooled keep-alive client for the ticketing API; one instance per event loop."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            limits = httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY)
+            self._client = httpx.AsyncClient(timeout=TIMEOUT, limits=limits, auth=(API_USERNAME, API_PASSWORD))
+            self._sem = asyncio.Semaphore(MAX_CONCURRENCY)
+        return self._client
+
+    async def post(self, url: str, body: Any) -> Any:
+        """One upstream call, and one breaker outcome for it however many escalations it carries."""
+        client = self.client
+        async with self._sem:
+            try:
+                resp = await client.post(url, json=body)
+            except httpx.TransportError as e:
+                self.breaker.failure()
+                raise RetryableError(f"{type(e).__name__}: {e}")
+        if resp.status_code in (408, 425, 429) or resp.status_code >= 500:
+            self.breaker.failure()
+            ra = resp.headers.get("Retry-After")
+            raise RetryableError(f"HTTP {resp.status_code}", float(ra) if ra and ra.isdigit() else None)
+        self.breaker.success()  # the service answered, even if it rejects the request
+        resp.raise_for_status()
+        return resp.json()
+
+    async def create(self, ticket_data: Dict[str, Any]) -> Any:
+        return (await self.post(TICKET_API_URL, ticket_data)).get("ticket", {}).get("id")
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class EscalationBatcher:
+    """Coalesces concurrent creates over a short window into one bulk request and resolves
+    each caller's future with its own ticket id. If the bulk endpoint rejects the batch
+    (unsupported, malformed reply) it falls back to single creates and stays on them for
+    BULK_COOLDOWN; retryable upstream errors are passed to every caller instead, so the
+    outbox backs off rather than multiplying calls against a struggling service."""
+
+    def __init__(self, client: EscalationClient, max_batch: int = BATCH_MAX, max_wait: float = BATCH_WAIT, bulk_url: Optional[str] = TICKET_BULK_URL):
+        self.client = client
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.bulk_url = bulk_url
+        self.bulk_off_until = 0.0
+        self.stats = {"escalations": 0, "bulk_calls": 0, "single_calls": 0, "bulk_failures": 0}
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, ticket_data: Dict[str, Any]) -> Any:
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((ticket_data, fut))
+        self.stats["escalations"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._send(batch))
+
+    async def _single(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        self.stats["single_calls"] += len(batch)
+        results = await asyncio.gather(*(self.client.create(p) for p, _ in batch), return_exceptions=True)
+        for (_, fut), res in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(res, BaseException):
+                fut.set_exception(res)
+            else:
+                fut.set_result(res)
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        if len(batch) == 1 or not self.bulk_url or time.monotonic() < self.bulk_off_until:
+            await self._single(batch)
+            return
+        self.stats["bulk_calls"] += 1
+        try:
+            resp = await self.client.post(self.bulk_url, {"tickets": [p["ticket"] for p, _ in batch]})
+            ids = [t.get("id") for t in (resp.get("tickets") or [])]
+            if len(ids) != len(batch):
+                raise ValueError(f"bulk reply has {len(ids)} tickets for {len(batch)}")
+        except RetryableError as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        except Exception:
+            self.stats["bulk_failures"] += 1
+            self.bulk_off_until = time.monotonic() + BULK_COOLDOWN
+            await self._single(batch)
+            return
+        for (_, fut), tid in zip(batch, ids):
+            if not fut.done():
+                fut.set_result(tid)
+
+CLIENT = EscalationClient()
+BATCHER = EscalationBatcher(CLIENT)
+_WAKE: Optional[asyncio.Event] = None
+_TASK: Optional[asyncio.Task] = None
+
+def _wake():
+    if _WAKE is not None:
+        _WAKE.set()
+
+async def _update(oid: str, **fields):
+    await asyncio.to_thread(store.update_outbox, oid, **fields)
+
+async def deliver(item: Dict[str, Any]):
+    if not CLIENT.breaker.allow():
+        await _update(item["id"], next_at=time.time() + CLIENT.breaker.retry_in())
+        return
+    attempts = item.get("attempts", 0) + 1
     try:
-        response = requests.post(
-            TICKET_API_URL,
-            json=ticket_data,
-            headers=headers,
-            auth=auth
-        )
-        response.raise_for_status()
-        response_json = response.json()
-        new_ticket_id = response_json.get("ticket", {}).get("id")
-        return { "success": True, "ticket_id": new_ticket_id }
-    except Exception as e:
-        return { "success": False, "error_message": str(e) }
\ No newline at end of file
+        ticket_id = await BATCHER.submit(item["payload"])
+    except RetryableError as e:
+        if attempts >= MAX_ATTEMPTS:
+            await _update(item["id"], status="failed", attempts=attempts, error=str(e))
+        else:
+            await _update(item["id"], attempts=attempts, error=str(e), next_at=time.time() + backoff(attempts, e.retry_after))
+        return
+    except Exception as e:  # the service answered; the request itself is bad
+        await _update(item["id"], status="failed", attempts=attempts, error=f"{type(e).__name__}: {e}")
+        return
+    await _update(item["id"], status="sent", attempts=attempts, error=None, result={"ticket_id": ticket_id},
+                  sent_at=time.time())
+
+async def deliver_loop():
+    """Drains the persisted outbox; escalations survive restarts and upstream outages."""
+    while True:
+        if store.SHARED is not None:
+            await asyncio.to_thread(store.sync_shared)  # same as the per-request refresh: off the loop, under the lock
+        due = store.due_outbox(OUTBOX_KIND, time.time(), limit=max(MAX_CONCURRENCY * 4, BATCH_MAX))
+        if due:
+            await asyncio.gather(*(deliver(o) for o in due))
+            continue
+        nxt = store.next_outbox_at(OUTBOX_KIND)
+        wait = IDLE_POLL if nxt is None else min(IDLE_POLL, max(0.05, nxt - time.time()))
+        _WAKE.clear()
+        try:
+            await asyncio.wait_for(_WAKE.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+
+@router.on_event("startup")
+async def start_outbox():
+    global _WAKE, _TASK
+    if _TASK is not None and not _TASK.done():
+        return
+    _WAKE = asyncio.Event()
+    if store.SHARED is None or store.SHARED.try_leader("outbox", store.DATA_DIR):
+        _TASK = asyncio.get_running_loop().create_task(deliver_loop())
+
+@router.on_event("shutdown")
+async def stop_outbox():
+    if _TASK is not None:
+        _TASK.cancel()
+    await CLIENT.close()
+
+@router.post("/external_ticket")
+async def create_external_ticket(req: TicketRequest):
+    item = await asyncio.to_thread(store.add_outbox, OUTBOX_KIND, build_ticket_data(req))
+    _wake()
+    return { "success": True, "queued": True, "escalation_id": item["id"] }
+
+@router.get("/external_ticket/{escalation_id}")
+def external_ticket_status(escalation_id: str):
+    item = store.get_outbox(escalation_id)
+    if not item:
+        return { "success": False, "error_message": "not_found" }
+    return {
+        "success": item["status"] != "failed", "status": item["status"], "attempts": item["attempts"],
+        "ticket_id": (item.get("result") or {}).get("ticket_id"), "error_message": item.get("error"),
+    }
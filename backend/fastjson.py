@@ -0,0 +1,59 @@
+# backend/fastjson.py
+import json
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+try:
+    import orjson
+except Exception:  # orjson is optional; stdlib json is the fallback
+    orjson = None
+
+_OPTS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=_OPTS)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+def loads(data: bytes | str) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+class FragmentCache:
+    """Per-record JSON fragments without the closing brace, so listings can append
+    computed fields and join bytes instead of re-encoding every record."""
+
+    def __init__(self):
+        self._frags: Dict[int, bytes] = {}
+
+    def __len__(self):
+        return len(self._frags)
+
+    def fragment(self, rec: Dict[str, Any]) -> bytes:
+        key = rec["id"]
+        frag = self._frags.get(key)
+        if frag is None:
+            frag = dumps(rec)[:-1]
+            self._frags[key] = frag
+        return frag
+
+    def invalidate(self, key: int):
+        self._frags.pop(key, None)
+
+    def clear(self):
+        self._frags.clear()
+
+    def join(self, rows: Iterable[Tuple[Dict[str, Any], bytes]], keep: Optional[Callable[[Dict[str, Any]], bool]] = None) -> bytes:
+        """rows: (record, extra) where extra is b'' or b',"field":value' appended before '}'.
+        Records for which keep(record) is false are encoded without being cached."""
+        parts = [b"["]
+        frags = self._frags
+        for rec, extra in rows:
+            frag = frags.get(rec["id"]) or (self.fragment(rec) if keep is None or keep(rec) else dumps(rec)[:-1])
+            parts += (frag, extra, b"},")
+        if len(parts) > 1:
+            parts[-1] = b"}"
+        parts.append(b"]")
+        return b"".join(parts)
@@ -0,0 +1,61 @@
+# backend/jobs.py
+import os, uuid, threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Callable
+
+# Background jobs run in worker processes so CPU-heavy passes don't block the API.
+JOBS: Dict[str, Dict[str, Any]] = {}
+_POOL: Optional[ProcessPoolExecutor] = None
+_LOCK = threading.Lock()
+MAX_JOBS = 200
+
+def pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 2) - 1))
+        return _POOL
+
+def new_job(kind: str, total: int = 1, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    job = {
+        "id": uuid.uuid4().hex[:12], "kind": kind, "status": "running",
+        "params": params or {}, "done": 0, "total": total, "result": None, "error": None,
+        "started_at": datetime.now(timezone.utc).isoformat(), "finished_at": None,
+    }
+    with _LOCK:
+        JOBS[job["id"]] = job
+        if len(JOBS) > MAX_JOBS:
+            for jid in [j["id"] for j in JOBS.values() if j["status"] != "running"][:len(JOBS) - MAX_JOBS]:
+                del JOBS[jid]
+    return job
+
+def finish(job: Dict[str, Any], result: Any = None, error: Optional[str] = None):
+    job["result"] = result
+    job["error"] = error
+    job["status"] = "failed" if error else "done"
+    job["done"] = job["total"] if not error else job["done"]
+    job["finished_at"] = datetime.now(timezone.utc).isoformat()
+
+def submit(kind: str, fn: Callable, *args, params: Optional[Dict[str, Any]] = None, on_done: Optional[Callable[[Any], Any]] = None) -> Dict[str, Any]:
+    """Run fn(*args) in the process pool; on_done(result) runs in the parent and may replace the result."""
+    job = new_job(kind, params=params)
+
+    def _done(fut: Future):
+        try:
+            res = fut.result()
+            if on_done is not None:
+                res = on_done(res)
+            finish(job, res)
+        except Exception as e:
+            finish(job, error=f"{type(e).__name__}: {e}")
+
+    pool().submit(fn, *args).add_done_callback(_done)
+    return job
+
+def get_job(job_id: str) -> Dict[str, Any] | None:
+    return JOBS.get(job_id)
+
+def list_jobs(kind: Optional[str] = None) -> List[Dict[str, Any]]:
+    items = [{k: v for k, v in j.items() if k != "result"} for j in JOBS.values() if not kind or j["kind"] == kind]
+    return sorted(items, key=lambda j: j["started_at"], reverse=True)
@@ -1,10 +1,13 @@
-from fastapi import FastAPI
+import asyncio, time
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from external_ticket import router as external_ticket_router
 from tasks import run_auto_fix  # Celery task import
-import services, store, fixes, assist
+import services, store, fixes, assist, jobs, fastjson, respcache, admission, retriage
 
 # Optional actions import (fallback runner included)
 try:
@@ -12,13 +15,89 @@ try:
     def run_action(action_id: str, params: Dict[str, Any]):
         return actions.run_action(action_id, params or {})
 except Exception:
+    actions = None
     def run_action(action_id: str, params: Dict[str, Any]):
         return [f"[SIMULATION] Run {action_id} with {params}"]
 
+class FastJSONResponse(Response):
+    """Skips jsonable_encoder for hot list endpoints; content must be plain JSON types or pre-encoded bytes."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray)):
+            return bytes(content)
+        return fastjson.dumps(content)
+
+RESPONSE_CACHE = respcache.ResponseCache()
+
+def cached_json(request: Request, deps: tuple, produce, ttl: Optional[int] = None) -> Response:
+    """Serve produce() with a strong ETag derived from the data versions it depends on.
+    ttl adds a time bucket for views that also change with the clock (SLA risk, spike windows)."""
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())), store.version(*deps), int(time.time() // ttl) if ttl else 0)
+    etag = respcache.make_etag(key)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    hit = RESPONSE_CACHE.get(key)
+    if hit is None:
+        data = produce()
+        hit = (etag, bytes(data) if isinstance(data, (bytes, bytearray)) else fastjson.dumps(data))
+        RESPONSE_CACHE.put(key, *hit)
+    return FastJSONResponse(hit[1], headers=headers)
+
+ADMISSION = admission.Admission()
+
+def _session_of(token: str) -> Optional[Tuple[str, Optional[str]]]:
+    u = store.session_user(token)
+    return (u["username"], u.get("role")) if u else None
+
+def _urgent_create(payload: Dict[str, Any]) -> bool:
+    """P1/P2 by the same classifier the create endpoint uses, or flagged urgent by the caller."""
+    if str(payload.get("urgency") or "").lower() in ("high", "critical"):
+        return True
+    text = f"{payload.get('subject') or ''}\n{payload.get('body') or ''}".strip()
+    return services.classify(text).get("priority") in ("P1", "P2")
+
 app = FastAPI(title="TicketPilot API")
+if admission.ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware, admission=ADMISSION, session_of=_session_of, urgent=_urgent_create)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 app.include_router(external_ticket_router)
 
+@app.on_event("startup")
+async def start_sla_scheduler():
+    # With several workers only one of them drives the SLA timers.
+    if store.SHARED is None or store.SHARED.try_leader("sla_scheduler", store.DATA_DIR):
+        store.SLA_SCHEDULER.start()
+
+HOUSEKEEPING_INTERVAL = 300
+
+async def _housekeeping_loop():
+    while True:
+        await asyncio.sleep(HOUSEKEEPING_INTERVAL)
+        for task in (store.gc_tokens, store.compact_notifications, store.snapshot_if_due, store.archive_tickets):
+            try:
+                await asyncio.to_thread(task)
+            except Exception:
+                pass
+
+@app.on_event("startup")
+async def start_housekeeping():
+    if store.SHARED is None or store.SHARED.try_leader("housekeeping", store.DATA_DIR):
+        asyncio.get_running_loop().create_task(_housekeeping_loop())
+
+@app.middleware("http")
+async def refresh_shared_state(request: Request, call_next):
+    if store.SHARED is not None:  # reloads block, so off the loop
+        await run_in_threadpool(store.sync_shared)
+    return await call_next(request)
+
+@app.on_event("shutdown")
+async def stop_sla_scheduler():
+    store.SLA_SCHEDULER.stop()
+    if store.LEARNER.enabled:
+        await run_in_threadpool(store.LEARNER.checkpoint)  # batches trained since the last interval checkpoint
+
 # --------- Models ----------
 class Attachment(BaseModel):
     filename: str
@@ -73,6 +152,10 @@ class NotifyPayload(BaseModel):
     message: str
     type: Optional[str] = "info"
 
+class NotificationRead(BaseModel):
+    user: str
+    upto_id: Optional[int] = None
+
 class MagicCreatePayload(BaseModel):
     username: str
     kind: str
@@ -84,6 +167,10 @@ class ActionRequest(BaseModel):
     requested_by: str
     require_elevation: bool = False
     elevation_token: Optional[str] = None
+    # fan-out over list-valued params, e.g. {"printer": ["PRN-01", "PRN-02"]}
+    concurrency: int = 16
+    timeout_s: float = 30.0
+    rate_per_s: Optional[float] = None
 
 class ActionDecision(BaseModel):
     id: int
@@ -95,9 +182,31 @@ class ElevationRequest(BaseModel):
     scope: str
     minutes: int = 15
 
+class ChangePayload(BaseModel):
+    service: str
+    title: str
+    start: Optional[str] = None
+    end: Optional[str] = None
+
+class ServicePayload(BaseModel):
+    name: str
+    depends_on: List[str] = []
+    users_affected: int = 0
+
 class MiCreatePayload(BaseModel):
     seed_ticket_id: int
     threshold: float = 0.85
+    scope: str = "service"  # or "all": cluster across services
+
+class MiClusterPayload(BaseModel):
+    threshold: float = 0.85
+    merge_threshold: float = 0.95
+    min_size: int = 3
+    apply: bool = False
+
+class MiMergePayload(BaseModel):
+    target_id: int
+    source_ids: List[int]
 
 class WorklogPayload(BaseModel):
     ticket_id: int
@@ -116,19 +225,34 @@ async def trigger_auto_fix(ticket: AutoFixTicketIn):
     return {"task_id": task.id, "message": "Auto‑fix started in background"}
 
 # --------- Endpoints ----------
+def _bad_scope(scope: str) -> Optional[Dict[str, Any]]:
+    if scope not in store.DEDUP_SCOPES:
+        return {"ok": False, "error": f"scope must be one of {', '.join(store.DEDUP_SCOPES)}"}
+    return None
+
 @app.post("/api/triage")
-def api_triage(payload: CreateTicket):
+def api_triage(payload: CreateTicket, scope: str = "auto"):
+    bad = _bad_scope(scope)
+    if bad:
+        return bad
     textq = f"{payload.subject}\n{payload.body}".strip()
     tri = services.classify(textq)
     hits = store.kb_search(textq, k=3)
-    dupes = store.dedup(textq, k=3)
+    dupes = store.dedup(textq, k=3, service=tri.get("service"), scope=scope)
     top_kb = hits[0]["title"] if hits else None
     ctx = store.get_service_meta(tri.get("service",""))
     chg = store.get_recent_change(tri.get("service",""))
-    return {"triage": tri, "kb": hits, "duplicates": dupes, "top_kb": top_kb, "context": {"blast_radius": ctx, "recent_change": chg}}
+    impact = store.service_impact(tri.get("service",""))
+    suspects = store.suspect_changes([tri.get("service","")])
+    return {"triage": tri, "kb": hits, "duplicates": dupes, "top_kb": top_kb,
+            "context": {"blast_radius": ctx, "recent_change": chg, "suspect_changes": suspects,
+                        "downstream_open": impact["open_tickets"], "downstream_open_count": impact["open_ticket_count"]}}
 
 @app.post("/api/tickets")
-def api_create_ticket(payload: CreateTicket):
+def api_create_ticket(payload: CreateTicket, scope: str = "auto"):
+    bad = _bad_scope(scope)
+    if bad:
+        return bad
     textq = f"{payload.subject}\n{payload.body}".strip()
     tri = services.classify(textq)
     extra = {
@@ -139,13 +263,20 @@ def api_create_ticket(payload: CreateTicket):
         "assigned_to": payload.assigned_to,
     }
     t = store.add_ticket(payload.subject, payload.body, tri, attachments=[a.dict() for a in (payload.attachments or [])], extra=extra)
-    dupes = store.dedup(textq, k=3)
+    dupes = store.dedup(textq, k=3, service=tri.get("service"), scope=scope)
     store.bump_counter(tri.get("service",""))
     return {"id": t["id"], "triage": tri, "duplicates": dupes}
 
-@app.get("/api/tickets")
-def api_list_tickets(q: Optional[str] = None, service: Optional[str] = None, status: Optional[str] = None, sort: Optional[str] = None):
-    return store.list_tickets(q=q, service=service, status=status, sort=sort)
+@app.get("/api/tickets", response_class=FastJSONResponse)
+def api_list_tickets(request: Request, q: Optional[str] = None, service: Optional[str] = None, status: Optional[str] = None, sort: Optional[str] = None, limit: Optional[int] = None,
+                     in_mi: Optional[bool] = None, include_archived: Optional[bool] = None):
+    deps = ("tickets", "config", "worklogs", "archive") if in_mi is None else ("tickets", "config", "worklogs", "archive", "mi")
+    return cached_json(request, deps, lambda: store.list_tickets_json(q=q, service=service, status=status, sort=sort, limit=limit, in_mi=in_mi,
+                                                                      include_archived=include_archived), ttl=60)
+
+@app.get("/api/tickets/top_risk", response_class=FastJSONResponse)
+def api_top_risk(request: Request, n: int = 10):
+    return cached_json(request, ("tickets", "config", "worklogs"), lambda: store.list_tickets_json(status="open", sort="risk", limit=n), ttl=60)
 
 @app.post("/api/tickets/merge")
 def api_merge(payload: MergePayload):
@@ -157,8 +288,8 @@ def api_status(payload: StatusPayload):
     return {"ok": bool(t), "ticket": t}
 
 @app.get("/api/tickets/similar/{ticket_id}")
-def api_similar(ticket_id: int, k: int = 3):
-    return store.similar_to_ticket(ticket_id, k=k)
+def api_similar(ticket_id: int, k: int = 3, scope: str = "auto"):
+    return _bad_scope(scope) or store.similar_to_ticket(ticket_id, k=k, scope=scope)
 
 @app.post("/api/deflect")
 def api_deflect(payload: DeflectPayload):
@@ -166,8 +297,16 @@ def api_deflect(payload: DeflectPayload):
     return {"ok": True}
 
 @app.get("/api/metrics")
-def api_metrics():
-    return store.metrics()
+def api_metrics(request: Request):
+    return cached_json(request, ("tickets", "deflections", "archive"), store.metrics)
+
+@app.get("/api/admin/rebuilds")
+def api_rebuilds():
+    return store.rebuild_status()
+
+@app.get("/api/admin/admission")
+def api_admission():
+    return ADMISSION.status()
 
 @app.get("/api/admin/config")
 def api_get_config():
@@ -175,12 +314,49 @@ def api_get_config():
 
 @app.post("/api/admin/config")
 def api_set_config(cfg: Dict[str, Any]):
-    store.save_config(cfg)
+    try:
+        store.save_config(cfg)
+    except ValueError as e:
+        return FastJSONResponse({"ok": False, "error": "invalid_config", "detail": str(e)}, status_code=400)
     return {"ok": True}
 
+@app.post("/api/admin/snapshot")
+def api_snapshot(codec: Optional[str] = None, wait: bool = False):
+    try:
+        job = store.start_snapshot(codec, wait=wait)
+    except ValueError as e:
+        return {"ok": False, "error": str(e)}
+    return {"ok": not job["error"], "job": job}
+
+@app.get("/api/admin/snapshots")
+def api_snapshots():
+    return {"items": store.list_snapshots()}
+
+@app.post("/api/admin/archive")
+def api_archive(days: Optional[float] = None, force: bool = False):
+    return store.archive_tickets(days, force=force)
+
+@app.get("/api/admin/archive")
+def api_archive_status():
+    return store.archive_status()
+
+@app.get("/api/admin/similarity")
+def api_similarity_status():
+    return store.similarity_status()
+
+@app.get("/api/admin/online")
+def api_online_status():
+    return store.learning_status()
+
 @app.post("/api/admin/retriage")
-def api_retriage():
-    return store.retriage_missing()
+def api_retriage(mode: str = "missing", dry_run: bool = False, use_model: bool = False, background: bool = False,
+                 overwrite_priority: bool = False):
+    if mode not in retriage.MODES:
+        return FastJSONResponse({"ok": False, "error": "unknown_mode", "modes": list(retriage.MODES)}, status_code=400)
+    if mode == "missing" and not dry_run and not use_model and not background and not overwrite_priority:
+        return store.retriage_missing()
+    job = store.start_retriage(mode, dry_run=dry_run, use_model=use_model, wait=not background, overwrite_priority=overwrite_priority)
+    return {"ok": not job["error"], "job": job}
 
 @app.post("/api/kb/from_ticket")
 def api_kb_from_ticket(ticket_id: int):
@@ -207,7 +383,13 @@ def api_login(payload: LoginPayload):
         return {"ok": False, "reason": "locked"}
     if not store.check_password(u, payload.password):
         return {"ok": False, "reason": "bad_password"}
-    return {"ok": True, "role": u.get("role", "user")}
+    session = store.create_session(u["username"])
+    return {"ok": True, "role": u.get("role", "user"), "token": session["token"], "exp": session["exp"]}
+
+@app.post("/api/auth/logout")
+def api_logout(request: Request):
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return {"ok": scheme.lower() == "bearer" and store.end_session(token.strip())}
 
 @app.post("/api/auth/unlock")
 def api_unlock(payload: UnlockPayload):
@@ -215,9 +397,14 @@ def api_unlock(payload: UnlockPayload):
     store.add_notification(payload.username, "Your account has been unlocked. Please sign in.", "success")
     return {"ok": True}
 
-@app.get("/api/notifications")
-def api_notifications(user: str):
-    return {"items": store.get_notifications(user)}
+@app.get("/api/notifications", response_class=FastJSONResponse)
+def api_notifications(user: str, since_id: Optional[int] = None, limit: int = 100):
+    return FastJSONResponse({"items": store.get_notifications(user, since_id, max(1, min(limit, 1000))),
+                             "unread": store.unread_notifications(user), "read_id": store.notifications_read_id(user)})
+
+@app.post("/api/notifications/read")
+def api_notifications_read(payload: NotificationRead):
+    return {"ok": True, "read_id": store.mark_notifications_read(payload.user, payload.upto_id)}
 
 @app.post("/api/notify")
 def api_notify(payload: NotifyPayload):
@@ -261,7 +448,8 @@ def api_demo_reset(username: str = "tech2345", clear_notifications: bool = True,
 # Actions / approvals / elevation
 @app.post("/api/actions/request")
 def api_actions_request(payload: ActionRequest):
-    ap = store.add_approval(payload.action_id, payload.params, payload.requested_by, payload.require_elevation, payload.elevation_token)
+    execution = {"concurrency": max(1, min(payload.concurrency, 128)), "timeout_s": payload.timeout_s, "rate_per_s": payload.rate_per_s}
+    ap = store.add_approval(payload.action_id, payload.params, payload.requested_by, payload.require_elevation, payload.elevation_token, execution)
     return {"ok": True, "approval": ap}
 
 @app.post("/api/actions/decision")
@@ -270,12 +458,17 @@ def api_actions_decision(payload: ActionDecision):
     if not ap:
         return {"ok": False, "error": "not_found"}
     if ap["status"] == "approved":
-        ap = store.exec_approval(ap["id"], run_action)
+        params = ap.get("params") or {}
+        targets = actions.expand(ap["action_id"], params) if actions else [params]
+        if len(targets) != 1 or targets[0] is not params:
+            ap = store.exec_approval_fanout(ap["id"], targets, actions.fan_out)
+        else:
+            ap = store.exec_approval(ap["id"], run_action)
     return {"ok": True, "approval": ap}
 
-@app.get("/api/approvals")
-def api_approvals():
-    return {"items": store.list_approvals()}
+@app.get("/api/approvals", response_class=FastJSONResponse)
+def api_approvals(request: Request):
+    return cached_json(request, ("approvals",), lambda: {"items": store.list_approvals()})
 
 @app.post("/api/elevation/request")
 def api_elevation_request(payload: ElevationRequest):
@@ -289,24 +482,75 @@ def api_elevation_verify(token: str):
 # Major Incident and spikes
 @app.post("/api/mi/create")
 def api_mi_create(payload: MiCreatePayload):
-    mi = store.create_mi(payload.seed_ticket_id, th=payload.threshold)
+    mi = store.create_mi(payload.seed_ticket_id, th=payload.threshold, scope=payload.scope)
+    return {"ok": True, "mi": mi}
+
+@app.post("/api/mi/cluster")
+def api_mi_cluster(payload: MiClusterPayload):
+    job = store.cluster_backlog(payload.threshold, payload.merge_threshold, payload.min_size, payload.apply)
+    return {"ok": True, "job": job}
+
+@app.post("/api/mi/merge")
+def api_mi_merge(payload: MiMergePayload):
+    mi = store.merge_mi(payload.target_id, payload.source_ids)
+    if not mi:
+        return {"ok": False, "error": "not_found"}
     return {"ok": True, "mi": mi}
 
-@app.get("/api/mi")
-def api_mi_list():
-    return {"items": store.list_mi()}
+@app.get("/api/jobs")
+def api_jobs(kind: Optional[str] = None):
+    return {"items": jobs.list_jobs(kind)}
+
+@app.get("/api/jobs/{job_id}")
+def api_job(job_id: str):
+    job = jobs.get_job(job_id)
+    return {"ok": bool(job), "job": job}
+
+@app.get("/api/mi", response_class=FastJSONResponse)
+def api_mi_list(request: Request):
+    return cached_json(request, ("mi",), lambda: {"items": store.list_mi()})
 
 @app.get("/api/spikes")
-def api_spikes():
-    return {"items": store.get_spikes()}
+def api_spikes(request: Request):
+    return cached_json(request, ("counters", "services", "changes"), lambda: {"items": store.get_spikes()}, ttl=30)
+
+@app.get("/api/changes")
+def api_changes(service: Optional[str] = None, hours: float = 24.0):
+    return {"items": store.list_changes(service, hours)}
+
+@app.post("/api/changes")
+def api_add_change(payload: ChangePayload):
+    c = store.add_change(payload.service, payload.title, payload.start, payload.end)
+    if c is None:
+        return {"ok": False, "error": "bad_timestamp"}
+    return {"ok": True, "change": c}
+
+@app.get("/api/mi/{mi_id}/impact")
+def api_mi_impact(mi_id: int):
+    res = store.mi_impact(mi_id)
+    if res is None:
+        return {"ok": False, "error": "not_found"}
+    return res
+
+@app.get("/api/services/impact")
+def api_service_impact(service: str):
+    return store.service_impact(service)
+
+@app.post("/api/services")
+def api_upsert_service(payload: ServicePayload):
+    return {"ok": True, "service": store.upsert_service(payload.name, payload.depends_on, payload.users_affected)}
+
+@app.post("/api/services/delete")
+def api_delete_service(name: str):
+    return {"ok": store.delete_service(name)}
 
 @app.get("/api/metrics/breakdown")
-def api_metrics_breakdown():
-    return store.metrics_breakdown()
+def api_metrics_breakdown(request: Request):
+    return cached_json(request, ("tickets", "archive"), store.metrics_breakdown)
 
 @app.get("/api/metrics/series")
-def api_metrics_series(hours: int = 24):
-    return store.metrics_series(hours)
+def api_metrics_series(request: Request, hours: int = 24):
+    return cached_json(request, ("counters",), lambda: store.metrics_series(hours), ttl=60)
 
 @app.get("/api/mi/for_ticket/{ticket_id}")
 def api_mi_for_ticket(ticket_id: int):
@@ -315,13 +559,11 @@ def api_mi_for_ticket(ticket_id: int):
 
 @app.post("/api/tickets/worklog")
 def api_worklog(payload: WorklogPayload):
-    for t in store.TICKETS:
-        if t["id"] == payload.ticket_id:
-            t.setdefault("worklogs", []).append({
-                "author": payload.author,
-                "note": payload.note,
-                "ts": datetime.now(timezone.utc).isoformat()
-            })
-            store._save_json(store.TICKETS_JSON, store.TICKETS)
-            return {"ok": True}
-    return {"ok": False, "error": "not_found"}
\ No newline at end of file
+    w = store.add_worklog(payload.ticket_id, payload.author, payload.note)
+    if not w:
+        return {"ok": False, "error": "not_found"}
+    return {"ok": True, "worklog": w}
+
+@app.get("/api/tickets/{ticket_id}/worklog", response_class=FastJSONResponse)
+def api_ticket_worklog(ticket_id: int, offset: int = 0, limit: int = 50):
+    return FastJSONResponse(store.get_worklog(ticket_id, max(0, offset), max(1, min(limit, 500))))
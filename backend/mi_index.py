@@ -0,0 +1,82 @@
+# backend/mi_index.py
+import bisect
+from typing import Dict, Any, Iterable, List, Optional
+import numpy as np
+
+INACTIVE = {"merged", "closed", "resolved"}
+
+def is_active(mi: Dict[str, Any]) -> bool:
+    return (mi.get("status") or "active") not in INACTIVE
+
+def as_members(ids: Iterable[int]) -> np.ndarray:
+    """Sorted, de-duplicated int64 member array."""
+    return np.unique(np.fromiter(ids, dtype=np.int64))
+
+def union(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.union1d(a, b)
+
+def intersect(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.intersect1d(a, b, assume_unique=True)
+
+class MiIndex:
+    """MI members as sorted arrays plus a ticket -> MI ids reverse index, kept in step with MI."""
+
+    def __init__(self):
+        self.rebuild([])
+
+    def rebuild(self, mis: Iterable[Dict[str, Any]]):
+        self.members: Dict[int, np.ndarray] = {}
+        self.by_ticket: Dict[int, List[int]] = {}
+        self.active: set = set()
+        self._active_union: Optional[np.ndarray] = None
+        for mi in mis:
+            self.add(mi)
+
+    def add(self, mi: Dict[str, Any]):
+        mid = mi["id"]
+        arr = as_members(mi.get("members") or [])
+        self.members[mid] = arr
+        for t in arr.tolist():
+            bisect.insort(self.by_ticket.setdefault(t, []), mid)
+        if is_active(mi):
+            self.active.add(mid)
+        self._active_union = None
+
+    def discard(self, mid: int):
+        arr = self.members.pop(mid, None)
+        if arr is None:
+            return
+        for t in arr.tolist():
+            mids = self.by_ticket.get(t)
+            if mids and mid in mids:
+                mids.remove(mid)
+                if not mids:
+                    del self.by_ticket[t]
+        self.active.discard(mid)
+        self._active_union = None
+
+    def update(self, mi: Dict[str, Any]):
+        self.discard(mi["id"])
+        self.add(mi)
+
+    def for_ticket(self, ticket_id: int) -> List[int]:
+        """MI ids containing the ticket, active ones first, each group oldest first."""
+        mids = self.by_ticket.get(ticket_id, [])
+        return [m for m in mids if m in self.active] + [m for m in mids if m not in self.active]
+
+    def overlaps(self, ids: Iterable[int]) -> bool:
+        return any(t in self.by_ticket for t in ids)
+
+    def active_members(self) -> np.ndarray:
+        if self._active_union is None:
+            arrs = [self.members[m] for m in self.active]
+            self._active_union = np.unique(np.concatenate(arrs)) if arrs else np.empty(0, dtype=np.int64)
+        return self._active_union
+
+    def in_active(self, ids: np.ndarray) -> np.ndarray:
+        """Boolean mask over ticket ids: member of any active MI."""
+        act = self.active_members()
+        if not act.size or not ids.size:
+            return np.zeros(ids.shape, dtype=bool)
+        pos = np.minimum(np.searchsorted(act, ids), act.size - 1)
+        return act[pos] == ids
@@ -2,6 +2,7 @@
 Train a ticket classifier and a similarity index for suggestion lookup.
 Expects a CSV (sample_tickets.csv) with columns: ticket_id, text, category, priority, solution
 """
+import numpy as np
 import pandas as pd
 import joblib
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -49,10 +50,60 @@ def build_similarity_index(df):
     print("Saved similarity index and ticket lookup.")
     return vect, nn
 
+def export_compiled(cat_pipe=None, pri_pipe=None, check_texts=None):
+    """Flatten both classifier pipelines into plain arrays for utils' fast path: one merged
+    vocabulary, and per term the idf-scaled weights of every class of both heads, so one
+    tokenisation and one dot product give both labels. Needs no sklearn to load."""
+    cat_pipe = cat_pipe or joblib.load(f"{ARTIFACT_DIR}/category_pipeline.joblib")
+    pri_pipe = pri_pipe or joblib.load(f"{ARTIFACT_DIR}/priority_pipeline.joblib")
+    heads = [(p.named_steps['tfidf'], p.named_steps['clf']) for p in (cat_pipe, pri_pipe)]
+    params = [v.get_params() for v, _ in heads]
+    same = ('lowercase', 'token_pattern', 'ngram_range')
+    if any(p[k] != params[0][k] for p in params for k in same):
+        raise ValueError("pipelines must tokenise the same way to share one vocabulary")
+    for p in params:
+        if p['analyzer'] != 'word' or p['stop_words'] or p['strip_accents'] or p['preprocessor'] or p['tokenizer'] \
+                or p['sublinear_tf'] or p['binary'] or p['norm'] != 'l2' or not p['use_idf']:
+            raise ValueError("only word n-grams with raw-count tf, idf and l2 norm can be compiled")
+
+    import utils
+    vocab = {}
+    for v, _ in heads:
+        for term in v.vocabulary_:
+            vocab.setdefault(term, len(vocab))
+    n = len(vocab)
+    W, b, idf, classes = [], [], np.zeros((n, len(heads)), dtype=np.float32), []
+    for h, (v, clf) in enumerate(heads):
+        coef, icpt = clf.coef_, clf.intercept_
+        if coef.shape[0] == 1:  # binary: sigmoid(z) == softmax([0, z])
+            coef, icpt = np.vstack([np.zeros_like(coef), coef]), np.concatenate([[0.0], icpt])
+        rows = np.array([vocab[t] for t in v.vocabulary_])
+        cols = np.array(list(v.vocabulary_.values()))
+        w = np.zeros((n, coef.shape[0]))
+        w[rows] = (coef[:, cols] * v.idf_[cols]).T
+        idf[rows, h] = v.idf_[cols]
+        W.append(w)
+        b.append(icpt)
+        classes.append([str(c) for c in clf.classes_])
+    compiled = {"vocab": vocab, "W": np.hstack(W).astype(np.float32), "b": np.concatenate(b).astype(np.float32),
+                "idf": idf, "classes": classes, "token_pattern": params[0]['token_pattern'],
+                "lowercase": params[0]['lowercase'], "ngram_range": tuple(params[0]['ngram_range']),
+                "source": utils.pipeline_fingerprint()}
+
+    texts = list(check_texts if check_texts is not None else load_data()['text'])
+    fast = utils.classify_compiled(compiled, texts)
+    for t, f, c, p in zip(texts, fast, cat_pipe.predict(texts), pri_pipe.predict(texts)):
+        if (f['category'], f['priority']) != (str(c), str(p)):
+            raise ValueError(f"compiled classifier disagrees with sklearn on {t!r}")
+    joblib.dump(compiled, f"{ARTIFACT_DIR}/classifier_compiled.joblib")
+    print(f"Saved compiled classifier ({n} terms, checked on {len(texts)} texts).")
+    return compiled
+
 def main():
     df = load_data()
-    train_classifier(df)
-    train_priority_classifier(df)
+    cat_pipe = train_classifier(df)
+    pri_pipe = train_priority_classifier(df)
+    export_compiled(cat_pipe, pri_pipe, df['text'])
     build_similarity_index(df)
 
 if __name__ == '__main__':
@@ -0,0 +1,192 @@
+# backend/notifications.py
+import os, bisect, threading
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote
+import fastjson
+
+class NotificationStore:
+    """Notifications partitioned per user into append-only JSON-lines segments under `root`.
+    A user's segment is read the first time it is asked for; adding appends one line. Ids
+    come from a global sequence, so each segment is sorted by id and since_id/unread
+    counts are bisects. Read cursors hold the highest id each user has seen. Request threads
+    add concurrently, so the sequence, segment offsets and caches change under `_lock`."""
+
+    def __init__(self, root: Path, max_per_user: int = 500, retention_days: float = 30):
+        self.root = root
+        self.max_per_user = max_per_user
+        self.retention_days = retention_days
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._seq = root / "_seq"
+        self._cursors = root / "_cursors.json"
+        self._lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        with self._lock:
+            self._parts: Dict[str, Dict[str, Any]] = {}
+            self.cursors: Dict[str, int] = self._read_json(self._cursors, {})
+            try:
+                self.next_id = int(self._seq.read_text())
+            except (OSError, ValueError):
+                self.next_id = self._scan_max_id() + 1
+
+    @staticmethod
+    def _read_json(path: Path, default):
+        try:
+            return fastjson.loads(path.read_bytes())
+        except (OSError, ValueError):
+            return default
+
+    def _path(self, username: str) -> Path:
+        return self.root / f"u_{quote(username or '', safe='@._-')}.jsonl"
+
+    def _segments(self) -> Iterable[Path]:
+        return self.root.glob("u_*.jsonl")
+
+    def _scan_max_id(self) -> int:
+        best = 0
+        for p in self._segments():
+            lines = p.read_bytes().rstrip(b"\n").rsplit(b"\n", 1)
+            if lines[-1]:
+                best = max(best, fastjson.loads(lines[-1]).get("id", 0))
+        return best
+
+    def _read(self, path: Path, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+        end = data.rfind(b"\n") + 1  # ignore a partially written last line
+        return [fastjson.loads(l) for l in data[:end].splitlines() if l], offset + end
+
+    def _part(self, username: str) -> Dict[str, Any]:
+        with self._lock:
+            part = self._parts.get(username)
+            if part is None:
+                items, offset = self._read(self._path(username))
+                part = {"items": items, "ids": [n["id"] for n in items], "offset": offset}
+                self._parts[username] = part
+            return part
+
+    def _write_segment(self, username: str, items: List[Dict[str, Any]]):
+        path = self._path(username)
+        if not items:
+            path.unlink(missing_ok=True)
+            self._parts.pop(username, None)
+            return
+        tmp = path.with_suffix(".tmp")
+        data = b"".join(fastjson.dumps(n) + b"\n" for n in items)
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._parts[username] = {"items": items, "ids": [n["id"] for n in items], "offset": len(data)}
+
+    # ---- writes ----
+    def add(self, username: str, message: str, ntype: str = "info", link: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            evt = {"id": self.next_id, "username": username, "message": message, "type": ntype,
+                   "ts": datetime.now(timezone.utc).isoformat()}
+            if link:
+                evt["link"] = link
+            self.next_id += 1
+            self._seq.write_text(str(self.next_id))
+            part = self._part(username)
+            line = fastjson.dumps(evt) + b"\n"
+            with open(self._path(username), "ab") as f:
+                f.write(line)
+            part["items"].append(evt)
+            part["ids"].append(evt["id"])
+            part["offset"] += len(line)
+            if len(part["items"]) > self.max_per_user + self.max_per_user // 4:
+                self._write_segment(username, part["items"][-self.max_per_user:])
+            return evt
+
+    def mark_read(self, username: str, upto_id: Optional[int] = None) -> int:
+        with self._lock:
+            ids = self._part(username)["ids"]
+            upto = ids[-1] if (upto_id is None and ids) else (upto_id or 0)
+            if upto > self.cursors.get(username, 0):
+                self.cursors[username] = upto
+                self._cursors.write_bytes(fastjson.dumps(self.cursors))
+            return self.cursors.get(username, 0)
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """Apply retention (age and per-user cap) to every segment; only rewrites segments that shrink."""
+        with self._lock:
+            cutoff = ((now or datetime.now(timezone.utc)) - timedelta(days=self.retention_days)).isoformat()
+            dropped = 0
+            for path in list(self._segments()):
+                username = unquote(path.stem[2:])
+                part = self._parts.get(username)
+                if part is None or len(part["items"]) <= self.max_per_user:
+                    with open(path, "rb") as f:
+                        first = f.readline()
+                    if not first or fastjson.loads(first).get("ts", "") >= cutoff:
+                        continue
+                items = self._part(username)["items"]
+                keep = [x for x in items[-self.max_per_user:] if x.get("ts", "") >= cutoff]
+                if len(keep) < len(items):
+                    dropped += len(items) - len(keep)
+                    self._write_segment(username, keep)
+            return dropped
+
+    def clear(self):
+        with self._lock:
+            for path in list(self._segments()):
+                path.unlink(missing_ok=True)
+            self._parts.clear()
+            self.cursors = {}
+            self._cursors.write_bytes(b"{}")
+
+    def migrate(self, legacy: List[Dict[str, Any]]):
+        """Import the old single-list notifications.json into per-user segments."""
+        with self._lock:
+            by_user: Dict[str, List[Dict[str, Any]]] = {}
+            for n in sorted(legacy, key=lambda x: x.get("id", 0)):
+                by_user.setdefault(n.get("username") or "", []).append(n)
+            for username, items in by_user.items():
+                self._write_segment(username, self._part(username)["items"] + items)
+            if legacy:
+                self.next_id = max(self.next_id, max(n.get("id", 0) for n in legacy) + 1)
+                self._seq.write_text(str(self.next_id))
+
+    # ---- reads ----
+    def list(self, username: str, since_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest first; only ids greater than since_id; at most limit items."""
+        part = self._part(username)
+        start = bisect.bisect_right(part["ids"], since_id) if since_id else 0
+        if limit is not None:
+            start = max(start, len(part["items"]) - limit)
+        return part["items"][start:][::-1]
+
+    def unread(self, username: str) -> int:
+        ids = self._part(username)["ids"]
+        return len(ids) - bisect.bisect_right(ids, self.cursors.get(username, 0))
+
+    def sync(self):
+        """Pick up what another process appended: tail-read grown segments, drop rewritten ones."""
+        with self._lock:
+            try:
+                self.next_id = max(self.next_id, int(self._seq.read_text()))
+            except (OSError, ValueError):
+                pass
+            self.cursors = self._read_json(self._cursors, {})
+            for username, part in list(self._parts.items()):
+                try:
+                    size = self._path(username).stat().st_size
+                except FileNotFoundError:
+                    size = 0
+                if size < part["offset"] or (size > part["offset"] and not self._tail(part, username)):
+                    self._parts.pop(username)
+
+    def _tail(self, part: Dict[str, Any], username: str) -> bool:
+        items, offset = self._read(self._path(username), part["offset"])
+        if items and part["ids"] and items[0]["id"] <= part["ids"][-1]:
+            return False  # rewritten to the same size or larger; reload from scratch
+        part["items"] += items
+        part["ids"] += [n["id"] for n in items]
+        part["offset"] = offset
+        return True
@@ -0,0 +1,263 @@
+# backend/online.py
+import copy, logging, os, re, threading, time, zlib
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+import numpy as np
+import joblib
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+log = logging.getLogger(__name__)
+
+HEADS = ("category", "priority")
+ONLINE_DIR = Path(os.environ.get("TICKETPILOT_ONLINE_DIR", "artifacts/online"))
+
+# The online model learns in the offline pipelines' label space (nlp_train: Communication,
+# Configuration, ... / Critical, High, Medium), so serving it changes no caller's vocabulary.
+# Store tickets carry a service and a P-code; these map them there.
+SERVICE_CATEGORY = {"vpn": "Security", "identity": "Security", "sap basis": "Configuration", "desktop": "Hardware",
+                    "desktop/printer": "Hardware", "email/outlook": "Communication", "network": "Communication",
+                    "scada": "SCADA", "database": "Database", "db": "Database"}
+PRIORITY_LABEL = {"P1": "Critical", "P2": "High", "P3": "Medium", "P4": "Medium"}
+# One example in HOLDOUT_EVERY (by text hash) is held out, not trained on; a checkpoint is only
+# served once it is at least as accurate as the offline pipelines on MIN_HOLDOUT of them.
+HOLDOUT_EVERY = 5
+HOLDOUT_MAX = 1000
+MIN_HOLDOUT = 20
+
+def offline_labels(t: Dict[str, Any], classes: Optional[Dict[str, Sequence[str]]] = None) -> Dict[str, Optional[str]]:
+    """A store ticket's labels in the offline label space; None where it has no such label."""
+    pri = (t.get("priority") or "").upper()
+    labels = {"category": t.get("category") or SERVICE_CATEGORY.get((t.get("service") or "").strip().lower()),
+              "priority": PRIORITY_LABEL.get(pri, t.get("priority"))}
+    if classes:
+        labels = {h: y if y in classes.get(h, ()) else None for h, y in labels.items()}
+    return labels
+
+class OnlineModel:
+    """Hashed uni+bigram features and, per head, one binary SGD logistic model per label.
+    A label seen for the first time just gets a new model, so the label set can grow while
+    the others keep learning (SGDClassifier.partial_fit needs every class up front)."""
+
+    def __init__(self, n_features: int = 2 ** 18, alpha: float = 1e-5):
+        self.vect = HashingVectorizer(ngram_range=(1, 2), n_features=n_features, alternate_sign=False)
+        self.alpha = alpha
+        self.models: Dict[str, Dict[str, SGDClassifier]] = {h: {} for h in HEADS}
+        self.version = 0
+        self.seen = 0
+        self.holdout: List[Tuple[str, Dict[str, Optional[str]]]] = []
+        self.gate: Dict[str, Any] = {}
+        self.promoted = False  # passed the holdout gate: utils may serve it
+
+    def partial_fit(self, texts: List[str], labels: Dict[str, List[Optional[str]]]):
+        X = self.vect.transform(texts)
+        for head, ys in labels.items():
+            rows = [i for i, y in enumerate(ys) if y]
+            if not rows:
+                continue
+            Xh = X[rows]
+            yh = np.array([ys[i] for i in rows], dtype=object)
+            models = self.models[head]
+            for y in set(yh.tolist()) - models.keys():
+                models[y] = SGDClassifier(loss="log_loss", alpha=self.alpha)
+            for label, clf in models.items():
+                clf.partial_fit(Xh, (yh == label).astype(np.int8), classes=np.array([0, 1], dtype=np.int8))
+        self.seen += len(texts)
+
+    def ready(self) -> bool:
+        return all(len(self.models[h]) >= 2 for h in HEADS)
+
+    def _scores(self, head: str, X) -> Tuple[List[str], np.ndarray]:
+        labels = sorted(self.models[head])
+        if not labels:
+            return [], np.zeros((X.shape[0], 0))
+        W = np.vstack([self.models[head][l].coef_.ravel() for l in labels])
+        b = np.array([self.models[head][l].intercept_[0] for l in labels])
+        return labels, np.asarray(X @ W.T) + b
+
+    def classify_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Same shape as utils.classify_batch; confidences are a softmax over the per-label scores."""
+        X = self.vect.transform(texts)
+        out = [{} for _ in texts]
+        for head in HEADS:
+            labels, s = self._scores(head, X)
+            if not labels:
+                for o in out:
+                    o[head], o[f"{head}_conf"] = None, None
+                continue
+            p = np.exp(s - s.max(axis=1, keepdims=True))
+            p /= p.sum(axis=1, keepdims=True)
+            best = p.argmax(axis=1)
+            for o, k, row in zip(out, best, p):
+                o[head], o[f"{head}_conf"] = labels[k], float(row[k])
+        return out
+
+# ------------- Checkpoints -------------
+_CKPT = re.compile(r"model-v(\d+)\.joblib$")
+
+def versions(root: Path) -> List[int]:
+    return sorted(int(m.group(1)) for p in root.glob("model-v*.joblib") if (m := _CKPT.search(p.name)))
+
+def latest_version(root: Path) -> int:
+    try:
+        return int((root / "CURRENT").read_text())
+    except (OSError, ValueError):
+        return 0
+
+def load(root: Path, version: Optional[int] = None) -> Optional[OnlineModel]:
+    version = version or latest_version(root)
+    if not version:
+        return None
+    try:
+        return joblib.load(root / f"model-v{version}.joblib")
+    except (OSError, EOFError):
+        return None
+
+def save(root: Path, model: OnlineModel, keep: int = 5):
+    """Write model-v{version}, then flip CURRENT; readers never see a half-written checkpoint.
+    Compressed: the dense per-label weight vectors are mostly zeros."""
+    root.mkdir(parents=True, exist_ok=True)
+    path = root / f"model-v{model.version}.joblib"
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    joblib.dump(model, tmp, compress=3)
+    os.replace(tmp, path)
+    tmp = root / f".CURRENT.{os.getpid()}.tmp"
+    tmp.write_text(str(model.version))
+    os.replace(tmp, root / "CURRENT")
+    for v in versions(root)[:-keep]:
+        (root / f"model-v{v}.joblib").unlink(missing_ok=True)
+
+def _held_out(text: str) -> bool:
+    return zlib.crc32(text.encode("utf-8")) % HOLDOUT_EVERY == 0
+
+def _accuracy(preds: List[Dict[str, Any]], labels: List[Optional[str]], head: str) -> Optional[float]:
+    rows = [i for i, y in enumerate(labels) if y]
+    return sum(preds[i][head] == labels[i] for i in rows) / len(rows) if rows else None
+
+class OnlineLearner:
+    """Queues labelled tickets and trains them in micro-batches on a background thread, once
+    `batch_size` are waiting or the oldest has waited `max_wait` seconds. Every batch becomes the
+    next version and is handed to on_swap; it is checkpointed at most every `checkpoint_every`
+    seconds (and by checkpoint()). A batch continues from a newer checkpoint if another worker
+    wrote one, dropping what this one trained since its own last checkpoint. Labels outside
+    `classes` are dropped; held-out examples are kept
+    in the model and each version is scored on them against `baseline` (the offline
+    classifier) to decide whether it is promoted."""
+
+    def __init__(self, root: Path, batch_size: int = 32, max_wait: float = 5.0, keep: int = 5, lock=None, on_swap=None,
+                 classes: Optional[Dict[str, Sequence[str]]] = None,
+                 baseline: Optional[Callable[[List[str]], List[Dict[str, Any]]]] = None, checkpoint_every: float = 300.0):
+        self.root = root
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.checkpoint_every = checkpoint_every
+        self.keep = keep
+        self.lock = lock  # cross-process write lock factory, e.g. SharedState.write_lock
+        self.on_swap = on_swap
+        self.classes = classes
+        self.baseline = baseline
+        self.model: Optional[OnlineModel] = None
+        self.stats = {"batches": 0, "tickets": 0, "train_s": 0.0, "checkpoints": 0, "errors": 0, "last_error": None}
+        self._saved = 0  # version of the checkpoint self.model was loaded from or last written as
+        self._saved_at = float("-inf")
+        self._queue: List[Tuple[str, Dict[str, Optional[str]]]] = []
+        self._first_at = 0.0
+        self._cv = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def observe(self, text: str, labels: Dict[str, Optional[str]]):
+        with self._cv:
+            if not self._queue:
+                self._first_at = time.monotonic()
+            self._queue.append((text, labels))
+            if len(self._queue) >= self.batch_size:
+                self._cv.notify()
+
+    def flush(self) -> Optional[int]:
+        with self._cv:
+            batch, self._queue = self._queue, []
+        if not batch:
+            return None
+        with (self.lock() if self.lock else nullcontext()):
+            cur = latest_version(self.root)
+            if self.model is None or cur > self._saved:
+                self.model = load(self.root, cur) or self.model or OnlineModel()
+                self._saved = cur
+            if self.classes:
+                batch = [(t, {h: y if y in self.classes.get(h, ()) else None for h, y in lab.items()}) for t, lab in batch]
+            held = [(t, lab) for t, lab in batch if _held_out(t)]
+            train = [(t, lab) for t, lab in batch if not _held_out(t)]
+            model = self.model
+            model.holdout = (getattr(model, "holdout", []) + held)[-HOLDOUT_MAX:]
+            t0 = time.perf_counter()
+            if train:
+                model.partial_fit([t for t, _ in train], {h: [lab.get(h) for _, lab in train] for h in HEADS})
+            self.stats["train_s"] += time.perf_counter() - t0
+            self._gate(model)
+            model.version = max(cur, model.version) + 1
+            if time.monotonic() - self._saved_at >= self.checkpoint_every:
+                self._checkpoint()
+        self.stats["batches"] += 1
+        self.stats["tickets"] += len(batch)
+        if self.on_swap is not None:
+            self.on_swap(copy.deepcopy(self.model))  # serving gets its own copy; training continues on ours
+        return self.model.version
+
+    def _checkpoint(self):
+        model = self.model
+        model.version = max(versions(self.root) + [model.version - 1]) + 1
+        save(self.root, model, self.keep)
+        self._saved, self._saved_at = model.version, time.monotonic()
+        self.stats["checkpoints"] += 1
+
+    def checkpoint(self):
+        """Write the model now if it has trained since its last checkpoint (e.g. at shutdown)."""
+        with (self.lock() if self.lock else nullcontext()):
+            if self.model is not None and self.model.version > self._saved:
+                self._checkpoint()
+
+    def _gate(self, model: OnlineModel):
+        """Promote the model if, on the held-out examples, it is at least as accurate as the
+        baseline on every head."""
+        texts = [t for t, _ in model.holdout]
+        model.gate, model.promoted = {"holdout": len(texts)}, False
+        if len(texts) < MIN_HOLDOUT or not model.ready() or self.baseline is None:
+            return
+        ours, theirs = model.classify_batch(texts), self.baseline(texts)
+        ok = True
+        for head in HEADS:
+            labels = [lab.get(head) for _, lab in model.holdout]
+            acc, base = _accuracy(ours, labels, head), _accuracy(theirs, labels, head)
+            model.gate[head] = {"online": acc, "offline": base}
+            ok = ok and acc is not None and acc >= base
+        model.promoted = ok
+
+    def _loop(self):
+        while True:
+            with self._cv:
+                while len(self._queue) < self.batch_size:
+                    timeout = None if not self._queue else max(0.0, self._first_at + self.max_wait - time.monotonic())
+                    if timeout == 0.0:
+                        break
+                    self._cv.wait(timeout)
+            try:
+                self.flush()
+            except Exception as e:
+                self.stats["errors"] += 1
+                self.stats["last_error"] = f"{type(e).__name__}: {e}"
+                log.exception("online learning batch failed")
+                time.sleep(self.max_wait)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="online-learner", daemon=True)
+            self._thread.start()
@@ -0,0 +1,98 @@
+# backend/partitions.py
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+import numpy as np
+import sla
+
+CLASSES = ("open", "resolved", "merged")
+Key = Tuple[str, str]
+
+def service_key(service: Optional[str]) -> str:
+    return (service or "").strip().lower()
+
+def status_class(t: Dict[str, Any]) -> str:
+    st = (t.get("status") or "open").lower()
+    return "merged" if st == "merged" else "resolved" if st in sla.CLOSED_STATUSES else "open"
+
+def partition(t: Dict[str, Any]) -> Key:
+    return service_key(t.get("service")), status_class(t)
+
+class PartitionIndex:
+    """Rows of the ticket similarity matrix grouped by (service, status class). A query is
+    multiplied against the rows of the partitions it names only. A ticket whose service or
+    status changes just moves between partitions; a partition's rows are re-sliced from the
+    matrix on its next search."""
+
+    def __init__(self):
+        self.matrix = None
+        self._ids = np.zeros(0, dtype=np.int64)  # matrix row -> ticket id
+        self._row: Dict[int, int] = {}
+        self._key: List[Key] = []
+        self._members: Dict[Key, Set[int]] = {}
+        self._subs: Dict[Key, Tuple[np.ndarray, Any]] = {}
+        self._lock = threading.Lock()
+
+    def rebuild(self, tickets: List[Dict[str, Any]], matrix):
+        """tickets[i] is row i of matrix."""
+        ids = np.fromiter((t["id"] for t in tickets), dtype=np.int64, count=len(tickets))
+        keys = [partition(t) for t in tickets]
+        members: Dict[Key, Set[int]] = {}
+        for r, key in enumerate(keys):
+            members.setdefault(key, set()).add(r)
+        with self._lock:
+            self.matrix, self._ids, self._key, self._members, self._subs = matrix, ids, keys, members, {}
+            self._row = {tid: r for r, tid in enumerate(ids.tolist())}
+
+    def invalidate(self):
+        self.matrix = None
+
+    def upsert(self, t: Dict[str, Any]):
+        r = self._row.get(t["id"])
+        if r is None:
+            return  # not in the matrix yet; the rebuild after the next refit places it
+        key = partition(t)
+        with self._lock:
+            old = self._key[r]
+            if key == old:
+                return
+            self._members[old].discard(r)
+            self._members.setdefault(key, set()).add(r)
+            self._key[r] = key
+            self._subs.pop(old, None)
+            self._subs.pop(key, None)
+
+    def keys(self, service: Optional[str] = None, classes: Tuple[str, ...] = ("open", "resolved"), others: bool = False) -> List[Key]:
+        """Partitions of `classes`: all of them, the service's, or with others every other service's."""
+        svc = service_key(service)
+        return sorted(k for k in self._members if k[1] in classes and (service is None or (k[0] == svc) != others))
+
+    def sizes(self) -> Dict[str, int]:
+        return {f"{svc or '-'}/{cls}": len(rows) for (svc, cls), rows in sorted(self._members.items()) if rows}
+
+    def _sub(self, key: Key) -> Tuple[np.ndarray, Any]:
+        with self._lock:
+            got = self._subs.get(key)
+            if got is None:
+                rows = np.fromiter(sorted(self._members.get(key, ())), dtype=np.int64)
+                got = self._subs[key] = (rows, self.matrix[rows])
+        return got
+
+    def _scores(self, q, keys: List[Key]) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        for key in keys:
+            rows, sub = self._sub(key)
+            if len(rows):
+                yield rows, (sub @ q.T).toarray().ravel()
+
+    def search(self, q, keys: List[Key], k: int) -> List[Tuple[int, float]]:
+        """(ticket_id, cosine) of the k best rows in `keys`; q is a normalised query row."""
+        best: List[Tuple[float, int]] = []
+        for rows, sims in self._scores(q, keys):
+            top = np.argpartition(-sims, k - 1)[:k] if len(sims) > k else np.arange(len(sims))
+            best += [(float(sims[i]), int(self._ids[rows[i]])) for i in top]
+        best.sort(key=lambda x: -x[0])
+        return [(tid, sim) for sim, tid in best[:k]]
+
+    def above(self, q, keys: List[Key], th: float) -> List[int]:
+        """Ids of every row in `keys` with cosine >= th, in matrix order."""
+        hits = [rows[sims >= th] for rows, sims in self._scores(q, keys)]
+        return self._ids[np.sort(np.concatenate(hits))].tolist() if hits else []
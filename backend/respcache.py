@@ -0,0 +1,49 @@
+# backend/respcache.py
+import hashlib, threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+def make_etag(key: Any) -> str:
+    return '"' + hashlib.blake2b(repr(key).encode("utf-8"), digest_size=12).hexdigest() + '"'
+
+class ResponseCache:
+    """LRU of encoded response bodies keyed by (endpoint, params, data version), bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = 64 * 2**20, max_entries: int = 4096):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._items: "OrderedDict[Any, Tuple[str, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: Any) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item
+
+    def put(self, key: Any, etag: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._items[key] = (etag, body)
+            self._bytes += len(body)
+            while self._items and (self._bytes > self.max_bytes or len(self._items) > self.max_entries):
+                _, (_, b) = self._items.popitem(last=False)
+                self._bytes -= len(b)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        return {"entries": len(self._items), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,88 @@
+# backend/retriage.py
+import threading
+from concurrent.futures import as_completed
+from typing import Dict, Any, List, Tuple, Callable, Optional
+import services, jobs
+
+SHARD_SIZE = 500
+FIELDS = ("service", "assignment_group", "priority", "triage_confidence")
+ML_FIELDS = ("ml_category", "ml_category_conf", "ml_priority", "ml_priority_conf")
+SAMPLE = 50
+MODES = ("missing", "all")
+
+def classify_shard(items: List[Tuple[int, str]], use_model: bool = False) -> List[Tuple[int, Dict[str, Any]]]:
+    """Runs in a worker process: rule-based triage plus, optionally, the trained pipelines in one batch."""
+    out = []
+    for tid, text in items:
+        tri = services.classify(text)
+        out.append((tid, {"service": tri["service"], "assignment_group": tri["assignment_group"],
+                          "priority": tri["priority"], "triage_confidence": tri["confidence"]}))
+    if use_model and items:
+        import utils
+        for (_, vals), ml in zip(out, utils.classify_batch([text for _, text in items])):
+            vals.update({"ml_category": ml["category"], "ml_category_conf": round(ml["category_conf"], 4),
+                         "ml_priority": ml["priority"], "ml_priority_conf": round(ml["priority_conf"], 4)})
+    return out
+
+def diff(results: List[Tuple[int, Dict[str, Any]]], get_ticket: Callable[[int], Optional[Dict[str, Any]]],
+         overwrite_priority: bool = False) -> List[Dict[str, Any]]:
+    """Field changes per ticket. A priority raised by the SLA escalator or set by an agent
+    (priority_source) is kept unless overwrite_priority."""
+    changes = []
+    for tid, vals in results:
+        t = get_ticket(tid)
+        if t is None:
+            continue
+        keep = () if overwrite_priority or not t.get("priority_source") else ("priority",)
+        delta = {f: [t.get(f), v] for f, v in vals.items() if t.get(f) != v and f not in keep}
+        if delta:
+            changes.append({"id": tid, "changes": delta})
+    return changes
+
+def summarize(changes: List[Dict[str, Any]], total: int, dry_run: bool) -> Dict[str, Any]:
+    by_field: Dict[str, int] = {}
+    moves: Dict[str, int] = {}
+    for c in changes:
+        for f, (old, new) in c["changes"].items():
+            by_field[f] = by_field.get(f, 0) + 1
+            if f in ("service", "priority"):
+                key = f"{f}: {old or '-'} -> {new}"
+                moves[key] = moves.get(key, 0) + 1
+    return {"updated": len(changes), "total": total, "dry_run": dry_run, "by_field": by_field,
+            "transitions": dict(sorted(moves.items(), key=lambda kv: -kv[1])), "sample": changes[:SAMPLE]}
+
+def run(job: Dict[str, Any], items: List[Tuple[int, str]], get_ticket, apply, dry_run: bool, use_model: bool, shard_size: int,
+        overwrite_priority: bool = False) -> Dict[str, Any]:
+    results: List[Tuple[int, Dict[str, Any]]] = []
+    if len(items) > shard_size:
+        pool = jobs.pool()
+        futs = {pool.submit(classify_shard, items[k:k + shard_size], use_model): min(shard_size, len(items) - k)
+                for k in range(0, len(items), shard_size)}
+        for fut in as_completed(futs):
+            results.extend(fut.result())
+            job["done"] += futs[fut]
+    else:
+        results = classify_shard(items, use_model)
+        job["done"] = len(items)
+    changes = diff(results, get_ticket, overwrite_priority)
+    if changes and not dry_run:
+        apply(changes)
+    return summarize(changes, len(items), dry_run)
+
+def start(items: List[Tuple[int, str]], get_ticket, apply: Callable[[List[Dict[str, Any]]], None], dry_run: bool = False,
+          use_model: bool = False, shard_size: int = SHARD_SIZE, wait: bool = False, params: Optional[Dict[str, Any]] = None,
+          overwrite_priority: bool = False) -> Dict[str, Any]:
+    """Classify items across the process pool, diff against the live tickets and apply all changes in one batch."""
+    job = jobs.new_job("retriage", total=len(items), params=params)
+
+    def _run():
+        try:
+            jobs.finish(job, run(job, items, get_ticket, apply, dry_run, use_model, shard_size, overwrite_priority))
+        except Exception as e:
+            jobs.finish(job, error=f"{type(e).__name__}: {e}")
+
+    if wait:
+        _run()
+    else:
+        threading.Thread(target=_run, daemon=True).start()
+    return job
@@ -0,0 +1,210 @@
+# backend/scheduler.py
+import asyncio, logging, threading, time
+from typing import Dict, Any, List, Optional, Callable, Tuple
+import sla
+
+log = logging.getLogger(__name__)
+
+class Timer:
+    __slots__ = ("due", "key", "payload", "cancelled")
+
+    def __init__(self, due: int, key: Any, payload: Any):
+        self.due = due
+        self.key = key
+        self.payload = payload
+        self.cancelled = False
+
+class TimerWheel:
+    """Hierarchical timing wheel (Varghese & Lauck). Arming and cancelling are O(1);
+    each tick only touches one level-0 slot plus an occasional cascade."""
+
+    def __init__(self, tick: float = 1.0, slots: int = 256, levels: int = 4, start: Optional[float] = None):
+        assert slots & (slots - 1) == 0, "slots must be a power of two"
+        self.tick = tick
+        self.bits = slots.bit_length() - 1
+        self.mask = slots - 1
+        self.levels = levels
+        self.span = 1 << (self.bits * levels)
+        self.wheels: List[List[List[Timer]]] = [[[] for _ in range(slots)] for _ in range(levels)]
+        self.current = int((time.time() if start is None else start) / tick)
+        self._ready: List[Timer] = []
+        self._by_key: Dict[Any, List[Timer]] = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, when: float, key: Any, payload: Any = None) -> Timer:
+        t = Timer(int(when / self.tick), key, payload)
+        self._by_key.setdefault(key, []).append(t)
+        self._insert(t)
+        self._count += 1
+        return t
+
+    def cancel(self, key: Any) -> int:
+        timers = self._by_key.pop(key, None) or []
+        for t in timers:
+            if not t.cancelled:
+                t.cancelled = True
+                self._count -= 1
+        return len(timers)
+
+    def _insert(self, t: Timer):
+        delta = t.due - self.current
+        if delta <= 0:
+            self._ready.append(t)
+            return
+        due = t.due if delta < self.span else self.current + self.span - 1
+        delta = due - self.current
+        level = 0
+        while level < self.levels - 1 and delta >= (1 << (self.bits * (level + 1))):
+            level += 1
+        self.wheels[level][(due >> (self.bits * level)) & self.mask].append(t)
+
+    def _expire(self, t: Timer, out: List[Timer]):
+        if t.cancelled:
+            return
+        if t.due > self.current:
+            self._insert(t)  # clamped far-future timer, not due yet
+            return
+        t.cancelled = True
+        self._count -= 1
+        timers = self._by_key.get(t.key)
+        if timers is not None:
+            timers.remove(t)
+            if not timers:
+                del self._by_key[t.key]
+        out.append(t)
+
+    def _step(self, out: List[Timer]):
+        self.current += 1
+        c = self.current
+        top = 1
+        while top < self.levels and ((c >> (self.bits * (top - 1))) & self.mask) == 0:
+            top += 1
+        for level in range(top - 1, 0, -1):
+            idx = (c >> (self.bits * level)) & self.mask
+            bucket, self.wheels[level][idx] = self.wheels[level][idx], []
+            for t in bucket:
+                if not t.cancelled:
+                    self._insert(t)
+        idx = c & self.mask
+        bucket, self.wheels[0][idx] = self.wheels[0][idx], []
+        if self._ready:
+            bucket, self._ready = self._ready + bucket, []
+        for t in bucket:
+            self._expire(t, out)
+
+    def advance(self, now: Optional[float] = None) -> List[Timer]:
+        """Move the wheel to `now` and return the timers that became due, in order."""
+        target = int((time.time() if now is None else now) / self.tick)
+        out: List[Timer] = []
+        ready, self._ready = self._ready, []
+        for t in ready:
+            self._expire(t, out)
+        if self._count == 0:
+            self.current = max(self.current, target)
+            return out
+        while self.current < target:
+            self._step(out)
+        return out
+
+Milestone = Tuple[int, int, bool]  # ticket id, level, last level
+
+class SlaScheduler:
+    """Arms one timer per SLA milestone of every open ticket and drives them from a
+    single asyncio task. The milestones that pass in one tick go to `on_milestones` as one
+    list, off the event loop, so a backlog that is overdue all at once is one write. With
+    several workers, `sync()` runs before each tick to pick up tickets the others wrote.
+    Request threads arm and cancel while the loop advances, so the wheel is only touched
+    under `_lock`."""
+
+    def __init__(self, on_milestones: Callable[[List[Milestone]], None], tick: float = 1.0,
+                 sync: Optional[Callable[[], None]] = None):
+        self.on_milestones = on_milestones
+        self.sync = sync
+        self.wheel = TimerWheel(tick=tick)
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def arm(self, t: Dict[str, Any]):
+        with self._lock:
+            self._arm(t)
+
+    def _arm(self, t: Dict[str, Any]):
+        self.wheel.cancel(t["id"])
+        if not sla.is_open(t):
+            return
+        created = sla.parse_ts(t.get("created_at"))
+        if created != created:
+            return
+        pol = sla.POLICY
+        ths = [th for th in pol.th[pol.code(t.get("priority"))] if th != float("inf")]
+        done = int(t.get("sla_level") or 0)
+        for level, th in enumerate(ths):
+            if level >= done:
+                self.wheel.add(created + th, t["id"], (level, level == len(ths) - 1))
+
+    def cancel(self, ticket_id: int):
+        with self._lock:
+            self.wheel.cancel(ticket_id)
+
+    def rearm_all(self, tickets: List[Dict[str, Any]]):
+        """arm() for every ticket on a fresh wheel (nothing to cancel; thresholds looked up once)."""
+        with self._lock:
+            self._rearm_all(tickets)
+
+    def _rearm_all(self, tickets: List[Dict[str, Any]]):
+        self.wheel = wheel = TimerWheel(tick=self.wheel.tick)
+        pol = sla.POLICY
+        ths = [[th for th in row if th != float("inf")] for row in pol.th.tolist()]
+        for t in tickets:
+            if not sla.is_open(t):
+                continue
+            created = sla.parse_ts(t.get("created_at"))
+            if created != created:
+                continue
+            row = ths[pol.code(t.get("priority"))]
+            for level in range(int(t.get("sla_level") or 0), len(row)):
+                wheel.add(created + row[level], t["id"], (level, level == len(row) - 1))
+
+    def due(self, now: Optional[float] = None) -> List[Milestone]:
+        with self._lock:
+            return [(timer.key, *timer.payload) for timer in self.wheel.advance(now)]
+
+    def poll(self, now: Optional[float] = None) -> int:
+        fired = self.due(now)
+        if fired:
+            self.apply(fired)
+        return len(fired)
+
+    def apply(self, fired: List[Milestone]):
+        try:
+            self.on_milestones(fired)
+        except Exception:
+            log.exception("SLA escalation of %d milestone(s) failed", len(fired))
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.wheel.tick)
+            if self.sync is not None:
+                try:
+                    await asyncio.to_thread(self.sync)
+                except Exception:
+                    log.exception("SLA scheduler sync failed")
+            try:
+                fired = await asyncio.to_thread(self.due)  # may wait on a rearm_all holding the lock
+            except Exception:
+                log.exception("SLA scheduler tick failed")
+                continue
+            if fired:
+                await asyncio.to_thread(self.apply, fired)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,174 @@
+# backend/shared_state.py
+import os, fcntl, pickle, hashlib, secrets, threading
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+import scipy.sparse as sp
+
+# Multi-worker mode (uvicorn --workers N). Each worker keeps its in-memory copy of the
+# store, but writes are serialised by a file lock, every write bumps a per-collection
+# generation in a shared-memory control block, and workers reload whatever is stale
+# before serving a request. Fitted similarity matrices are published as CSR arrays in
+# shared memory so other workers attach to them instead of refitting.
+ENABLED = int(os.environ.get("TICKETPILOT_WORKERS", "1")) > 1 or os.environ.get("TICKETPILOT_SHARED_STATE") == "1"
+
+def _untrack(shm: shared_memory.SharedMemory):
+    # Lifetime is managed by explicit unlink on the next publish, not by whichever process exits first.
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    _untrack(shm)
+    return shm
+
+def _unlink(name: str):
+    try:
+        shm = shared_memory.SharedMemory(name=name)  # unlink() unregisters what attaching registered
+        shm.unlink()
+        shm.close()
+    except Exception:
+        pass
+
+def prefix_for(data_dir: Path) -> str:
+    return "tp_" + hashlib.blake2b(str(Path(data_dir).resolve()).encode("utf-8"), digest_size=4).hexdigest()
+
+def cleanup(data_dir: Path):
+    """Unlink every segment belonging to data_dir (after all workers have exited)."""
+    prefix = prefix_for(data_dir)
+    for p in Path("/dev/shm").glob(prefix + "_*"):
+        _unlink(p.name)
+
+class SharedState:
+    def __init__(self, data_dir: Path, names: List[str]):
+        data_dir.mkdir(parents=True, exist_ok=True)
+        self.prefix = prefix_for(data_dir)
+        self.slots = {n: i + 1 for i, n in enumerate(names)}
+        self._fd = os.open(str(data_dir / ".write.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._tlock = threading.RLock()
+        self._depth = 0
+        self._leader_fds: Dict[str, int] = {}
+        self._owned: Dict[str, List[shared_memory.SharedMemory]] = {}
+        self._attached: List[shared_memory.SharedMemory] = []
+        with self.write_lock():
+            try:
+                self.ctl = _attach(self.prefix + "_ctl")
+            except FileNotFoundError:
+                self.ctl = shared_memory.SharedMemory(name=self.prefix + "_ctl", create=True, size=8 * (len(names) + 1))
+                _untrack(self.ctl)
+                self.ctl.buf[:] = bytes(len(self.ctl.buf))
+            self.gens = np.ndarray((len(names) + 1,), dtype=np.uint64, buffer=self.ctl.buf)
+            if int(self.gens[0]) == 0:
+                self.gens[0] = secrets.randbits(63)
+        self.seen: Dict[str, int] = {n: self.generation(n) for n in names}
+
+    @property
+    def nonce(self) -> str:
+        return format(int(self.gens[0]), "x")
+
+    def generation(self, name: str) -> int:
+        return int(self.gens[self.slots[name]])
+
+    def bump(self, name: str) -> int:
+        """Caller must hold write_lock."""
+        g = self.generation(name) + 1
+        self.gens[self.slots[name]] = g
+        self.seen[name] = g
+        return g
+
+    def stale(self) -> List[str]:
+        return [n for n, i in self.slots.items() if int(self.gens[i]) != self.seen[n]]
+
+    def mark_seen(self, name: str, gen: Optional[int] = None):
+        self.seen[name] = self.generation(name) if gen is None else gen
+
+    @contextmanager
+    def write_lock(self):
+        with self._tlock:
+            if self._depth == 0:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def try_leader(self, role: str, data_dir: Path) -> bool:
+        """Non-blocking, process-lifetime lock so exactly one worker runs a singleton task."""
+        if role in self._leader_fds:
+            return True
+        fd = os.open(str(data_dir / f".{role}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._leader_fds[role] = fd
+        return True
+
+    # ---- shared CSR matrices ----
+    def _seg(self, kind: str, gen: int, part: str) -> str:
+        return f"{self.prefix}_{kind}_{gen}_{part}"
+
+    def publish_matrix(self, kind: str, vect: Any, X) -> int:
+        """Publish (vectorizer, CSR matrix) as the next generation of `kind`. Caller holds write_lock."""
+        gen = self.generation(kind) + 1
+        X = sp.csr_matrix(X)
+        meta = pickle.dumps({"vect": vect, "shape": X.shape, "dtypes": [str(X.data.dtype), str(X.indices.dtype), str(X.indptr.dtype)],
+                             "sizes": [X.data.size, X.indices.size, X.indptr.size]})
+        owned = []
+        for part, arr in (("data", X.data), ("indices", X.indices), ("indptr", X.indptr)):
+            shm = shared_memory.SharedMemory(name=self._seg(kind, gen, part), create=True, size=max(1, arr.nbytes))
+            _untrack(shm)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+            owned.append(shm)
+        shm = shared_memory.SharedMemory(name=self._seg(kind, gen, "meta"), create=True, size=len(meta))
+        _untrack(shm)
+        shm.buf[:len(meta)] = meta
+        owned.append(shm)
+        for part in ("data", "indices", "indptr", "meta"):
+            _unlink(self._seg(kind, gen - 1, part))
+        for old in self._owned.pop(kind, []):
+            try:
+                old.close()
+            except BufferError:
+                self._attached.append(old)
+        self._owned[kind] = owned
+        self.gens[self.slots[kind]] = gen
+        self.seen[kind] = gen
+        return gen
+
+    def attach_matrix(self, kind: str) -> Optional[Tuple[Any, Any]]:
+        """Zero-copy view of the latest published matrix of `kind`, or None if it is gone."""
+        gen = self.generation(kind)
+        try:
+            meta_shm = _attach(self._seg(kind, gen, "meta"))
+            meta = pickle.loads(bytes(meta_shm.buf))
+            meta_shm.close()
+            arrs, handles = [], []
+            for part, dt, n in zip(("data", "indices", "indptr"), meta["dtypes"], meta["sizes"]):
+                shm = _attach(self._seg(kind, gen, part))
+                handles.append(shm)
+                arrs.append(np.ndarray((n,), dtype=np.dtype(dt), buffer=shm.buf))
+        except (FileNotFoundError, OSError):
+            return None
+        X = sp.csr_matrix((arrs[0], arrs[1], arrs[2]), shape=meta["shape"], copy=False)
+        self._release_attached()
+        self._attached.extend(handles)
+        self.seen[kind] = gen
+        return meta["vect"], X
+
+    def _release_attached(self):
+        keep = []
+        for shm in self._attached:
+            try:
+                shm.close()
+            except BufferError:
+                keep.append(shm)  # still referenced by a matrix in use
+        self._attached = keep
@@ -0,0 +1,128 @@
+# backend/singleflight.py
+import threading, time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Optional
+
+class _Flight:
+    __slots__ = ("seq", "done", "result", "error")
+
+    def __init__(self, seq: int):
+        self.seq, self.done, self.result, self.error = seq, threading.Event(), None, None
+
+class SingleFlight:
+    """Coalesces requests to rebuild one derived structure. build() computes it from the
+    current state with no locks held; commit(result) installs it under `lock`, unless a
+    result built from newer state was installed first.
+
+    request() returns at once: the rebuild runs on this object's thread, one at a time and
+    at most once per `min_interval`, so a burst of requests costs one or two builds while
+    readers keep the previous result. run() builds on the calling thread, for callers that
+    need the result before going on, and satisfies every request made before it; with
+    join=True it instead waits for a build already in flight and shares its result."""
+
+    def __init__(self, name: str, build: Callable[[], Any], commit: Callable[[Any], None] = lambda r: None,
+                 min_interval: float = 0.0, lock: Callable[[], Any] = nullcontext):
+        self.name = name
+        self.build = build
+        self.commit = commit
+        self.min_interval = min_interval
+        self.lock = lock
+        self._cond = threading.Condition()
+        self._commit_lock = threading.Lock()
+        self._requested = 0  # request sequence
+        self._covered = 0    # latest request a started build covers
+        self._committed = 0  # request the installed result covers
+        self._last = 0.0
+        self._flight: Optional[_Flight] = None
+        self._thread: Optional[threading.Thread] = None
+        self.stats: Dict[str, Any] = {"requests": 0, "builds": 0, "joined": 0, "superseded": 0, "build_s": 0.0, "error": None}
+
+    def _next(self) -> int:
+        self._requested += 1
+        self.stats["requests"] += 1
+        return self._requested
+
+    def pending(self) -> bool:
+        return self._covered < self._requested
+
+    def request(self):
+        with self._cond:
+            self._next()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=f"rebuild-{self.name}", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def run(self, join: bool = False) -> Any:
+        with self._cond:
+            flight = self._flight if join else None
+            if flight is None:
+                seq = self._covered = self._next()
+                self._last = time.monotonic()
+            else:
+                self.stats["joined"] += 1
+        if flight is not None:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        return self._build(seq)
+
+    def flush(self):
+        """Bring the result up to date now if a request is still waiting for its build."""
+        if self.pending():
+            self.run()
+
+    def installed(self):
+        """The caller installed an up-to-date result itself (e.g. restored it): drop pending
+        requests, and any build already running will not overwrite it."""
+        with self._cond, self._commit_lock:
+            self._committed = self._covered = self._next()
+
+    def _build(self, seq: int) -> Any:
+        flight = _Flight(seq)
+        with self._cond:
+            self._flight = flight
+        t0 = time.perf_counter()
+        try:
+            flight.result = self.build()
+            with self.lock(), self._commit_lock:
+                if seq >= self._committed:
+                    self._committed = seq
+                    self.commit(flight.result)
+                else:
+                    self.stats["superseded"] += 1
+            self.stats["error"] = None
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            self.stats["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.stats["builds"] += 1
+            self.stats["build_s"] += time.perf_counter() - t0
+            with self._cond:
+                if self._flight is flight:
+                    self._flight = None
+            flight.done.set()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self.pending():
+                    self._cond.wait()
+                delay = self._last + self.min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)  # requests arriving meanwhile ride along with this build
+            with self._cond:
+                if not self.pending():
+                    continue  # a run() got there first
+                seq = self._covered = self._requested
+                self._last = time.monotonic()
+            try:
+                self._build(seq)
+            except Exception:
+                pass  # kept in stats["error"]; the previous result stays installed
+
+    def status(self) -> Dict[str, Any]:
+        return dict(self.stats, pending=self.pending(), in_flight=self._flight is not None)
@@ -0,0 +1,213 @@
+# backend/sla.py
+import heapq
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import numpy as np
+
+CLOSED_STATUSES = {"resolved", "merged", "closed"}
+
+# Per-priority SLA policy: base risk plus (age_hours, penalty) milestones.
+# The penalty of the highest milestone reached is added to the base.
+DEFAULT_POLICY: Dict[str, Dict[str, Any]] = {
+    "P1": {"base": 0.9, "milestones": [[4, 0.1], [8, 0.2]]},
+    "P2": {"base": 0.7, "milestones": [[4, 0.1], [8, 0.2]]},
+    "P3": {"base": 0.4, "milestones": [[4, 0.1], [8, 0.2]]},
+    "P4": {"base": 0.4, "milestones": [[4, 0.1], [8, 0.2]]},
+}
+
+def now_ts() -> float:
+    return datetime.now(timezone.utc).timestamp()
+
+@lru_cache(maxsize=1 << 20)
+def parse_ts(value: Optional[str]) -> float:
+    """ISO timestamp -> epoch seconds; NaN when missing, naive or unparsable."""
+    try:
+        dt = datetime.fromisoformat(value)
+    except Exception:
+        return float("nan")
+    if dt.tzinfo is None:
+        return float("nan")
+    return dt.timestamp()
+
+def is_open(t: Dict[str, Any]) -> bool:
+    return (t.get("status") or "open").lower() not in CLOSED_STATUSES
+
+def is_status_open(t: Dict[str, Any]) -> bool:
+    """status == "open" exactly, as the ticket list filter means it (is_open also takes
+    a missing status and custom ones such as "on hold")."""
+    return (t.get("status") or "").lower() == "open"
+
+class Policy:
+    """Lookup tables (priority code -> base / milestone seconds / penalty) for vectorised scoring."""
+
+    def __init__(self, spec: Optional[Dict[str, Dict[str, Any]]] = None):
+        spec = spec or DEFAULT_POLICY
+        self.spec = spec
+        self.names = list(spec.keys())
+        self.codes = {p.upper(): i for i, p in enumerate(self.names)}
+        self.default_code = self.codes.get("P3", len(self.names) - 1)
+        levels = max([len(v.get("milestones") or []) for v in spec.values()] + [1])
+        self.base = np.zeros(len(self.names), dtype=np.float64)
+        self.th = np.full((len(self.names), levels), np.inf, dtype=np.float64)
+        self.pen = np.zeros((len(self.names), levels + 1), dtype=np.float64)
+        for i, p in enumerate(self.names):
+            self.base[i] = float(spec[p].get("base", 0.4))
+            ms = sorted((float(h), float(pen)) for h, pen in (spec[p].get("milestones") or []))
+            for j, (h, pen) in enumerate(ms):
+                self.th[i, j] = h * 3600.0
+                self.pen[i, j + 1] = pen
+
+    def code(self, priority: Optional[str]) -> int:
+        return self.codes.get((priority or "P3").upper(), self.default_code)
+
+    def risk(self, codes: np.ndarray, created: np.ndarray, now: float) -> np.ndarray:
+        age = now - created
+        level = (age[:, None] >= self.th[codes]).sum(axis=1)
+        return np.minimum(1.0, self.base[codes] + self.pen[codes, level])
+
+    def risk_one(self, code: int, created: float, now: float) -> float:
+        age = now - created
+        level = int(np.count_nonzero(age >= self.th[code]))
+        return float(min(1.0, self.base[code] + self.pen[code, level]))
+
+    def next_crossings(self, codes: np.ndarray, created: np.ndarray, now: float) -> np.ndarray:
+        """Vectorised next_crossing; NaN where there is none."""
+        ts = created[:, None] + self.th[codes]
+        ahead = (ts > now) & np.isfinite(ts)
+        first = ahead.argmax(axis=1)
+        return np.where(ahead.any(axis=1), ts[np.arange(len(codes)), first], np.nan)
+
+    def next_crossing(self, code: int, created: float, now: float) -> Optional[float]:
+        if created != created:
+            return None
+        for th in self.th[code]:
+            ts = created + th
+            if ts > now and ts != np.inf:
+                return float(ts)
+        return None
+
+POLICY = Policy()
+
+def set_policy(spec: Optional[Dict[str, Dict[str, Any]]]):
+    global POLICY
+    POLICY = Policy(spec)
+
+def risk_for(rows: List[Dict[str, Any]], now: Optional[float] = None) -> np.ndarray:
+    if not rows:
+        return np.zeros(0, dtype=np.float64)
+    pol = POLICY
+    codes = np.fromiter((pol.code(t.get("priority")) for t in rows), dtype=np.intp, count=len(rows))
+    created = np.fromiter((parse_ts(t.get("created_at")) for t in rows), dtype=np.float64, count=len(rows))
+    return pol.risk(codes, created, now_ts() if now is None else now)
+
+class RiskIndex:
+    """Open tickets bucketed by current risk; a heap of milestone crossing times moves
+    tickets between buckets lazily, so top-N never rescans the whole backlog. Tickets that
+    are open without status "open" (missing or custom statuses) are kept in `_other`."""
+
+    def __init__(self):
+        self._entries: Dict[int, List[Any]] = {}   # id -> [ticket, code, created, risk, next_ts, service]
+        self._buckets: Dict[float, set] = {}
+        self._by_service: Dict[str, set] = {}
+        self._heap: List[Tuple[float, int]] = []
+        self._other: set = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def rebuild(self, tickets: List[Dict[str, Any]], now: Optional[float] = None):
+        """Score every open ticket in one vectorised pass and heapify the crossings."""
+        self._entries.clear(); self._buckets.clear(); self._by_service.clear(); self._other.clear(); self._heap = []
+        now = now_ts() if now is None else now
+        rows = [t for t in tickets if is_open(t)]
+        if not rows:
+            return
+        pol = POLICY
+        codes = np.fromiter((pol.code(t.get("priority")) for t in rows), dtype=np.intp, count=len(rows))
+        created = np.fromiter((parse_ts(t.get("created_at")) for t in rows), dtype=np.float64, count=len(rows))
+        risk, nxt = pol.risk(codes, created, now), pol.next_crossings(codes, created, now)
+        entries, buckets, by_service, heap = self._entries, self._buckets, self._by_service, self._heap
+        for t, code, cr, r, nx in zip(rows, codes.tolist(), created.tolist(), risk.tolist(), nxt.tolist()):
+            tid = t["id"]
+            if tid in entries:
+                self.discard(tid)
+            nx = None if nx != nx else nx
+            svc = t.get("service") or ""
+            entries[tid] = [t, code, cr, r, nx, svc]
+            buckets.setdefault(r, set()).add(tid)
+            by_service.setdefault(svc, set()).add(tid)
+            if nx is not None:
+                heap.append((nx, tid))
+            if not is_status_open(t):
+                self._other.add(tid)
+        heapq.heapify(heap)
+
+    def discard(self, ticket_id: int):
+        e = self._entries.pop(ticket_id, None)
+        if e is None:
+            return
+        b = self._buckets.get(e[3])
+        if b is not None:
+            b.discard(ticket_id)
+            if not b:
+                del self._buckets[e[3]]
+        self._by_service[e[5]].discard(ticket_id)
+        self._other.discard(ticket_id)
+
+    def upsert(self, t: Dict[str, Any], now: Optional[float] = None):
+        tid = t["id"]
+        self.discard(tid)
+        if not is_open(t):
+            return
+        now = now_ts() if now is None else now
+        pol = POLICY
+        code = pol.code(t.get("priority"))
+        created = parse_ts(t.get("created_at"))
+        e = [t, code, created, 0.0, None, t.get("service") or ""]
+        self._entries[tid] = e
+        self._by_service.setdefault(e[5], set()).add(tid)
+        if not is_status_open(t):
+            self._other.add(tid)
+        self._place(tid, e, now)
+
+    def _place(self, tid: int, e: List[Any], now: float):
+        pol = POLICY
+        e[3] = pol.risk_one(e[1], e[2], now)
+        e[4] = pol.next_crossing(e[1], e[2], now)
+        self._buckets.setdefault(e[3], set()).add(tid)
+        if e[4] is not None:
+            heapq.heappush(self._heap, (e[4], tid))
+
+    def _advance(self, now: float):
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            ts, tid = heapq.heappop(heap)
+            e = self._entries.get(tid)
+            if e is None or e[4] != ts:
+                continue  # stale: ticket closed or re-scored since
+            b = self._buckets[e[3]]
+            b.discard(tid)
+            if not b:
+                del self._buckets[e[3]]
+            self._place(tid, e, now)
+
+    def for_services(self, services: Iterable[str]) -> List[Dict[str, Any]]:
+        """Open tickets of any of `services`, by ascending id."""
+        ids = sorted(i for s in services for i in self._by_service.get(s, ()))
+        return [self._entries[i][0] for i in ids]
+
+    def top(self, n: Optional[int] = None, now: Optional[float] = None, status_open: bool = False) -> List[Tuple[Dict[str, Any], float]]:
+        """Riskiest open tickets, ties broken by ascending id; with status_open only those
+        whose status is "open" itself."""
+        self._advance(now_ts() if now is None else now)
+        out: List[Tuple[Dict[str, Any], float]] = []
+        skip = self._other if status_open else None
+        for risk in sorted(self._buckets, reverse=True):
+            ids = self._buckets[risk] - skip if skip else self._buckets[risk]
+            left = None if n is None else n - len(out)
+            if left is not None and left <= 0:
+                break
+            picked = sorted(ids) if left is None or left >= len(ids) else heapq.nsmallest(left, ids)
+            out.extend((self._entries[i][0], risk) for i in picked)
+        return out
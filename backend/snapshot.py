@@ -0,0 +1,138 @@
+# backend/snapshot.py
+import lzma, os, pickle, struct, time, zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+import fastjson
+
+try:
+    import zstandard
+except Exception:  # zstandard / lz4 are optional; stdlib zlib / lzma are the fallback
+    zstandard = None
+try:
+    import lz4.frame as lz4f
+except Exception:
+    lz4f = None
+
+# A snapshot is one file: HEAD, then independently compressed sections, then a JSON manifest
+# (codec, meta and each section's offset/size/crc), its length and TAIL. Sections are written
+# as they are produced, so the whole compressed state never has to sit in memory.
+HEAD = b"TPSNAP1\n"
+TAIL = b"TPSNAPE\n"
+SUFFIX = ".tpsnap"
+
+# zlib restores ~3x faster than lzma, which writes ~25% smaller files.
+CODECS = {"zlib": (lambda b: zlib.compress(b, 1), zlib.decompress), "lzma": (lambda b: lzma.compress(b, preset=1), lzma.decompress)}
+if lz4f is not None:
+    CODECS["lz4"] = (lz4f.compress, lz4f.decompress)
+if zstandard is not None:
+    CODECS["zstd"] = (zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress)
+DEFAULT_CODEC = os.environ.get("TICKETPILOT_SNAPSHOT_CODEC") or next(c for c in ("zstd", "lz4", "zlib") if c in CODECS)
+
+def encode(kind: str, obj: Any) -> bytes:
+    return obj if kind == "raw" else pickle.dumps(obj, protocol=5)
+
+def decode(kind: str, data: bytes) -> Any:
+    return data if kind == "raw" else pickle.loads(data)
+
+class Writer:
+    def __init__(self, path: Path, codec: str = DEFAULT_CODEC, meta: Dict[str, Any] | None = None):
+        self.path = path
+        self.codec = codec
+        self.compress = CODECS[codec][0]
+        self.manifest = {"format": 1, "codec": codec, "created_at": datetime.now(timezone.utc).isoformat(), "meta": meta or {}, "sections": []}
+        self.raw_bytes = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        self.f = open(self.tmp, "wb")
+        self.f.write(HEAD)
+
+    def add(self, name: str, kind: str, obj: Any):
+        self.add_encoded(name, kind, encode(kind, obj))
+
+    def add_encoded(self, name: str, kind: str, raw: bytes):
+        blob = self.compress(raw)
+        self.manifest["sections"].append({"name": name, "kind": kind, "offset": self.f.tell(), "size": len(blob),
+                                          "raw_size": len(raw), "crc": zlib.crc32(blob)})
+        self.f.write(blob)
+        self.raw_bytes += len(raw)
+
+    def close(self) -> Dict[str, Any]:
+        man = fastjson.dumps(self.manifest)
+        self.f.write(man + struct.pack("<Q", len(man)) + TAIL)
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.f.close()
+        os.replace(self.tmp, self.path)
+        return self.manifest
+
+    def abort(self):
+        self.f.close()
+        self.tmp.unlink(missing_ok=True)
+
+def read_manifest(path: Path) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        if f.read(len(HEAD)) != HEAD:
+            raise ValueError(f"{path.name}: not a snapshot")
+        f.seek(-(8 + len(TAIL)), os.SEEK_END)
+        n, tail = struct.unpack("<Q", f.read(8))[0], f.read()
+        if tail != TAIL:
+            raise ValueError(f"{path.name}: truncated snapshot")
+        f.seek(-(n + 8 + len(TAIL)), os.SEEK_END)
+        return fastjson.loads(f.read(n))
+
+def _section(f, path: Path, man: Dict[str, Any], s: Dict[str, Any]) -> Any:
+    f.seek(s["offset"])
+    blob = f.read(s["size"])
+    if zlib.crc32(blob) != s["crc"]:
+        raise ValueError(f"{path.name}: section {s['name']} is corrupt")
+    return decode(s["kind"], CODECS[man["codec"]][1](blob))
+
+def read(path: Path) -> Iterator[Tuple[str, str, Any]]:
+    """(name, kind, object) for every section, in the order they were written."""
+    man = read_manifest(path)
+    with open(path, "rb") as f:
+        for s in man["sections"]:
+            yield s["name"], s["kind"], _section(f, path, man, s)
+
+def read_section(path: Path, name: str, man: Dict[str, Any] | None = None) -> Any:
+    """One section by name, without decompressing the others."""
+    man = man or read_manifest(path)
+    for s in man["sections"]:
+        if s["name"] == name:
+            with open(path, "rb") as f:
+                return _section(f, path, man, s)
+    raise KeyError(f"{path.name}: no section {name}")
+
+def new_path(root: Path) -> Path:
+    return root / f"snap-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{time.time_ns() % 10**9:09d}{SUFFIX}"
+
+def list_snapshots(root: Path) -> List[Dict[str, Any]]:
+    """Newest first."""
+    out = []
+    for p in root.glob(f"snap-*{SUFFIX}"):
+        st = p.stat()
+        out.append({"name": p.name, "path": str(p), "size": st.st_size, "mtime": st.st_mtime})
+    return sorted(out, key=lambda s: s["name"], reverse=True)
+
+def latest(root: Path) -> Path | None:
+    snaps = list_snapshots(root)
+    return Path(snaps[0]["path"]) if snaps else None
+
+def prune(root: Path, keep_last: int = 5, keep_daily: int = 7) -> List[str]:
+    """Keep the newest `keep_last` snapshots plus the newest one of each of the last
+    `keep_daily` days that have any; delete the rest. Returns the deleted names."""
+    snaps = list_snapshots(root)
+    keep = {s["name"] for s in snaps[:keep_last]}
+    days: Dict[str, str] = {}
+    for s in snaps:
+        day = s["name"][5:13]
+        if day not in days and len(days) < keep_daily:
+            days[day] = s["name"]
+    keep |= set(days.values())
+    removed = []
+    for s in snaps:
+        if s["name"] not in keep:
+            Path(s["path"]).unlink(missing_ok=True)
+            removed.append(s["name"])
+    return removed
@@ -1,60 +1,145 @@
 ﻿from pathlib import Path
-import json, csv, hashlib, uuid
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timezone
+import copy, os, csv, gc, hashlib, uuid, itertools, functools, logging, threading, time, traceback
+from contextlib import nullcontext
+from typing import List, Dict, Any, Iterable, Optional, Tuple
+from datetime import datetime, timezone, timedelta
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import normalize
-import services
+import services, sla, scheduler, jobs, clustering, retriage, fastjson, shared_state, tokens, notifications, collection, mi_index, worklogs, online, snapshot, archive, partitions, depgraph, change_index, singleflight
+
+log = logging.getLogger(__name__)
 
 # Paths
 BASE_DIR = Path(__file__).resolve().parent
-DATA_DIR = BASE_DIR.parent / "data"
+DATA_DIR = Path(os.environ.get("TICKETPILOT_DATA_DIR") or BASE_DIR.parent / "data")
 KB_DIR = DATA_DIR / "kb"
 TICKETS_JSON = DATA_DIR / "tickets.json"
 DEFLECTIONS_JSON = DATA_DIR / "deflections.json"
 CONFIG_JSON = DATA_DIR / "config.json"
 SEED_CSV = DATA_DIR / "tickets_seed.csv"
 USERS_JSON = DATA_DIR / "users.json"
-NOTIFICATIONS_JSON = DATA_DIR / "notifications.json"
+NOTIFICATIONS_JSON = DATA_DIR / "notifications.json"  # legacy single list, migrated on load
+NOTIFICATIONS_DIR = DATA_DIR / "notifications"
 MAGIC_JSON = DATA_DIR / "magic.json"
 APPROVALS_JSON = DATA_DIR / "approvals.json"
 MI_JSON = DATA_DIR / "mi.json"
 COUNTERS_JSON = DATA_DIR / "counters.json"
 ELEVATIONS_JSON = DATA_DIR / "elevations.json"
+SESSIONS_JSON = DATA_DIR / "sessions.json"
 SERVICES_JSON = DATA_DIR / "services.json"
 CHANGES_JSON = DATA_DIR / "changes.json"
+OUTBOX_JSON = DATA_DIR / "outbox.json"
+SEQUENCES_JSON = DATA_DIR / "sequences.json"
+WORKLOGS_JSONL = DATA_DIR / "worklogs.jsonl"
+SNAPSHOT_DIR = DATA_DIR / "snapshots"
+ARCHIVE_DIR = DATA_DIR / "archive"
+RESTORED_MARK = DATA_DIR / ".restored"
 
 # In-memory stores
-KB_DOCS: List[Dict[str, Any]] = []
-KB_CHUNKS: List[Dict[str, Any]] = []
-TICKETS: List[Dict[str, Any]] = []
+TICKETS = collection.Collection()
 DEFLECTIONS: List[Dict[str, Any]] = []
 USERS: List[Dict[str, Any]] = []
-NOTIFICATIONS: List[Dict[str, Any]] = []
-MAGIC: List[Dict[str, Any]] = []
-APPROVALS: List[Dict[str, Any]] = []
-MI: List[Dict[str, Any]] = []
+NOTIFICATIONS = notifications.NotificationStore(NOTIFICATIONS_DIR)
+MAGIC = tokens.TokenStore()
+APPROVALS = collection.Collection()
+MI = collection.Collection()
+MI_INDEX = mi_index.MiIndex()
+WORKLOGS = worklogs.WorklogStore(WORKLOGS_JSONL)
+ARCHIVE = archive.ArchiveStore(ARCHIVE_DIR)
 COUNTERS: List[Dict[str, Any]] = []
-ELEVATIONS: List[Dict[str, Any]] = []
+ELEVATIONS = tokens.TokenStore()
+SESSIONS = tokens.TokenStore()
 SERVICES: Dict[str, Any] = {}
-CHANGES: List[Dict[str, Any]] = []
+SERVICE_GRAPH = depgraph.ServiceGraph()
+CHANGES = collection.Collection()
+CHANGE_CAL = change_index.ChangeCalendar()
+OUTBOX = collection.Collection()
+SEQUENCES: Dict[str, int] = {}
 
 # Vectorizers and matrices
-KB_VECT: Optional[TfidfVectorizer] = None
-KB_MATRIX = None
-TICKET_VECT: Optional[TfidfVectorizer] = None
-TICKET_MATRIX = None
-
-DEFAULT_CONFIG = {"auto_resolve_threshold": {"triage": 0.6, "kb": 0.6}, "dedup_similarity": 0.8}
+# (vectorizer, matrix, chunks, docs): swapped whole, so a reader never pairs one build's
+# matrix rows with another's chunks
+KB: Tuple[Optional[TfidfVectorizer], Any, List[Dict[str, Any]], List[Dict[str, Any]]] = (None, None, [], [])
+# (vectorizer, matrix) of the ticket similarity index, swapped whole like KB; TICKET_PARTS
+# partitions one matrix and is replaced, never rebuilt in place, when the index changes
+TICKET_SIM: Tuple[Optional[TfidfVectorizer], Any] = (None, None)
+TICKET_PARTS = partitions.PartitionIndex()
+_PARTS_LOCK = threading.Lock()
+DEDUP_SIMILARITY = 0.8
+CHANGE_LOOKBACK_HOURS = 24.0
+RISK_INDEX = sla.RiskIndex()
+TICKET_JSON = fastjson.FragmentCache()
+
+# Data versions: every persisted mutation stamps its collection (file stem) with the next
+# value of one store-wide counter; BOOT keeps versions from different processes apart.
+# In multi-worker mode the counters live in shared memory and are common to all workers.
+COLLECTIONS = ["tickets", "ticket_index", "deflections", "config", "users", "notifications", "magic",
+               "approvals", "mi", "counters", "elevations", "services", "changes", "kb", "outbox", "sequences", "worklogs", "archive", "sessions"]
+SHARED = shared_state.SharedState(DATA_DIR, COLLECTIONS) if shared_state.ENABLED else None
+BOOT = SHARED.nonce if SHARED is not None else uuid.uuid4().hex[:8]
+VERSIONS: Dict[str, int] = {}
+_VERSION_SEQ = itertools.count(1)
+
+DEFAULT_CONFIG = {"auto_resolve_threshold": {"triage": 0.6, "kb": 0.6}, "dedup_similarity": 0.8, "sla_policy": sla.DEFAULT_POLICY, "sla_escalation_user": "agent1", "magic_ttl_minutes": 24 * 60, "session_ttl_hours": 12,
+                  "notification_retention_days": 30, "notification_max_per_user": 500, "online_learning": False, "online_batch_size": 32, "online_checkpoint_seconds": 300,
+                  "snapshot_interval_minutes": 0, "snapshot_keep": 5, "snapshot_keep_daily": 7,
+                  "archive_after_days": 0, "archive_min_batch": 1000, "change_lookback_hours": 24}
 
 # ------------- Helpers -------------
+def bump_version(name: str):
+    if SHARED is not None:
+        with SHARED.write_lock():
+            VERSIONS[name] = SHARED.bump(name)
+        return
+    VERSIONS[name] = next(_VERSION_SEQ)
+
+def version(*names: str) -> Tuple[Any, ...]:
+    if SHARED is not None:
+        return (BOOT,) + tuple(SHARED.generation(n) for n in names)
+    return (BOOT,) + tuple(VERSIONS.get(n, 0) for n in names)
+
+def _write_lock():
+    return SHARED.write_lock() if SHARED is not None else nullcontext()
+
+def _writes(fn):
+    """Serialise a mutation across workers and apply it on fresh state (no-op in single-process mode)."""
+    if SHARED is None:
+        return fn
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with SHARED.write_lock():
+            refresh()
+            return fn(*args, **kwargs)
+    return wrapper
+
+def sync_shared():
+    """refresh() for readers: under the write lock, so it never interleaves with the refresh a
+    write does on another thread. Cheap when nothing changed."""
+    if SHARED is not None and SHARED.stale():
+        with SHARED.write_lock():
+            refresh()
+
 def _save_json(path: Path, data: Any):
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")  # threadpool requests save concurrently
+    tmp.write_bytes(fastjson.dumps(data))
+    os.replace(tmp, path)
+    bump_version(path.stem)
 
 def _load_json(path: Path, default):
-    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else default
+    return fastjson.loads(path.read_bytes()) if path.exists() else default
+
+def load_sequences():
+    global SEQUENCES
+    SEQUENCES = _load_json(SEQUENCES_JSON, {})
+
+def _next_id(name: str, coll: collection.Collection) -> int:
+    """Allocate from a persisted sequence, so ids are never handed out twice even after a clear."""
+    coll.seq = max(coll.seq, SEQUENCES.get(name, 0))
+    SEQUENCES[name] = nid = coll.next_id()
+    _save_json(SEQUENCES_JSON, SEQUENCES)
+    return nid
 
 def hash_pw(p: str) -> str:
     return hashlib.sha256(("demo_salt:" + (p or "")).encode("utf-8")).hexdigest()
@@ -89,6 +174,7 @@ def save_users():
 def get_user(username: str) -> dict | None:
     return next((u for u in USERS if u.get("username") == username), None)
 
+@_writes
 def unlock_user(username: str) -> bool:
     u = get_user(username)
     if not u:
@@ -99,6 +185,7 @@ def unlock_user(username: str) -> bool:
     save_users()
     return True
 
+@_writes
 def lock_user(username: str) -> bool:
     u = get_user(username)
     if not u:
@@ -109,67 +196,131 @@ def lock_user(username: str) -> bool:
     save_users()
     return True
 
-# ------------- Notifications -------------
-def load_notifications():
-    global NOTIFICATIONS
-    NOTIFICATIONS = _load_json(NOTIFICATIONS_JSON, [])
-    _save_json(NOTIFICATIONS_JSON, NOTIFICATIONS)
+# Sessions: login issues a bearer token; the server maps it back to the user, so callers
+# cannot claim an identity (or a role) by naming it.
+def load_sessions():
+    SESSIONS.load(_load_json(SESSIONS_JSON, []))
+    SESSIONS.gc()
+    _save_json(SESSIONS_JSON, SESSIONS.records())
+
+@_writes
+def create_session(username: str) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc).timestamp()
+    hours = float(_load_json(CONFIG_JSON, DEFAULT_CONFIG).get("session_ttl_hours", DEFAULT_CONFIG["session_ttl_hours"]))
+    SESSIONS.gc(now)
+    rec = SESSIONS.add({"token": uuid.uuid4().hex, "username": username, "exp": now + hours * 3600})
+    _save_json(SESSIONS_JSON, SESSIONS.records())
+    return rec
+
+@_writes
+def end_session(token: str) -> bool:
+    if SESSIONS.get(token) is None:
+        return False
+    SESSIONS.load(r for r in SESSIONS.records() if r["token"] != token)
+    _save_json(SESSIONS_JSON, SESSIONS.records())
+    return True
 
-def save_notifications():
-    _save_json(NOTIFICATIONS_JSON, NOTIFICATIONS)
+def session_user(token: Optional[str]) -> dict | None:
+    """The user a live session token belongs to; None if unknown, expired or locked since."""
+    rec = SESSIONS.get(token)
+    u = get_user(rec["username"]) if rec else None
+    return None if u is None or u.get("locked") else u
 
+# ------------- Notifications -------------
+def load_notifications():
+    cfg = _load_json(CONFIG_JSON, DEFAULT_CONFIG)
+    NOTIFICATIONS.retention_days = cfg.get("notification_retention_days", DEFAULT_CONFIG["notification_retention_days"])
+    NOTIFICATIONS.max_per_user = cfg.get("notification_max_per_user", DEFAULT_CONFIG["notification_max_per_user"])
+    NOTIFICATIONS.load()
+    if NOTIFICATIONS_JSON.exists():
+        NOTIFICATIONS.migrate(_load_json(NOTIFICATIONS_JSON, []))
+        NOTIFICATIONS_JSON.replace(NOTIFICATIONS_JSON.with_suffix(".json.migrated"))
+        bump_version("notifications")
+
+@_writes
 def add_notification(username: str, message: str, ntype: str = "info", link: str | None = None) -> Dict[str, Any]:
-    nid = (max([n.get("id", 0) for n in NOTIFICATIONS]) + 1) if NOTIFICATIONS else 1
-    evt = {"id": nid, "username": username, "message": message, "type": ntype, "ts": datetime.now(timezone.utc).isoformat()}
-    if link:
-        evt["link"] = link
-    NOTIFICATIONS.append(evt)
-    save_notifications()
+    evt = NOTIFICATIONS.add(username, message, ntype, link)
+    bump_version("notifications")
     return evt
 
-def get_notifications(username: str) -> List[Dict[str, Any]]:
-    return sorted([n for n in NOTIFICATIONS if n.get("username") == username], key=lambda x: x["id"], reverse=True)
+def get_notifications(username: str, since_id: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    return NOTIFICATIONS.list(username, since_id, limit)
+
+def unread_notifications(username: str) -> int:
+    return NOTIFICATIONS.unread(username)
+
+def notifications_read_id(username: str) -> int:
+    return NOTIFICATIONS.cursors.get(username, 0)
 
+@_writes
+def mark_notifications_read(username: str, upto_id: Optional[int] = None) -> int:
+    read_id = NOTIFICATIONS.mark_read(username, upto_id)
+    bump_version("notifications")
+    return read_id
+
+@_writes
+def compact_notifications() -> int:
+    dropped = NOTIFICATIONS.compact()
+    if dropped:
+        bump_version("notifications")
+    return dropped
+
+@_writes
 def clear_notifications():
-    global NOTIFICATIONS
-    NOTIFICATIONS = []
-    _save_json(NOTIFICATIONS_JSON, NOTIFICATIONS)
+    NOTIFICATIONS.clear()
+    bump_version("notifications")
 
 # ------------- Magic links -------------
+def _magic_ttl() -> float:
+    return float(_load_json(CONFIG_JSON, DEFAULT_CONFIG).get("magic_ttl_minutes", DEFAULT_CONFIG["magic_ttl_minutes"])) * 60
+
+def _read_magic() -> List[Dict[str, Any]]:
+    items, ttl = _load_json(MAGIC_JSON, []), None
+    for item in items:
+        if "exp" not in item:  # issued before links expired
+            ttl = _magic_ttl() if ttl is None else ttl
+            item["exp"] = sla.parse_ts(item.get("ts")) + ttl
+            if item["exp"] != item["exp"]:
+                item["exp"] = datetime.now(timezone.utc).timestamp() + ttl
+    return items
+
 def load_magic():
-    global MAGIC
-    MAGIC = _load_json(MAGIC_JSON, [])
-    _save_json(MAGIC_JSON, MAGIC)
+    MAGIC.load(_read_magic())
+    MAGIC.gc()
+    save_magic()
 
 def save_magic():
-    _save_json(MAGIC_JSON, MAGIC)
+    _save_json(MAGIC_JSON, MAGIC.records())
 
+@_writes
 def create_magic(username: str, kind: str, payload: Dict[str, Any]) -> str:
     token = uuid.uuid4().hex
-    MAGIC.append({
+    now = datetime.now(timezone.utc)
+    MAGIC.gc(now.timestamp())
+    MAGIC.add({
         "token": token,
         "username": username,
         "kind": kind,
         "payload": payload,
-        "ts": datetime.now(timezone.utc).isoformat(),
+        "ts": now.isoformat(),
+        "exp": now.timestamp() + _magic_ttl(),
         "used": False
     })
     save_magic()
     return token
 
 def get_magic(token: str) -> Dict[str, Any] | None:
-    for item in MAGIC:
-        if item.get("token") == token:
-            return item
-    return None
+    return MAGIC.get(token)
 
+@_writes
 def consume_magic(token: str) -> Dict[str, Any] | None:
-    for item in MAGIC:
-        if item.get("token") == token and not item.get("used"):
-            item["used"] = True
-            save_magic()
-            return item
-    return None
+    item = MAGIC.get(token)
+    if item is None or item.get("used"):
+        return None
+    item["used"] = True  # kept until it expires so a second click still reads as "already confirmed"
+    MAGIC.gc()
+    save_magic()
+    return item
 
 # ------------- KB -------------
 def chunk_text(text: str, tokens: int = 120):
@@ -177,37 +328,49 @@ def chunk_text(text: str, tokens: int = 120):
     for i in range(0, len(words), tokens):
         yield " ".join(words[i:i+tokens])
 
-def build_kb_index():
-    global KB_VECT, KB_MATRIX
-    texts = [c["chunk"] for c in KB_CHUNKS]
-    if not texts:
-        KB_VECT = KB_MATRIX = None
-        return
-    KB_VECT = TfidfVectorizer(ngram_range=(1, 2), max_features=20000)
-    KB_MATRIX = normalize(KB_VECT.fit_transform(texts))
-
-def load_kb():
-    KB_DOCS.clear()
-    KB_CHUNKS.clear()
-    doc_id = 1
-    for p in sorted(KB_DIR.glob("*.md")):
+def build_kb_index() -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Any, Any]:
+    """(docs, chunks, vectorizer, matrix) from the .md files in KB_DIR; installs nothing."""
+    docs: List[Dict[str, Any]] = []
+    chunks: List[Dict[str, Any]] = []
+    for doc_id, p in enumerate(sorted(KB_DIR.glob("*.md")), 1):
         body = p.read_text(encoding="utf-8")
         title = p.stem.replace("_", " ").title()
-        KB_DOCS.append({"id": doc_id, "title": title, "source": str(p)})
+        docs.append({"id": doc_id, "title": title, "source": str(p)})
         for ch in chunk_text(body, 120):
-            KB_CHUNKS.append({"doc_id": doc_id, "title": title, "chunk": ch})
-        doc_id += 1
-    build_kb_index()
+            chunks.append({"doc_id": doc_id, "title": title, "chunk": ch})
+    if not chunks:
+        return docs, chunks, None, None
+    vect = TfidfVectorizer(ngram_range=(1, 2), max_features=20000)
+    return docs, chunks, vect, normalize(vect.fit_transform([c["chunk"] for c in chunks]))
+
+def _install_kb(kb):
+    global KB
+    docs, chunks, vect, matrix = kb
+    KB = (vect, matrix, chunks, docs)
+
+# Writes ask for index rebuilds rather than running them: a burst of requests becomes one
+# build (at most one per REBUILD_DEBOUNCE) on a background thread, and searches use the
+# previous index until it lands.
+REBUILD_DEBOUNCE = float(os.environ.get("TICKETPILOT_REBUILD_DEBOUNCE_MS", "500")) / 1000
+KB_INDEX = singleflight.SingleFlight("kb", build_kb_index, lambda kb: (_install_kb(kb), bump_version("kb")),
+                                     min_interval=REBUILD_DEBOUNCE, lock=_write_lock)
+
+def load_kb():
+    KB_INDEX.run()
+
+def _read_kb():
+    _install_kb(build_kb_index())
 
 def kb_search(query: str, k: int = 3):
-    if KB_VECT is None or KB_MATRIX is None:
+    vect, matrix, chunks, _ = KB
+    if vect is None or matrix is None:
         return []
-    q = normalize(KB_VECT.transform([query]))
-    sims = (KB_MATRIX @ q.T).toarray().ravel()
+    q = normalize(vect.transform([query]))
+    sims = (matrix @ q.T).toarray().ravel()
     idxs = np.argsort(sims)[::-1][:k]
     res = []
     for i in idxs:
-        c = KB_CHUNKS[int(i)]
+        c = chunks[int(i)]
         res.append({"doc_id": c["doc_id"], "title": c["title"], "chunk": c["chunk"], "score": float(sims[int(i)])})
     return res
 
@@ -229,19 +392,64 @@ def load_tickets():
             })
             i += 1
         _save_json(TICKETS_JSON, TICKETS)
+    if len(ARCHIVE):
+        _drop_archived()
     build_ticket_index()
+    TICKET_JSON.clear()
+    RISK_INDEX.rebuild(TICKETS)
+    SLA_SCHEDULER.rearm_all(TICKETS)
+
+def _drop_archived():
+    """Tickets reach the archive before tickets.json is rewritten without them; after a crash
+    in between, the archived copy wins."""
+    ids = np.fromiter((t["id"] for t in TICKETS), dtype=np.int64, count=len(TICKETS))
+    gone = ARCHIVE.contains(ids)
+    if gone.any():
+        TICKETS.reset([t for t, g in zip(TICKETS, gone.tolist()) if not g])
+        _save_json(TICKETS_JSON, TICKETS)
+    TICKETS.seq = max(TICKETS.seq, ARCHIVE.max_id)
+
+def get_ticket(ticket_id: int) -> Dict[str, Any] | None:
+    """A ticket from either tier; archived tickets are read-only."""
+    return TICKETS.get(ticket_id) or ARCHIVE.get(ticket_id)
+
+def _stamp_closed(t: Dict[str, Any]):
+    """closed_at: when the ticket last left the open statuses (archiving ages from it)."""
+    if sla.is_open(t):
+        t.pop("closed_at", None)
+    elif not t.get("closed_at"):
+        t["closed_at"] = datetime.now(timezone.utc).isoformat()
+
+def ticket_changed(t: Dict[str, Any]):
+    """Refresh every derived view of one ticket after it was mutated in place."""
+    TICKET_JSON.invalidate(t["id"])
+    RISK_INDEX.upsert(t)
+    SLA_SCHEDULER.arm(t)
+    TICKET_PARTS.upsert(t)
+
+def _fit_ticket_index():
+    texts = [f"{t['subject']}\n{t['body']}" for t in list(TICKETS)]  # row i is TICKETS[i] as of now; later tickets are appended
+    if not texts:
+        return None, None
+    vect = TfidfVectorizer(ngram_range=(1, 2), max_features=20000)
+    return vect, normalize(vect.fit_transform(texts))
+
+def _install_ticket_index(index):
+    global TICKET_SIM
+    TICKET_SIM = vect, matrix = tuple(index)
+    if SHARED is not None and matrix is not None:
+        SHARED.publish_matrix("ticket_index", vect, matrix)
+
+TICKET_INDEX = singleflight.SingleFlight("ticket_index", _fit_ticket_index, _install_ticket_index,
+                                         min_interval=REBUILD_DEBOUNCE, lock=_write_lock)
 
 def build_ticket_index():
-    global TICKET_VECT, TICKET_MATRIX
-    texts = [f"{t['subject']}\n{t['body']}" for t in TICKETS]
-    if not texts:
-        TICKET_VECT = TICKET_MATRIX = None
-        return
-    TICKET_VECT = TfidfVectorizer(ngram_range=(1, 2), max_features=20000)
-    TICKET_MATRIX = normalize(TICKET_VECT.fit_transform(texts))
+    """Refit now, on this thread. Writes that only add or edit tickets request a refit instead."""
+    TICKET_INDEX.run()
 
+@_writes
 def add_ticket(subject: str, body: str, tri: Dict[str, Any], attachments: Optional[List[Dict[str, Any]]] = None, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    nid = (max([t["id"] for t in TICKETS]) + 1) if TICKETS else 1
+    nid = _next_id("tickets", TICKETS)
     t = {
         "id": nid, "subject": subject, "body": body,
         "service": tri["service"], "assignment_group": tri["assignment_group"],
@@ -252,122 +460,335 @@ def add_ticket(subject: str, body: str, tri: Dict[str, Any], attachments: Option
         "location": extra.get("location") if extra else "",
         "asset": extra.get("asset") if extra else "",
         "urgency": extra.get("urgency") if extra else "Medium",
-        "worklogs": [],
         "assigned_to": extra.get("assigned_to") if extra else "",
     }
     TICKETS.append(t)
     _save_json(TICKETS_JSON, TICKETS)
-    build_ticket_index()
+    TICKET_INDEX.request()
+    ticket_changed(t)
     return t
 
+@_writes
 def update_ticket_status(ticket_id: int, status: str):
-    for t in TICKETS:
-        if t["id"] == ticket_id:
-            t["status"] = status
-            _save_json(TICKETS_JSON, TICKETS)
-            return t
-    return None
+    t = TICKETS.get(ticket_id)
+    if t is None:
+        return None
+    t["status"] = status
+    _stamp_closed(t)
+    _save_json(TICKETS_JSON, TICKETS)
+    ticket_changed(t)
+    if status == "resolved":
+        learn_from(t)
+    return t
 
+# ------------- Online learning -------------
+# Resolved and retriaged tickets are labelled examples; when online_learning is on they are
+# trained into the online model in micro-batches and each batch becomes a new checkpoint
+# that utils serves from.
+def _swap_model(model):
+    import utils  # pandas/joblib; only needed once the learner actually runs
+    utils.set_online_model(model)
+
+LEARNER = online.OnlineLearner(online.ONLINE_DIR, lock=SHARED.write_lock if SHARED is not None else None, on_swap=_swap_model)
+
+def configure_learning(cfg: Dict[str, Any]):
+    LEARNER.batch_size = max(1, int(cfg.get("online_batch_size", DEFAULT_CONFIG["online_batch_size"])))
+    LEARNER.checkpoint_every = float(cfg.get("online_checkpoint_seconds", DEFAULT_CONFIG["online_checkpoint_seconds"]))
+    if cfg.get("online_learning") and not LEARNER.enabled:
+        import utils
+        LEARNER.classes, LEARNER.baseline = utils.offline_classes(), utils.classify_batch_offline
+        LEARNER.start()
+
+def learn_from(t: Dict[str, Any]):
+    if not LEARNER.enabled:
+        return
+    LEARNER.observe(f"{t.get('subject', '')}\n{t.get('body', '')}", online.offline_labels(t, LEARNER.classes))
+
+def learning_status() -> Dict[str, Any]:
+    m = LEARNER.model
+    return {"enabled": LEARNER.enabled, "version": online.latest_version(online.ONLINE_DIR),
+            "versions": online.versions(online.ONLINE_DIR), "pending": LEARNER.pending,
+            "promoted": bool(getattr(m, "promoted", False)), "gate": getattr(m, "gate", {}), **LEARNER.stats}
+
+# Worklog notes live in their own append-only log; listings only carry worklog_count.
+def load_worklogs():
+    WORKLOGS.load(repair=True)  # init() holds the write lock
+    embedded = [t for t in TICKETS if "worklogs" in t]
+    if embedded:
+        WORKLOGS.extend(dict(w, ticket_id=t["id"]) for t in embedded for w in t.pop("worklogs") or [])
+        for t in embedded:
+            TICKET_JSON.invalidate(t["id"])
+        _save_json(TICKETS_JSON, TICKETS)
+        bump_version("worklogs")
+
+@_writes
+def add_worklog(ticket_id: int, author: str, note: str) -> Dict[str, Any] | None:
+    if TICKETS.get(ticket_id) is None:
+        return None
+    rec = WORKLOGS.append(ticket_id, author, note)
+    bump_version("worklogs")
+    return rec
+
+def get_worklog(ticket_id: int, offset: int = 0, limit: int = 50) -> Dict[str, Any]:
+    return {"items": WORKLOGS.page(ticket_id, offset, limit), "total": WORKLOGS.total(ticket_id), "offset": offset, "limit": limit}
+
+@_writes
 def merge_tickets(source_id: int, dup_ids: List[int]):
     changed = 0
-    for t in TICKETS:
-        if t["id"] in dup_ids and t["id"] != source_id:
+    for tid in dict.fromkeys(dup_ids):
+        t = TICKETS.get(tid)
+        if t is not None and tid != source_id:
             t["status"] = "merged"
             t["merged_into"] = source_id
+            _stamp_closed(t)
+            ticket_changed(t)
             changed += 1
     if changed:
         _save_json(TICKETS_JSON, TICKETS)
-        build_ticket_index()
+        TICKET_INDEX.request()
     return {"merged": changed}
 
-def dedup(query: str, k: int = 3):
-    if TICKET_VECT is None or TICKET_MATRIX is None:
-        return []
-    q = normalize(TICKET_VECT.transform([query]))
-    sims = (TICKET_MATRIX @ q.T).toarray().ravel()
-    idxs = np.argsort(sims)[::-1][:k]
-    return [{"ticket_id": TICKETS[i]["id"], "similarity": float(sims[i])} for i in idxs]
-
-def similar_to_ticket(ticket_id: int, k: int = 3):
-    target = next((t for t in TICKETS if t["id"] == ticket_id), None)
+# Similarity search runs over (service, status class) partitions of the ticket index; merged
+# tickets are never suggested. Scopes: service (that service's open and resolved tickets and
+# archive), open (every service's open tickets), all (every open and resolved ticket, both
+# tiers), auto (the service's open tickets first, widening to its resolved ones, other
+# services' open then resolved ones and finally the archive only while fewer than k matches
+# reach dedup_similarity).
+DEDUP_SCOPES = ("auto", "service", "open", "all")
+
+def _parts() -> Tuple[Optional[TfidfVectorizer], partitions.PartitionIndex]:
+    """The vectorizer and partitions of one fit: a query transformed by the one always fits
+    the other's rows, even while a refit is installed."""
+    global TICKET_PARTS
+    with _PARTS_LOCK:
+        vect, m = TICKET_SIM
+        P = TICKET_PARTS
+        if P.matrix is not m or m is None:
+            P = partitions.PartitionIndex()
+            P.rebuild(TICKETS[:m.shape[0]] if m is not None else [], m)  # tickets added since the fit are not rows yet
+            TICKET_PARTS = P
+    return vect, P
+
+def _dedup_steps(P: partitions.PartitionIndex, service: Optional[str], scope: str) -> List[Any]:
+    if scope == "open":
+        return [P.keys(classes=("open",))]
+    if scope == "service" and service:
+        return [P.keys(service), ("archive", service)]
+    if scope != "auto":
+        return [P.keys(), ("archive", None)]
+    if not service:
+        return [P.keys(classes=("open",)), P.keys(classes=("resolved",)), ("archive", None)]
+    return [P.keys(service, ("open",)), P.keys(service, ("resolved",)), P.keys(service, ("open",), others=True),
+            P.keys(service, ("resolved",), others=True), ("archive", None)]
+
+def dedup(query: str, k: int = 3, service: Optional[str] = None, scope: str = "auto"):
+    if scope not in DEDUP_SCOPES:
+        raise ValueError(f"scope must be one of {', '.join(DEDUP_SCOPES)}")
+    vect, P = _parts()
+    q = normalize(vect.transform([query])) if vect is not None and P.matrix is not None else None
+    res: List[Dict[str, Any]] = []
+    for step in _dedup_steps(P, service, scope):
+        if isinstance(step, tuple):  # each tier scores against its own vocabulary; both are cosines in [0, 1]
+            hits = ARCHIVE.search(query, k, step[1]) if len(ARCHIVE) else []
+        else:
+            hits = P.search(q, step, k) if q is not None else []
+        res += [{"ticket_id": tid, "similarity": sim} for tid, sim in hits]
+        if scope == "auto" and sum(r["similarity"] >= DEDUP_SIMILARITY for r in res) >= k:
+            break
+    res.sort(key=lambda r: -r["similarity"])
+    return res[:k]
+
+def similar_to_ticket(ticket_id: int, k: int = 3, scope: str = "auto"):
+    target = get_ticket(ticket_id)
     if not target:
         return []
     text = f"{target.get('subject', '')}\n{target.get('body', '')}"
-    res = dedup(text, k + 1)
+    res = dedup(text, k + 1, target.get("service"), scope)
     return [r for r in res if r["ticket_id"] != ticket_id][:k]
 
+def similarity_status() -> Dict[str, Any]:
+    return {"partitions": _parts()[1].sizes(), "archived": len(ARCHIVE), "dedup_similarity": DEDUP_SIMILARITY, "scopes": list(DEDUP_SCOPES)}
+
+@_writes
 def add_deflection(subject: str, body: str, article_doc_id: Optional[int]):
     DEFLECTIONS.append({"subject": subject, "body": body, "article_doc_id": article_doc_id, "ts": datetime.now(timezone.utc).isoformat()})
     _save_json(DEFLECTIONS_JSON, DEFLECTIONS)
 
+@_writes
 def clear_deflections():
     global DEFLECTIONS
     DEFLECTIONS = []
     _save_json(DEFLECTIONS_JSON, DEFLECTIONS)
 
 def metrics():
+    cold = ARCHIVE.counts()["status"]
     return {
-        "tickets": len(TICKETS),
+        "tickets": len(TICKETS) + len(ARCHIVE),
         "deflections": len(DEFLECTIONS),
-        "merged": len([t for t in TICKETS if t.get("status") == "merged"]),
-        "resolved": len([t for t in TICKETS if t.get("status") == "resolved"]),
+        "merged": len([t for t in TICKETS if t.get("status") == "merged"]) + cold.get("merged", 0),
+        "resolved": len([t for t in TICKETS if t.get("status") == "resolved"]) + cold.get("resolved", 0),
+        "archived": len(ARCHIVE),
     }
 def get_mi_for_ticket(ticket_id: int) -> dict | None:
-    for mi in MI:
-        if ticket_id in mi.get("members", []):
-            return mi
-    return None
+    mids = MI_INDEX.for_ticket(ticket_id)
+    return MI.get(mids[0]) if mids else None
 def compute_sla_risk(t: Dict[str, Any]) -> float:
-    pr = (t.get("priority") or "P3").upper()
-    base = 0.9 if pr == "P1" else (0.7 if pr == "P2" else 0.4)
-    try:
-        age_h = (datetime.now(timezone.utc) - datetime.fromisoformat(t.get("created_at"))).total_seconds() / 3600.0
-    except Exception:
-        age_h = 0.0
-    penalty = 0.2 if age_h >= 8 else (0.1 if age_h >= 4 else 0.0)
-    return float(min(1.0, base + penalty))
-
-def list_tickets(q: Optional[str] = None, service: Optional[str] = None, status: Optional[str] = None, sort: Optional[str] = None):
-    rows = [dict(t) for t in TICKETS]
-    for t in rows:
-        t["risk"] = compute_sla_risk(t)
+    pol = sla.POLICY
+    created = sla.parse_ts(t.get("created_at"))
+    now = sla.now_ts()
+    return pol.risk_one(pol.code(t.get("priority")), now if created != created else created, now)
+
+@_writes
+def _sla_escalate(fired: List[Tuple[int, int, bool]]):
+    """Apply the milestones one scheduler tick fired: one tickets.json write for all of them."""
+    changed, notes = {}, []
+    for ticket_id, level, last in fired:
+        t = TICKETS.get(ticket_id)
+        if not t or not sla.is_open(t):
+            continue
+        pr = (t.get("priority") or "P3").upper()
+        hours = sla.POLICY.th[sla.POLICY.code(pr)][level] / 3600.0
+        t["sla_level"] = level + 1
+        msg = f"SLA: ticket #{ticket_id} ({pr}) is {hours:g}h old: {t.get('subject', '')}"
+        if last and pr[1:].isdigit() and int(pr[1:]) > 1:
+            t["priority"] = f"P{int(pr[1:]) - 1}"
+            t["priority_source"] = "sla"  # retriage leaves it alone
+            msg += f" - escalated to {t['priority']}"
+        changed[ticket_id] = t
+        notes.append((t, msg))
+    if not changed:
+        return
+    _save_json(TICKETS_JSON, TICKETS)
+    for t in changed.values():
+        ticket_changed(t)
+    fallback = _load_json(CONFIG_JSON, DEFAULT_CONFIG).get("sla_escalation_user", "agent1")
+    for t, msg in notes:
+        NOTIFICATIONS.add(t.get("assigned_to") or fallback, msg, "warning")
+    bump_version("notifications")
+
+SLA_SCHEDULER = scheduler.SlaScheduler(_sla_escalate, sync=sync_shared if SHARED is not None else None)
+
+def _select_tickets(q: Optional[str] = None, service: Optional[str] = None, status: Optional[str] = None, sort: Optional[str] = None, limit: Optional[int] = None,
+                    in_mi: Optional[bool] = None, include_archived: Optional[bool] = None):
+    """include_archived=None reads the archive only when that stays bounded: a closed status
+    was asked for, or a limit caps how many blocks are read (not with risk sort or in_mi)."""
+    st = (status or "").lower()
+    if sort == "risk" and st == "open" and not q and not service and in_mi is None:
+        return RISK_INDEX.top(limit, status_open=True)
+    rows = TICKETS
     if q:
         ql = q.lower()
         rows = [t for t in rows if ql in (t.get("subject", "").lower() + " " + t.get("body", "").lower())]
     if service:
         rows = [t for t in rows if (t.get("service") or "").lower() == service.lower()]
-    if status and status.lower() != "all":
-        rows = [t for t in rows if (t.get("status") or "").lower() == status.lower()]
+    if st and st != "all":
+        rows = [t for t in rows if (t.get("status") or "").lower() == st]
+    bounded = limit is not None and sort != "risk" and in_mi is None
+    if include_archived is None:
+        include_archived = st in sla.CLOSED_STATUSES or bounded
+    if include_archived and len(ARCHIVE) and (not st or st == "all" or st in sla.CLOSED_STATUSES):
+        cold = _archived_rows(q, service, st, limit if bounded else None, rows)
+        if cold:  # risk ties keep id order, as with a single tier
+            rows = sorted(list(rows) + cold, key=lambda t: t["id"]) if sort == "risk" else list(rows) + cold
+    if in_mi is not None:
+        mask = MI_INDEX.in_active(np.fromiter((t["id"] for t in rows), dtype=np.int64, count=len(rows)))
+        rows = [t for t, m in zip(rows, mask.tolist()) if m == in_mi]
+    risks = sla.risk_for(rows)
     if sort == "risk":
-        rows.sort(key=lambda x: x.get("risk", 0.0), reverse=True)
+        order = np.argsort(-risks, kind="stable")
     else:
-        rows.sort(key=lambda x: x["id"], reverse=True)
-    return rows
+        order = np.argsort(-np.fromiter((t["id"] for t in rows), dtype=np.int64, count=len(rows)), kind="stable")
+    if limit is not None:
+        order = order[:limit]
+    return [(rows[i], float(risks[i])) for i in order]
+
+def _archived_rows(q: Optional[str], service: Optional[str], st: str, limit: Optional[int], hot: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Archived tickets passing the list filters. Segments whose counts rule them out are not
+    read, and with a limit only as many blocks as can still beat the hot rows are."""
+    ql, svc = (q or "").lower(), (service or "").lower()
+    st = "" if st == "all" else st
+
+    def skip(meta):
+        c = meta["counts"]
+        return bool((svc and svc not in {k.lower() for k in c["service"]}) or (st and st not in {k.lower() for k in c["status"]}))
+
+    def match(t):
+        return ((not ql or ql in (t.get("subject", "").lower() + " " + t.get("body", "").lower()))
+                and (not svc or (t.get("service") or "").lower() == svc) and (not st or (t.get("status") or "").lower() == st))
+
+    known = np.fromiter((t["id"] for t in hot), dtype=np.int64, count=len(hot)) if limit is not None else None
+    return ARCHIVE.select(match, skip, limit, known)
+
+def list_tickets(q: Optional[str] = None, service: Optional[str] = None, status: Optional[str] = None, sort: Optional[str] = None, limit: Optional[int] = None,
+                 in_mi: Optional[bool] = None, include_archived: Optional[bool] = None):
+    out = []
+    for t, risk in _select_tickets(q, service, status, sort, limit, in_mi, include_archived):
+        r = dict(t); r["risk"] = risk; r["worklog_count"] = WORKLOGS.total(t["id"])
+        out.append(r)
+    return out
+
+def list_tickets_json(q: Optional[str] = None, service: Optional[str] = None, status: Optional[str] = None, sort: Optional[str] = None, limit: Optional[int] = None,
+                      in_mi: Optional[bool] = None, include_archived: Optional[bool] = None) -> bytes:
+    """Same rows as list_tickets, assembled from cached per-ticket JSON fragments."""
+    total = WORKLOGS.total
+    return TICKET_JSON.join(((t, b',"risk":%s,"worklog_count":%d' % (repr(risk).encode(), total(t["id"])))
+                             for t, risk in _select_tickets(q, service, status, sort, limit, in_mi, include_archived)), keep=_is_hot)
+
+def _is_hot(t: Dict[str, Any]) -> bool:
+    return "archived_at" not in t  # archived rows are encoded per request, not cached
+
+@_writes
+def _apply_retriage(changes: List[Dict[str, Any]]):
+    for c in changes:
+        t = TICKETS.get(c["id"])
+        if t is None:
+            continue
+        for f, (_, new) in c["changes"].items():
+            t[f] = new
+        if "priority" in c["changes"]:
+            t.pop("priority_source", None)
+        ticket_changed(t)
+        if "service" in c["changes"] or "priority" in c["changes"]:  # not the model's own ml_* guesses
+            learn_from(t)
+    _save_json(TICKETS_JSON, TICKETS)
+
+def start_retriage(mode: str = "missing", dry_run: bool = False, use_model: bool = False, wait: bool = False,
+                   overwrite_priority: bool = False) -> Dict[str, Any]:
+    if mode not in retriage.MODES:
+        raise ValueError(f"unknown retriage mode: {mode}")
+    rows = TICKETS
+    if mode == "missing":
+        rows = [t for t in TICKETS if (not t.get("service")) or (not t.get("assignment_group")) or (t.get("triage_confidence") is None)]
+    items = [(t["id"], f"{t.get('subject', '')}\n{t.get('body', '')}") for t in rows]
+    params = {"mode": mode, "dry_run": dry_run, "use_model": use_model, "overwrite_priority": overwrite_priority}
+    return retriage.start(items, TICKETS.get, _apply_retriage, dry_run=dry_run, use_model=use_model, wait=wait, params=params,
+                          overwrite_priority=overwrite_priority)
+
+def _retriage_missing():
+    job = start_retriage("missing", wait=True)
+    if job["error"]:
+        raise RuntimeError(job["error"])
+    return {"updated": job["result"]["updated"], "total": len(TICKETS)}
+
+RETRIAGE = singleflight.SingleFlight("retriage_missing", _retriage_missing)
 
 def retriage_missing():
-    changed = 0
-    for t in TICKETS:
-        if (not t.get("service")) or (not t.get("assignment_group")) or (t.get("triage_confidence") is None):
-            tri = services.classify(f"{t.get('subject', '')}\n{t.get('body', '')}")
-            t["service"] = tri["service"]
-            t["assignment_group"] = tri["assignment_group"]
-            t["priority"] = tri["priority"]
-            t["triage_confidence"] = tri["confidence"]
-            changed += 1
-    if changed:
-        _save_json(TICKETS_JSON, TICKETS)
-        build_ticket_index()
-    return {"updated": changed, "total": len(TICKETS)}
+    """Concurrent callers share the pass already running rather than each starting one."""
+    return RETRIAGE.run(join=True)
 
+def rebuild_status() -> Dict[str, Any]:
+    return {f.name: f.status() for f in (TICKET_INDEX, KB_INDEX, RETRIAGE)}
+
+@_writes
 def generate_kb_from_ticket(ticket_id: int) -> Dict[str, Any]:
-    t = next((x for x in TICKETS if x["id"] == ticket_id), None)
+    t = get_ticket(ticket_id)
     if not t:
         return {"ok": False, "error": "not_found"}
     slug = f"kb_ticket_{ticket_id}.md"
     p = KB_DIR / slug
     body = f"# {t.get('subject', 'Ticket ' + str(ticket_id))}\n\nSymptoms:\n- {t.get('body', '(not provided)')}\n\nFix steps:\n1. Apply known steps.\n2. Verify and close.\n"
     p.write_text(body, encoding="utf-8")
-    load_kb()
+    KB_INDEX.request()  # searchable once the (debounced) rebuild lands
     return {"ok": True, "kb_file": str(p)}
 
 # ------------- Services / Changes / Spike detection -------------
@@ -381,29 +802,81 @@ def load_services():
         "Email/Outlook": {"depends_on": ["Exchange","Search"], "users_affected": 400}
     })
     _save_json(SERVICES_JSON, SERVICES)
+    SERVICE_GRAPH.load(SERVICES)
 
 def load_changes():
-    global CHANGES
-    CHANGES = _load_json(CHANGES_JSON, [])
+    CHANGES.reset(_load_json(CHANGES_JSON, []))
     _save_json(CHANGES_JSON, CHANGES)
+    CHANGE_CAL.load(CHANGES)
+
+BLAST_LIST_MAX = 50  # names listed per blast radius; counts are always complete
 
 def get_service_meta(service: str) -> Dict[str, Any]:
     s = SERVICES.get(service or "", {})
-    return {"users_affected": s.get("users_affected", 50), "depends_on": s.get("depends_on", [])}
+    dependents = SERVICE_GRAPH.dependents(service or "")
+    return {"users_affected": s.get("users_affected", 50), "depends_on": s.get("depends_on", []),
+            "total_users_affected": SERVICE_GRAPH.users_affected(service) if service in SERVICE_GRAPH else s.get("users_affected", 50),
+            "dependents": dependents[:BLAST_LIST_MAX], "dependent_count": len(dependents),
+            "upstream": SERVICE_GRAPH.depends_on(service or "")[:BLAST_LIST_MAX]}
+
+def service_impact(component: str) -> Dict[str, Any]:
+    """If `component` goes down: every service depending on it, the users behind them and
+    the open tickets already raised against any of them."""
+    impacted = SERVICE_GRAPH.impacted([component])
+    tickets = RISK_INDEX.for_services(impacted)
+    return {"component": component, "known": component in SERVICE_GRAPH, "users_affected": SERVICE_GRAPH.users_affected(component),
+            "services": impacted[:BLAST_LIST_MAX], "service_count": len(impacted),
+            "open_tickets": [t["id"] for t in tickets[:BLAST_LIST_MAX]], "open_ticket_count": len(tickets)}
+
+@_writes
+def upsert_service(name: str, depends_on: List[str], users_affected: int) -> Dict[str, Any]:
+    SERVICES[name] = dict(SERVICES.get(name, {}), depends_on=list(depends_on), users_affected=int(users_affected))
+    _save_json(SERVICES_JSON, SERVICES)
+    SERVICE_GRAPH.set_service(name, depends_on, users_affected)
+    return SERVICES[name]
+
+@_writes
+def delete_service(name: str) -> bool:
+    if SERVICES.pop(name, None) is None:
+        return False
+    _save_json(SERVICES_JSON, SERVICES)
+    SERVICE_GRAPH.load(SERVICES)
+    return True
 
 def get_recent_change(service: str) -> Dict[str, Any] | None:
-    if not CHANGES: return None
-    svc = (service or "").lower()
-    items = [c for c in CHANGES if isinstance(c, dict) and (c.get("service","").lower()==svc)]
-    if not items: return None
-    items.sort(key=lambda x: x.get("ts",""), reverse=True)
-    return items[0]
+    """The service's latest change that has started (a scheduled one is not "recent" yet)."""
+    return CHANGE_CAL.latest(service, until=sla.now_ts())
+
+@_writes
+def add_change(service: str, title: str, start: str | None = None, end: str | None = None, **extra) -> Dict[str, Any] | None:
+    c = dict(extra, service=service, title=title, ts=start or datetime.now(timezone.utc).isoformat())
+    if end:
+        c["end"] = end
+    if change_index.window(c) is None:
+        return None
+    c = {"id": _next_id("changes", CHANGES), **c}
+    CHANGES.append(c)
+    _save_json(CHANGES_JSON, CHANGES)
+    CHANGE_CAL.add(c)
+    return c
+
+def list_changes(service: str | None = None, hours: float = 24.0, at: float | None = None) -> List[Dict[str, Any]]:
+    """Changes whose window overlaps the `hours` before `at` (default now), newest first."""
+    at = sla.now_ts() if at is None else at
+    return CHANGE_CAL.between([service] if service else CHANGE_CAL.services(), at - hours * 3600, at)
+
+def suspect_changes(services: Iterable[str], at: float | None = None, k: int = 5) -> List[Dict[str, Any]]:
+    """Changes on `services` or anything they depend on within the lookback, best suspects first."""
+    at = sla.now_ts() if at is None else at
+    deps = {s: SERVICE_GRAPH.depends_on(s) for s in dict.fromkeys(services) if s}
+    return CHANGE_CAL.correlate(deps, at, CHANGE_LOOKBACK_HOURS * 3600, k)
 
 def load_counters():
     global COUNTERS
     COUNTERS = _load_json(COUNTERS_JSON, [])
     _save_json(COUNTERS_JSON, COUNTERS)
 
+@_writes
 def bump_counter(service: str):
     COUNTERS.append({"ts": datetime.now(timezone.utc).isoformat(), "service": service or "Unknown"})
     if len(COUNTERS) > 500:
@@ -418,117 +891,350 @@ def get_spikes(window_minutes: int = 60) -> List[Dict[str, Any]]:
     by_svc: Dict[str, int] = {}
     for e in recent:
         by_svc[e["service"]] = by_svc.get(e["service"], 0) + 1
-    return [{"service": s, "count": c, "window_min": window_minutes} for s, c in by_svc.items() if c >= 10]
+    spikes = [{"service": s, "count": c, "window_min": window_minutes} for s, c in by_svc.items() if c >= 10]
+    shared = SERVICE_GRAPH.common_upstream(s["service"] for s in spikes)  # a component several spiking services sit on
+    for sp in spikes:
+        upstream = set(SERVICE_GRAPH.depends_on(sp["service"]))
+        sp["users_affected"] = SERVICE_GRAPH.users_affected(sp["service"])
+        sp["shared_upstream"] = [{"component": c, "services": n} for c, n in shared if c in upstream][:10]
+        sp["suspect_changes"] = suspect_changes([sp["service"]])
+    return spikes
 
 # ------------- Approvals / JIT Elevation / Actions exec -------------
 def load_approvals():
-    global APPROVALS
-    APPROVALS = _load_json(APPROVALS_JSON, [])
+    APPROVALS.reset(_load_json(APPROVALS_JSON, []))
     _save_json(APPROVALS_JSON, APPROVALS)
 
 def save_approvals():
     _save_json(APPROVALS_JSON, APPROVALS)
 
-def add_approval(action_id: str, params: Dict[str, Any], requested_by: str, require_elevation: bool = False, elevation_token: Optional[str] = None) -> Dict[str, Any]:
-    aid = (max([a.get("id", 0) for a in APPROVALS]) + 1) if APPROVALS else 1
+@_writes
+def add_approval(action_id: str, params: Dict[str, Any], requested_by: str, require_elevation: bool = False, elevation_token: Optional[str] = None,
+                 execution: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    aid = _next_id("approvals", APPROVALS)
     item = {
         "id": aid, "action_id": action_id, "params": params,
         "requested_by": requested_by, "status": "pending",
         "ts": datetime.now(timezone.utc).isoformat(),
         "require_elevation": require_elevation, "elevation_token": elevation_token, "logs": []
     }
+    if execution:
+        item["execution"] = execution
     APPROVALS.append(item); save_approvals(); return item
 
+@_writes
 def update_approval(aid: int, approved: bool, reviewer: str) -> Dict[str, Any] | None:
-    for a in APPROVALS:
-        if a["id"] == aid:
-            a["status"] = "approved" if approved else "denied"
-            a["reviewer"] = reviewer
-            a["ts_decided"] = datetime.now(timezone.utc).isoformat()
-            save_approvals()
-            return a
-    return None
-
+    a = APPROVALS.get(aid)
+    if a is None:
+        return None
+    a["status"] = "approved" if approved else "denied"
+    a["reviewer"] = reviewer
+    a["ts_decided"] = datetime.now(timezone.utc).isoformat()
+    save_approvals()
+    return a
+
+@_writes
 def exec_approval(aid: int, runner) -> Dict[str, Any] | None:
-    for a in APPROVALS:
-        if a["id"] == aid and a.get("status") == "approved":
-            if a.get("require_elevation"):
-                tok = a.get("elevation_token")
-                if not is_elevated(tok):
-                    a["logs"].append("[DENIED] No valid elevation token.")
-                    save_approvals()
-                    return a
-            a["logs"] += runner(a.get("action_id"), a.get("params") or {})
-            a["status"] = "executed"
-            a["ts_executed"] = datetime.now(timezone.utc).isoformat()
+    a = APPROVALS.get(aid)
+    if a is None or a.get("status") != "approved":
+        return None
+    if not _elevation_ok(a):
+        return a
+    a["logs"] += runner(a.get("action_id"), a.get("params") or {})
+    a["status"] = "executed"
+    a["ts_executed"] = datetime.now(timezone.utc).isoformat()
+    save_approvals()
+    return a
+
+def _elevation_ok(a: Dict[str, Any]) -> bool:
+    if a.get("require_elevation") and not is_elevated(a.get("elevation_token")):
+        a["logs"].append("[DENIED] No valid elevation token.")
+        save_approvals()
+        return False
+    return True
+
+APPROVAL_FLUSH_INTERVAL = 0.5
+
+@_writes
+def exec_approval_fanout(aid: int, targets: List[Dict[str, Any]], fan_out) -> Dict[str, Any] | None:
+    """Run an approved action once per target in the background. Per-target logs and counts
+    are written into the approval as targets finish (flushed at most every APPROVAL_FLUSH_INTERVAL);
+    the final status is executed, partial or failed."""
+    a = APPROVALS.get(aid)
+    if a is None or a.get("status") != "approved":
+        return None
+    if not _elevation_ok(a):
+        return a
+    ex = a.get("execution") or {}
+    job = jobs.new_job("action", total=len(targets), params={"approval": aid, "action_id": a.get("action_id")})
+    a["status"] = "running"
+    a["job_id"] = job["id"]
+    a["targets"] = {"total": len(targets), "done": 0, "ok": 0, "failed": 0, "timeout": 0}
+    a["ts_started"] = datetime.now(timezone.utc).isoformat()
+    save_approvals()
+    last_flush = [time.monotonic()]
+
+    @_writes
+    def record(res: Dict[str, Any]):
+        rec = APPROVALS.get(aid) or a  # another worker may have reloaded APPROVALS
+        rec["logs"].append(f"[{res['target']}] {res['status'].upper()} ({res['ms']:g} ms)")
+        rec["logs"] += [f"  {line}" for line in res["logs"]]
+        rec["targets"]["done"] += 1
+        rec["targets"][res["status"]] += 1
+        job["done"] += 1
+        if time.monotonic() - last_flush[0] >= APPROVAL_FLUSH_INTERVAL:
+            last_flush[0] = time.monotonic()
             save_approvals()
-            return a
-    return None
+
+    @_writes
+    def finish(counts: Optional[Dict[str, int]], error: Optional[str] = None):
+        rec = APPROVALS.get(aid) or a
+        if error:
+            rec["logs"].append(f"[ERROR] {error}")
+        ok = (counts or {}).get("ok", 0)
+        rec["status"] = "executed" if not error and ok == len(targets) else ("partial" if ok else "failed")
+        rec["ts_executed"] = datetime.now(timezone.utc).isoformat()
+        save_approvals()
+        jobs.finish(job, result=rec["targets"], error=error)
+
+    def _run():
+        try:
+            counts = fan_out(a["action_id"], targets, record, concurrency=int(ex.get("concurrency", 16)),
+                             timeout=float(ex.get("timeout_s", 30)), rate=ex.get("rate_per_s"))
+            finish(counts)
+        except Exception as e:
+            finish(None, f"{type(e).__name__}: {e}")
+
+    threading.Thread(target=_run, daemon=True).start()
+    return a
 
 def list_approvals() -> List[Dict[str, Any]]:
     return sorted(APPROVALS, key=lambda x: (x.get("status") != "pending", x["id"]), reverse=False)
 
 def load_elevations():
-    global ELEVATIONS
-    ELEVATIONS = _load_json(ELEVATIONS_JSON, [])
-    _save_json(ELEVATIONS_JSON, ELEVATIONS)
+    ELEVATIONS.load(_load_json(ELEVATIONS_JSON, []))
+    ELEVATIONS.gc()
+    _save_json(ELEVATIONS_JSON, ELEVATIONS.records())
 
+@_writes
 def request_elevation(user: str, scope: str, minutes: int = 15) -> Dict[str, Any]:
     token = uuid.uuid4().hex
-    exp = datetime.now(timezone.utc).timestamp() + minutes * 60
-    ELEVATIONS.append({"token": token, "user": user, "scope": scope, "exp": exp})
-    _save_json(ELEVATIONS_JSON, ELEVATIONS)
+    now = datetime.now(timezone.utc).timestamp()
+    exp = now + minutes * 60
+    ELEVATIONS.gc(now)
+    ELEVATIONS.add({"token": token, "user": user, "scope": scope, "exp": exp})
+    _save_json(ELEVATIONS_JSON, ELEVATIONS.records())
     return {"token": token, "exp": exp}
 
 def is_elevated(token: Optional[str]) -> bool:
-    if not token: return False
-    for e in ELEVATIONS:
-        if e.get("token") == token and datetime.now(timezone.utc).timestamp() <= e.get("exp", 0):
-            return True
-    return False
+    return ELEVATIONS.get(token) is not None
+
+@_writes
+def gc_tokens() -> Dict[str, int]:
+    """Drop expired magic links, elevations and sessions; only rewrites the files that shrank."""
+    now = datetime.now(timezone.utc).timestamp()
+    out = {"magic": MAGIC.gc(now), "elevations": ELEVATIONS.gc(now), "sessions": SESSIONS.gc(now)}
+    if out["magic"]:
+        save_magic()
+    if out["elevations"]:
+        _save_json(ELEVATIONS_JSON, ELEVATIONS.records())
+    if out["sessions"]:
+        _save_json(SESSIONS_JSON, SESSIONS.records())
+    return out
 
 # ------------- Major Incident clustering -------------
 def load_mi():
-    global MI
-    MI = _load_json(MI_JSON, [])
+    MI.reset(_load_json(MI_JSON, []))
+    MI_INDEX.rebuild(MI)
     _save_json(MI_JSON, MI)
 
 def save_mi():
     _save_json(MI_JSON, MI)
 
-def cluster_for_ticket(ticket_id: int, th: float = 0.85) -> List[int]:
-    target = next((t for t in TICKETS if t["id"] == ticket_id), None)
-    if not target or TICKET_VECT is None or TICKET_MATRIX is None:
+def cluster_for_ticket(ticket_id: int, th: float = 0.85, scope: str = "service") -> List[int]:
+    """Open and resolved tickets at least `th` similar: the seed's service only, or with scope "all" every service."""
+    target = TICKETS.get(ticket_id)
+    vect, P = _parts()
+    if not target or vect is None or P.matrix is None:
         return []
     text = f"{target.get('subject','')}\n{target.get('body','')}"
-    q = normalize(TICKET_VECT.transform([text]))
-    sims = (TICKET_MATRIX @ q.T).toarray().ravel()
-    ids = []
-    for idx, sim in enumerate(sims):
-        if TICKETS[idx]["id"] != ticket_id and sim >= th:
-            ids.append(TICKETS[idx]["id"])
-    return ids
-
-def create_mi(seed_ticket_id: int, th: float = 0.85) -> Dict[str, Any]:
-    mid = (max([m.get("id", 0) for m in MI]) + 1) if MI else 1
-    members = [seed_ticket_id] + cluster_for_ticket(seed_ticket_id, th=th)
-    mi = {"id": mid, "seed": seed_ticket_id, "members": sorted(set(members)), "created_at": datetime.now(timezone.utc).isoformat()}
-    MI.append(mi); save_mi(); return mi
+    q = normalize(vect.transform([text]))
+    keys = P.keys(target.get("service")) if scope == "service" else P.keys()
+    return [tid for tid in P.above(q, keys, th) if tid != ticket_id]
+
+def _new_mi(seed_ticket_id: int, members: List[int]) -> Dict[str, Any]:
+    mid = _next_id("mi", MI)
+    mi = {"id": mid, "seed": seed_ticket_id, "members": mi_index.as_members(members).tolist(), "status": "active",
+          "created_at": datetime.now(timezone.utc).isoformat()}
+    MI.append(mi)
+    MI_INDEX.add(mi)
+    return mi
+
+@_writes
+def create_mi(seed_ticket_id: int, th: float = 0.85, scope: str = "service") -> Dict[str, Any]:
+    TICKET_INDEX.flush()  # membership is saved: it must see tickets created since the last refit
+    members = [seed_ticket_id] + cluster_for_ticket(seed_ticket_id, th=th, scope=scope)
+    mi = _new_mi(seed_ticket_id, members)
+    save_mi()
+    seed = get_ticket(seed_ticket_id)
+    return dict(mi, suspect_changes=suspect_changes([seed.get("service")] if seed else []))
+
+def cluster_backlog(th: float = 0.85, merge_th: float = 0.95, min_size: int = 3, apply: bool = False) -> Dict[str, Any]:
+    """Cluster all open tickets in a worker process; with apply, proposals not overlapping an existing MI become MIs."""
+    TICKET_INDEX.flush()
+    m = TICKET_SIM[1]
+    rows = [i for i, t in enumerate(TICKETS[:m.shape[0]] if m is not None else []) if sla.is_open(t)]
+    X = m[rows] if m is not None and rows else None
+    ids = [TICKETS[i]["id"] for i in rows]
+
+    @_writes
+    def _apply(res: Dict[str, Any]) -> Dict[str, Any]:
+        if apply and res["groups"]:
+            res["created_mi"] = []
+            for g in res["groups"]:
+                if not MI_INDEX.overlaps(g["members"]):
+                    res["created_mi"].append(_new_mi(g["seed"], g["members"])["id"])
+            save_mi()
+        return res
+
+    params = {"threshold": th, "merge_threshold": merge_th, "min_size": min_size, "apply": apply}
+    return jobs.submit("mi_cluster", clustering.cluster, X, ids, th, merge_th, min_size, params=params, on_done=_apply)
+
+@_writes
+def merge_mi(target_id: int, source_ids: List[int]) -> Dict[str, Any] | None:
+    """Fold the members of source MIs into target; sources stay on record as merged."""
+    target = MI.get(target_id)
+    if target is None:
+        return None
+    members = MI_INDEX.members.get(target_id, mi_index.as_members([]))
+    for sid in dict.fromkeys(source_ids):
+        src = MI.get(sid)
+        if src is None or sid == target_id:
+            continue
+        members = mi_index.union(members, MI_INDEX.members.get(sid, mi_index.as_members([])))
+        src["status"], src["merged_into"] = "merged", target_id
+        MI_INDEX.update(src)
+    target["members"] = members.tolist()
+    MI_INDEX.update(target)
+    save_mi()
+    return target
 
 def list_mi() -> List[Dict[str, Any]]:
     return sorted(MI, key=lambda x: x["id"], reverse=True)
 
+def mi_impact(mi_id: int) -> Dict[str, Any] | None:
+    """Services an MI's tickets were raised against, the users behind them and their dependents,
+    and the components those services share (likely common causes)."""
+    mi = MI.get(mi_id)
+    if mi is None:
+        return None
+    by_svc: Dict[str, int] = {}
+    for tid in mi["members"]:
+        t = get_ticket(tid)
+        if t is not None and t.get("service"):
+            by_svc[t["service"]] = by_svc.get(t["service"], 0) + 1
+    return {"mi": mi_id, "services": by_svc, "users_affected": SERVICE_GRAPH.users_affected_by(by_svc),
+            "common_upstream": [{"component": c, "services": n} for c, n in SERVICE_GRAPH.common_upstream(by_svc)[:10]],
+            "suspect_changes": suspect_changes(by_svc, at=sla.parse_ts(mi.get("created_at")))}
+
+# ------------- Outbox (outbound deliveries) -------------
+OUTBOX_KEEP_DONE = 1000
+
+def load_outbox():
+    OUTBOX.reset(_load_json(OUTBOX_JSON, []))
+    _save_json(OUTBOX_JSON, OUTBOX)
+
+@_writes
+def add_outbox(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    item = {
+        "id": uuid.uuid4().hex, "kind": kind, "payload": payload, "status": "pending", "attempts": 0,
+        "next_at": datetime.now(timezone.utc).timestamp(), "created_at": datetime.now(timezone.utc).isoformat(),
+        "result": None, "error": None,
+    }
+    OUTBOX.append(item)
+    _save_json(OUTBOX_JSON, OUTBOX)
+    return item
+
+@_writes
+def update_outbox(oid: str, **fields) -> Dict[str, Any] | None:
+    item = OUTBOX.get(oid)
+    if item is None:
+        return None
+    item.update(fields)
+    done = [o for o in OUTBOX if o["status"] != "pending"]
+    if len(done) > OUTBOX_KEEP_DONE:
+        drop = {o["id"] for o in done[:len(done) - OUTBOX_KEEP_DONE]}
+        OUTBOX.reset([o for o in OUTBOX if o["id"] not in drop])
+    _save_json(OUTBOX_JSON, OUTBOX)
+    return item
+
+def get_outbox(oid: str) -> Dict[str, Any] | None:
+    return OUTBOX.get(oid)
+
+def due_outbox(kind: str, now: float, limit: int = 100) -> List[Dict[str, Any]]:
+    return [o for o in OUTBOX if o["kind"] == kind and o["status"] == "pending" and o["next_at"] <= now][:limit]
+
+def next_outbox_at(kind: str) -> Optional[float]:
+    return min((o["next_at"] for o in OUTBOX if o["kind"] == kind and o["status"] == "pending"), default=None)
+
 # ------------- Config -------------
+def config_error(key: str, value: Any) -> Optional[str]:
+    """Why `value` cannot be used for config `key`, or None. Keys without a default are free-form."""
+    default = DEFAULT_CONFIG.get(key)
+    if key == "sla_policy":
+        try:
+            sla.Policy(value)
+        except (TypeError, ValueError, AttributeError) as e:
+            return f"sla_policy: {type(e).__name__}: {e}"
+    elif isinstance(default, bool):
+        if not isinstance(value, bool):
+            return f"{key} must be true or false"
+    elif isinstance(default, (int, float)):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return f"{key} must be a number"
+    elif isinstance(default, dict) and not isinstance(value, dict):
+        return f"{key} must be an object"
+    elif isinstance(default, str) and not isinstance(value, str):
+        return f"{key} must be a string"
+    return None
+
+def _checked_config(cfg: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """cfg with defaults for missing keys and for values config_error rejects; and those keys."""
+    cfg = dict(cfg) if isinstance(cfg, dict) else {}
+    fixed = []
+    for k, default in DEFAULT_CONFIG.items():
+        err = config_error(k, cfg[k]) if k in cfg else "missing"
+        if err:
+            if err != "missing":
+                log.warning("config %s; using the default", err)
+            cfg[k] = copy.deepcopy(default)
+            fixed.append(k)
+    return cfg, fixed
+
 def load_config() -> Dict[str, Any]:
-    cfg = _load_json(CONFIG_JSON, DEFAULT_CONFIG)
-    for k, v in DEFAULT_CONFIG.items():
-        if k not in cfg:
-            cfg[k] = v
-    _save_json(CONFIG_JSON, cfg)
+    cfg, fixed = _checked_config(_load_json(CONFIG_JSON, DEFAULT_CONFIG))
+    if fixed or not CONFIG_JSON.exists():  # a write bumps "config": every worker reloads and rearms
+        _save_json(CONFIG_JSON, cfg)
     return cfg
 
+@_writes
 def save_config(cfg: Dict[str, Any]):
+    """Apply and persist cfg; ValueError (nothing saved) if a value config_error rejects."""
+    global DEDUP_SIMILARITY, CHANGE_LOOKBACK_HOURS
+    errors = [e for e in (config_error(k, v) for k, v in cfg.items()) if e]
+    if errors:
+        raise ValueError("; ".join(errors))
     _save_json(CONFIG_JSON, cfg)
+    if "sla_policy" in cfg:
+        set_sla_policy(cfg["sla_policy"])
+    configure_learning(cfg)
+    DEDUP_SIMILARITY = float(cfg.get("dedup_similarity", DEFAULT_CONFIG["dedup_similarity"]))
+    CHANGE_LOOKBACK_HOURS = float(cfg.get("change_lookback_hours", DEFAULT_CONFIG["change_lookback_hours"]))
+
+def set_sla_policy(spec: Optional[Dict[str, Dict[str, Any]]]):
+    sla.set_policy(spec)
+    RISK_INDEX.rebuild(TICKETS)
+    SLA_SCHEDULER.rearm_all(TICKETS)
 
 def metrics_breakdown() -> Dict[str, Any]:
     svc: Dict[str, int] = {}
@@ -538,6 +1244,10 @@ def metrics_breakdown() -> Dict[str, Any]:
         svc[t.get("service") or "Unknown"] = svc.get(t.get("service") or "Unknown", 0) + 1
         pri[t.get("priority") or "P3"] = pri.get(t.get("priority") or "P3", 0) + 1
         st[t.get("status") or "open"] = st.get(t.get("status") or "open", 0) + 1
+    cold = ARCHIVE.counts()
+    for counts, field in ((svc, "service"), (pri, "priority"), (st, "status")):
+        for key, n in cold[field].items():
+            counts[key] = counts.get(key, 0) + n
     return {"service": svc, "priority": pri, "status": st}
 
 def metrics_series(hours: int = 24) -> Dict[str, Any]:
@@ -549,7 +1259,7 @@ def metrics_series(hours: int = 24) -> Dict[str, Any]:
     # Fix buckets properly:
     buckets = [now.replace(hour=((now.hour - (hours-1-i)) % 24)) - (datetime.now(timezone.utc)-now) for i in range(hours)]
     # Fallback simpler approach: compute by delta hours
-    buckets = [ (now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=(hours-1-i))) for i in range(hours) ]  # type: ignore
+    buckets = [ (now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=(hours-1-i))) for i in range(hours) ]
 
     # Aggregate counters into hour buckets
     from collections import defaultdict
@@ -573,14 +1283,329 @@ def metrics_series(hours: int = 24) -> Dict[str, Any]:
                 break
     return {"items": by_bucket}
 
+# ------------- Archive -------------
+# Tickets closed for longer than archive_after_days leave the working set for an archive
+# segment, so memory, the similarity index and boot time follow the open volume. Lookups,
+# dedup, listings and metrics read both tiers; archived tickets are read-only.
+@_writes
+def archive_tickets(days: Optional[float] = None, force: bool = False) -> Dict[str, Any]:
+    """Move tickets closed more than `days` (default: config) ago into one new archive segment.
+    Fewer than archive_min_batch candidates wait for the next run unless `force`."""
+    cfg = load_config()
+    days = cfg.get("archive_after_days") if days is None else days
+    if not days or days <= 0:
+        return {"archived": 0}
+    cutoff = sla.now_ts() - days * 86400
+    due = [t for t in TICKETS if not sla.is_open(t) and sla.parse_ts(t.get("closed_at") or t.get("created_at")) <= cutoff]
+    if not due or (len(due) < cfg.get("archive_min_batch", 0) and not force):
+        return {"archived": 0, "due": len(due)}
+    stamp = datetime.now(timezone.utc).isoformat()
+    ARCHIVE.append([dict(t, archived_at=stamp) for t in due])
+    gone = {t["id"] for t in due}
+    TICKETS.reset([t for t in TICKETS if t["id"] not in gone])
+    _save_json(TICKETS_JSON, TICKETS)
+    build_ticket_index()
+    for tid in gone:
+        TICKET_JSON.invalidate(tid)
+    bump_version("archive")
+    seg = ARCHIVE.segments[-1]
+    return {"archived": len(gone), "segment": seg["name"], "size": seg["path"].stat().st_size, "hot": len(TICKETS), "total_archived": len(ARCHIVE)}
+
+def archive_status() -> Dict[str, Any]:
+    return {"hot": len(TICKETS), "archived": len(ARCHIVE),
+            "segments": [{"name": s["name"], "tickets": s["meta"]["count"], "min_id": s["meta"]["min_id"], "max_id": s["meta"]["max_id"],
+                          "size": s["path"].stat().st_size} for s in ARCHIVE.segments]}
+
+# ------------- Snapshots -------------
+# Compressed point-in-time copies of every collection plus the fitted similarity indexes.
+# Where fork() exists a child process writes the snapshot: the OS copies pages only as the
+# parent touches them, so the child serialises a frozen image while writers carry on.
+SNAPSHOT_CHUNK = 100_000
+SNAPSHOT_FORK = hasattr(os, "fork") and os.environ.get("TICKETPILOT_SNAPSHOT_FORK", "1") != "0"
+_SNAPSHOT_JOB: Optional[Dict[str, Any]] = None
+
+def _slim(vect: Optional[TfidfVectorizer]) -> Optional[TfidfVectorizer]:
+    """Drop stop_words_ (every pruned term; not needed to transform) before pickling."""
+    if vect is None or not hasattr(vect, "stop_words_"):
+        return vect
+    v = copy.copy(vect)
+    del v.stop_words_
+    return v
+
+def _snapshot_sections():
+    for i in range(0, len(TICKETS), SNAPSHOT_CHUNK):
+        yield f"tickets/{i // SNAPSHOT_CHUNK}", "pickle", TICKETS[i:i + SNAPSHOT_CHUNK]
+    for name, (var, _, _) in _RELOAD.items():
+        obj = globals()[var]
+        yield f"coll/{name}", "pickle", list(obj) if isinstance(obj, collection.Collection) else obj
+    yield "config", "pickle", _load_json(CONFIG_JSON, DEFAULT_CONFIG)
+    yield "magic", "pickle", MAGIC.records()
+    yield "elevations", "pickle", ELEVATIONS.records()
+    if WORKLOGS_JSONL.exists():
+        with open(WORKLOGS_JSONL, "rb") as f:
+            yield "file/worklogs.jsonl", "raw", f.read(WORKLOGS.offset)  # append-only: the indexed prefix is consistent
+    for p in sorted(NOTIFICATIONS_DIR.glob("*")) + sorted(KB_DIR.glob("*.md")):
+        if p.is_file() and not p.name.startswith("."):
+            yield f"file/{p.relative_to(DATA_DIR).as_posix()}", "raw", p.read_bytes()
+    yield "archive", "pickle", ARCHIVE.names()  # segments are immutable: naming them is enough
+    vect, matrix = TICKET_SIM
+    yield "index/tickets", "pickle", (_slim(vect), matrix)
+    vect, matrix, chunks, docs = KB
+    yield "index/kb", "pickle", (_slim(vect), matrix, docs, chunks)
+
+def _write_snapshot(path: Path, codec: str, sections, meta: Dict[str, Any], encoded: bool = False) -> Dict[str, Any]:
+    w = snapshot.Writer(path, codec, meta)
+    try:
+        for name, kind, obj in sections:
+            (w.add_encoded if encoded else w.add)(name, kind, obj)
+        return w.close()
+    except BaseException:
+        w.abort()
+        raise
+
+def start_snapshot(codec: Optional[str] = None, wait: bool = False) -> Dict[str, Any]:
+    """Snapshot all state in the background (one at a time); returns the job."""
+    global _SNAPSHOT_JOB
+    if _SNAPSHOT_JOB is not None and _SNAPSHOT_JOB["status"] == "running":
+        return _SNAPSHOT_JOB
+    codec = codec or snapshot.DEFAULT_CODEC
+    if codec not in snapshot.CODECS:
+        raise ValueError(f"codec {codec!r} not available (have {sorted(snapshot.CODECS)})")
+    path = snapshot.new_path(SNAPSHOT_DIR)
+    job = _SNAPSHOT_JOB = jobs.new_job("snapshot", params={"path": str(path), "codec": codec, "fork": SNAPSHOT_FORK})
+    t0 = time.perf_counter()
+    pid, sections = None, None
+    with SHARED.write_lock() if SHARED is not None else nullcontext():
+        refresh()
+        TICKET_INDEX.flush()  # the indexes saved must cover every ticket / article saved
+        KB_INDEX.flush()
+        meta = {"tickets": len(TICKETS), "boot": BOOT}
+        if SNAPSHOT_FORK:
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    _write_snapshot(path, codec, _snapshot_sections(), meta)
+                    code = 0
+                except BaseException:
+                    traceback.print_exc()
+                finally:
+                    os._exit(code)
+        else:  # serialising is the copy; compression and I/O happen off the lock
+            sections = [(n, k, snapshot.encode(k, o)) for n, k, o in _snapshot_sections()]
+    paused = time.perf_counter() - t0
+
+    def run():
+        try:
+            if pid is not None:
+                code = os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+                if code != 0:
+                    raise RuntimeError(f"snapshot writer exited with status {code}")
+                man = snapshot.read_manifest(path)
+            else:
+                man = _write_snapshot(path, codec, sections, meta, encoded=True)
+            cfg = load_config()
+            removed = snapshot.prune(SNAPSHOT_DIR, cfg["snapshot_keep"], cfg["snapshot_keep_daily"])
+            jobs.finish(job, {"path": str(path), "size": path.stat().st_size, "raw_size": sum(s["raw_size"] for s in man["sections"]),
+                              "sections": len(man["sections"]), "tickets": man["meta"]["tickets"], "paused_ms": round(paused * 1000, 1),
+                              "seconds": round(time.perf_counter() - t0, 2), "pruned": removed})
+        except Exception as e:
+            jobs.finish(job, error=f"{type(e).__name__}: {e}")
+
+    th = threading.Thread(target=run, name="snapshot", daemon=True)
+    th.start()
+    if wait:
+        th.join()
+    return job
+
+def list_snapshots() -> List[Dict[str, Any]]:
+    return snapshot.list_snapshots(SNAPSHOT_DIR)
+
+def snapshot_if_due():
+    minutes = load_config().get("snapshot_interval_minutes") or 0
+    if minutes <= 0:
+        return None
+    snaps = snapshot.list_snapshots(SNAPSHOT_DIR)
+    if snaps and time.time() - snaps[0]["mtime"] < minutes * 60:
+        return None
+    return start_snapshot(wait=True)
+
+def restore_snapshot(path: Path, persist: bool = True) -> Dict[str, Any]:
+    """Replace all state with a snapshot's, without refitting any index. With persist the data
+    files are rewritten too, so later boots (and other workers) load the restored state."""
+    t0 = time.perf_counter()
+    gc.disable()  # millions of fresh dicts would otherwise trigger full collection after full collection
+    try:
+        _restore(path, persist)
+    finally:
+        gc.enable()
+    return {"snapshot": path.name, "tickets": len(TICKETS), "seconds": round(time.perf_counter() - t0, 2)}
+
+def _restore(path: Path, persist: bool):
+    global TICKET_SIM, KB
+    tickets, files, segments = [], set(), []
+    save = _save_json if persist else (lambda path, data: None)
+    for name, kind, obj in snapshot.read(path):
+        group, _, key = name.partition("/")
+        if group == "tickets":
+            tickets.extend(obj)
+        elif group == "coll" and key in _RELOAD:
+            var, p, _ = _RELOAD[key]
+            if isinstance(globals()[var], collection.Collection):
+                globals()[var].reset(obj)
+            else:
+                globals()[var] = obj
+            save(p, obj)
+        elif name == "config":
+            save(CONFIG_JSON, obj)
+            sla.set_policy(_checked_config(obj)[0]["sla_policy"])
+        elif name == "magic":
+            MAGIC.load(obj)
+            save(MAGIC_JSON, obj)
+        elif name == "elevations":
+            ELEVATIONS.load(obj)
+            save(ELEVATIONS_JSON, obj)
+        elif group == "file":
+            dest = DATA_DIR / key
+            files.add(dest)
+            if persist:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+                tmp.write_bytes(obj)
+                os.replace(tmp, dest)
+        elif name == "archive":
+            segments = obj
+        elif name == "index/tickets":
+            TICKET_SIM = tuple(obj)
+        elif name == "index/kb":
+            vect, matrix, docs, chunks = obj
+            KB = (vect, matrix, chunks, docs)
+    TICKETS.reset(tickets)
+    if persist:
+        for p in list(NOTIFICATIONS_DIR.glob("*")) + list(KB_DIR.glob("*.md")):
+            if p.is_file() and not p.name.startswith(".") and p not in files:
+                p.unlink()
+        for p in ARCHIVE_DIR.glob(f"seg-*{snapshot.SUFFIX}"):  # written after the snapshot; their tickets are hot in it
+            if p.name not in segments:
+                p.unlink()
+        _save_json(TICKETS_JSON, TICKETS)
+    ARCHIVE.load(segments)
+    TICKET_INDEX.installed()
+    KB_INDEX.installed()
+    TICKET_JSON.clear()
+    RISK_INDEX.rebuild(TICKETS)
+    SLA_SCHEDULER.rearm_all(TICKETS)
+    MI_INDEX.rebuild(MI)
+    SERVICE_GRAPH.load(SERVICES)
+    CHANGE_CAL.load(CHANGES)
+    WORKLOGS.load()
+    NOTIFICATIONS.load()
+    if SHARED is not None and TICKET_SIM[1] is not None:
+        with SHARED.write_lock():
+            SHARED.publish_matrix("ticket_index", *TICKET_SIM)
+    if persist:
+        for name in ("ticket_index", "kb", "worklogs", "notifications", "archive"):
+            bump_version(name)
+
+# ------------- Multi-worker refresh -------------
+_RELOAD = {
+    "deflections": ("DEFLECTIONS", DEFLECTIONS_JSON, []), "users": ("USERS", USERS_JSON, []),
+    "approvals": ("APPROVALS", APPROVALS_JSON, []), "mi": ("MI", MI_JSON, []), "counters": ("COUNTERS", COUNTERS_JSON, []),
+    "services": ("SERVICES", SERVICES_JSON, {}), "changes": ("CHANGES", CHANGES_JSON, []),
+    "outbox": ("OUTBOX", OUTBOX_JSON, []), "sequences": ("SEQUENCES", SEQUENCES_JSON, {}),
+}
+
+def refresh():
+    """Reload collections another worker has written since we last looked. Cheap when nothing changed."""
+    global TICKET_SIM, TICKET_PARTS, DEDUP_SIMILARITY, CHANGE_LOOKBACK_HOURS
+    if SHARED is None:
+        return
+    stale = SHARED.stale()
+    if not stale:
+        return
+    for name in sorted(stale, key=lambda n: n != "tickets"):
+        gen = SHARED.generation(name)
+        if name == "tickets":
+            TICKETS.reset(_load_json(TICKETS_JSON, []))
+            TICKET_JSON.clear()
+            TICKET_PARTS = partitions.PartitionIndex()  # rows follow the new list; searches in flight keep the old one
+            RISK_INDEX.rebuild(TICKETS)
+            SLA_SCHEDULER.rearm_all(TICKETS)
+        elif name == "ticket_index":
+            got = SHARED.attach_matrix("ticket_index")
+            TICKET_SIM = tuple(got) if got is not None else _fit_ticket_index()
+        elif name == "kb":
+            _read_kb()
+        elif name == "worklogs":
+            WORKLOGS.sync()
+        elif name == "archive":
+            ARCHIVE.load()
+        elif name == "notifications":
+            NOTIFICATIONS.sync()
+        elif name == "magic":
+            MAGIC.load(_read_magic())
+        elif name == "elevations":
+            ELEVATIONS.load(_load_json(ELEVATIONS_JSON, []))
+        elif name == "sessions":
+            SESSIONS.load(_load_json(SESSIONS_JSON, []))
+        elif name == "config":
+            cfg = _checked_config(_load_json(CONFIG_JSON, DEFAULT_CONFIG))[0]
+            sla.set_policy(cfg.get("sla_policy"))
+            DEDUP_SIMILARITY = float(cfg.get("dedup_similarity", DEFAULT_CONFIG["dedup_similarity"]))
+            CHANGE_LOOKBACK_HOURS = float(cfg.get("change_lookback_hours", DEFAULT_CONFIG["change_lookback_hours"]))
+            RISK_INDEX.rebuild(TICKETS)
+            SLA_SCHEDULER.rearm_all(TICKETS)
+        elif name in _RELOAD:
+            var, path, default = _RELOAD[name]
+            if isinstance(globals()[var], collection.Collection):
+                globals()[var].reset(_load_json(path, default))
+            else:
+                globals()[var] = _load_json(path, default)
+            if name == "mi":
+                MI_INDEX.rebuild(MI)
+            elif name == "services":
+                SERVICE_GRAPH.load(SERVICES)
+            elif name == "changes":
+                CHANGE_CAL.load(CHANGES)
+        SHARED.mark_seen(name, gen)
+        VERSIONS[name] = gen
+
 # ------------- Init -------------
+def _restore_mark() -> Dict[str, Any]:
+    """What TICKETPILOT_RESTORE has already done to this data dir."""
+    try:
+        mark = fastjson.loads(RESTORED_MARK.read_bytes())
+    except (OSError, ValueError):
+        return {}
+    return mark if isinstance(mark, dict) else {}
+
 def init():
     KB_DIR.mkdir(parents=True, exist_ok=True)
     DATA_DIR.mkdir(parents=True, exist_ok=True)
+    restore = os.environ.get("TICKETPILOT_RESTORE")  # snapshot path, or "latest"; acted on once
+    if restore:
+        path = snapshot.latest(SNAPSHOT_DIR) if restore == "latest" else Path(restore)
+        if path is None:
+            raise RuntimeError(f"TICKETPILOT_RESTORE={restore}: no snapshot in {SNAPSHOT_DIR}")
+        mark = _restore_mark()
+        # Workers of one server share BOOT: the first restores the files, the rest only memory.
+        # A later boot with the variable still set must not roll the data files back again.
+        sibling = mark.get("boot") == BOOT and mark.get("snapshot") == path.name
+        if sibling or (restore not in mark.get("requests", []) and path.name not in mark.get("snapshots", [])):
+            restore_snapshot(path, persist=not sibling)
+            if not sibling:
+                RESTORED_MARK.write_bytes(fastjson.dumps({"boot": BOOT, "snapshot": path.name,
+                                                          "requests": mark.get("requests", []) + [restore],
+                                                          "snapshots": mark.get("snapshots", []) + [path.name]}))
+            save_config(load_config())
+            return
     save_config(load_config())
+    load_sequences()
     load_kb()
     load_tickets()
+    load_worklogs()
     load_users()
+    load_sessions()
     load_notifications()
     load_magic()
     load_services()
@@ -589,9 +1614,14 @@ def init():
     load_approvals()
     load_elevations()
     load_mi()
+    load_outbox()
     try:
         retriage_missing()
     except Exception:
         pass
 
-init()
\ No newline at end of file
+if SHARED is not None:
+    with SHARED.write_lock():
+        init()
+else:
+    init()
@@ -0,0 +1,54 @@
+# backend/tokens.py
+import heapq, time
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+class TokenStore:
+    """Expiring tokens keyed by value. Lookups are a dict hit; an expiry min-heap lets gc()
+    drop expired records without scanning the ones still live."""
+
+    def __init__(self, records: Iterable[Dict[str, Any]] = ()):
+        self.load(records)
+
+    def load(self, records: Iterable[Dict[str, Any]]):
+        self._items: Dict[str, Dict[str, Any]] = {r["token"]: r for r in records if r.get("token")}
+        self._heap: List[Tuple[float, str]] = [(float(r.get("exp") or 0), t) for t, r in self._items.items()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, rec: Dict[str, Any]) -> Dict[str, Any]:
+        self._items[rec["token"]] = rec
+        heapq.heappush(self._heap, (float(rec["exp"]), rec["token"]))
+        return rec
+
+    def get(self, token: Optional[str], now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The record for token, or None if unknown or expired."""
+        rec = self._items.get(token) if token else None
+        if rec is None or float(rec.get("exp") or 0) < (time.time() if now is None else now):
+            return None
+        return rec
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        return bool(self._heap) and self._heap[0][0] < (time.time() if now is None else now)
+
+    def gc(self, now: Optional[float] = None) -> int:
+        """Remove expired records; returns how many were dropped."""
+        now = time.time() if now is None else now
+        heap, items = self._heap, self._items
+        before, budget = len(items), len(heap) // 64
+        while heap and heap[0][0] < now:
+            if budget == 0:  # a large backlog expired at once: one linear rebuild beats popping it all
+                self._items = {t: r for t, r in items.items() if float(r.get("exp") or 0) >= now}
+                self._heap = [(e, t) for e, t in heap if e >= now and t in self._items]
+                heapq.heapify(self._heap)
+                return before - len(self._items)
+            exp, tok = heapq.heappop(heap)
+            budget -= 1
+            rec = items.get(tok)
+            if rec is not None and float(rec.get("exp") or 0) == exp:  # skip heap entries superseded by a re-add
+                del items[tok]
+        return before - len(items)
+
+    def records(self) -> List[Dict[str, Any]]:
+        return list(self._items.values())
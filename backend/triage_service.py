@@ -1,54 +1,148 @@
-from flask import Flask, request, jsonify
-from werkzeug.utils import secure_filename
-import os
-from utils import classify_ticket, suggest_similar_solutions
+import asyncio, os
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import uvicorn
+from utils import classify_batch, suggest_similar_batch
 
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-app = Flask(__name__)
-from flask_cors import CORS
-CORS(app)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Concurrent requests are gathered for up to BATCH_WAIT seconds (or BATCH_MAX texts) and
+# classified / nearest-neighbour searched as one batch. TRIAGE_BATCH_MAX=1 turns it off.
+BATCH_MAX = int(os.environ.get("TRIAGE_BATCH_MAX", "64"))
+BATCH_WAIT = float(os.environ.get("TRIAGE_BATCH_WAIT_MS", "2")) / 1000.0
 
-@app.route('/classify', methods=['POST'])
-def classify_endpoint():
-    data = request.get_json(force=True)
-    text = data.get('text', '')
+TEAM_MAP = {
+    'SCADA': 'SCADA Team',
+    'Communication': 'Network Team',
+    'Database': 'DBA Team',
+    'Security': 'Security Operations',
+    'Configuration': 'Field Engineering'
+}
+
+class MicroBatcher:
+    """Queues items from concurrent callers and runs fn(items) -> results once per batch on a
+    worker thread, so the event loop keeps accepting requests while a batch is scored. If a
+    batch raises, its items are retried one by one so only the failing caller gets the error."""
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch: int = BATCH_MAX, max_wait: float = BATCH_WAIT):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.stats = {"batches": 0, "items": 0, "split": 0}
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last = 0
+
+    async def submit(self, item: Any) -> Any:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, fut))
+        return await fut
+
+    async def _collect(self) -> List[Any]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        # A lone caller after a lone batch is not kept waiting; under load the queue fills
+        # while the previous batch runs, and then it is worth waiting for stragglers.
+        deadline = loop.time() + (self.max_wait if self._last > 1 or not self._queue.empty() else 0.0)
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            left = deadline - loop.time()
+            if left <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), left))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [(item, fut) for item, fut in await self._collect() if not fut.done()]  # skip callers that went away
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(None, self.fn, [item for item, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    if not batch[0][1].done():
+                        batch[0][1].set_exception(e)
+                    continue
+                self.stats["split"] += 1
+                for item, fut in batch:
+                    try:
+                        res = (await loop.run_in_executor(None, self.fn, [item]))[0]
+                    except Exception as e1:
+                        if not fut.done():
+                            fut.set_exception(e1)
+                        continue
+                    if not fut.done():
+                        fut.set_result(res)
+                continue
+            self._last = len(batch)
+            self.stats["batches"] += 1
+            self.stats["items"] += len(batch)
+            for (_, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+def _triage_batch(texts: List[str]) -> List[Dict[str, Any]]:
+    out = []
+    for cls, suggestions in zip(classify_batch(texts), suggest_similar_batch(texts, top_k=3)):
+        out.append({
+            'category': cls['category'],
+            'priority': cls['priority'],
+            'category_confidence': cls['category_conf'],
+            'priority_confidence': cls['priority_conf'],
+            'recommended_team': TEAM_MAP.get(cls['category'], 'General Support'),
+            'suggestions': suggestions
+        })
+    return out
+
+CLASSIFIER = MicroBatcher(classify_batch)
+TRIAGER = MicroBatcher(_triage_batch)
+
+app = FastAPI(title="Triage Service")
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+async def _text(request: Request) -> str:
+    """The request's "text" if it is a non-empty string, else ''."""
+    try:
+        data = await request.json()
+    except ValueError:
+        data = {}
+    text = data.get('text') if isinstance(data, dict) else None
+    return text if isinstance(text, str) and text.strip() else ''
+
+@app.post('/classify')
+async def classify_endpoint(request: Request):
+    text = await _text(request)
     if not text:
-        return jsonify({'error': 'text missing'}), 400
-    cls = classify_ticket(text)
-    return jsonify(cls)
+        return JSONResponse({'error': 'text must be a non-empty string'}, status_code=400)
+    return await CLASSIFIER.submit(text)
 
-@app.route('/triage', methods=['POST'])
-def triage_endpoint():
+@app.post('/triage')
+async def triage_endpoint(request: Request):
     """
     Input: JSON { "text": "...ticket text..." }
     Output: category, priority, suggested fixes (from similar tickets), recommended team
     """
-    data = request.get_json(force=True)
-    text = data.get('text', '')
+    text = await _text(request)
     if not text:
-        return jsonify({'error': 'text missing'}), 400
-    cls = classify_ticket(text)
-    suggestions = suggest_similar_solutions(text, top_k=3)
-    team_map = {
-        'SCADA': 'SCADA Team',
-        'Communication': 'Network Team',
-        'Database': 'DBA Team',
-        'Security': 'Security Operations',
-        'Configuration': 'Field Engineering'
-    }
-    recommended_team = team_map.get(cls['category'], 'General Support')
-    response = {
-        'category': cls['category'],
-        'priority': cls['priority'],
-        'category_confidence': cls['category_conf'],
-        'priority_confidence': cls['priority_conf'],
-        'recommended_team': recommended_team,
-        'suggestions': suggestions
-    }
-    return jsonify(response)
+        return JSONResponse({'error': 'text must be a non-empty string'}, status_code=400)
+    return await TRIAGER.submit(text)
+
+@app.get('/stats')
+def stats_endpoint():
+    return {'classify': CLASSIFIER.stats, 'triage': TRIAGER.stats}
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8001, debug=True)
\ No newline at end of file
+    uvicorn.run(app, host='0.0.0.0', port=8001)
@@ -1,6 +1,10 @@
+import hashlib, re, time
 import joblib
+import numpy as np
+import scipy.sparse as sp
 import pandas as pd
 from sklearn.neighbors import NearestNeighbors
+import online
 
 ARTIFACT_DIR = "artifacts"
 
@@ -12,27 +16,162 @@ def load_pipelines():
     tickets = pd.read_csv(f"{ARTIFACT_DIR}/tickets_for_lookup.csv")
     return cat_pipe, pri_pipe, vect, nn, tickets
 
+_PIPELINES = None
+
+def get_pipelines():
+    """Load the artifacts once per process."""
+    global _PIPELINES
+    if _PIPELINES is None:
+        _PIPELINES = load_pipelines()
+    return _PIPELINES
+
+# Online model (see online.py): once a checkpoint has passed its holdout gate it replaces the
+# offline pipelines for classification (same labels). Swapping is a single reference
+# assignment, so requests in flight keep whichever model they started with.
+ONLINE_POLL = 2.0
+_ONLINE = None
+_ONLINE_CHECKED = 0.0
+
+def set_online_model(model):
+    global _ONLINE
+    _ONLINE = model
+
+def online_model():
+    global _ONLINE_CHECKED
+    now = time.monotonic()
+    if now - _ONLINE_CHECKED >= ONLINE_POLL:
+        _ONLINE_CHECKED = now
+        v = online.latest_version(online.ONLINE_DIR)
+        if v and (_ONLINE is None or _ONLINE.version != v):
+            m = online.load(online.ONLINE_DIR, v)
+            if m is not None:
+                set_online_model(m)
+    m = _ONLINE
+    return m if m is not None and m.ready() and getattr(m, "promoted", False) else None
+
+# Compiled classifier: nlp_train.export_compiled flattens both pipelines into one vocabulary
+# and weight matrix, so classifying is one tokenisation and one sparse dot product instead of
+# four sklearn calls (two transforms each). Ignored when the pipelines changed since export.
+COMPILED_PATH = f"{ARTIFACT_DIR}/classifier_compiled.joblib"
+_COMPILED = None
+
+def pipeline_fingerprint():
+    return {n: hashlib.sha1(open(f"{ARTIFACT_DIR}/{n}_pipeline.joblib", "rb").read()).hexdigest() for n in ("category", "priority")}
+
+def get_compiled():
+    global _COMPILED
+    if _COMPILED is None:
+        try:
+            c = joblib.load(COMPILED_PATH)
+            _COMPILED = c if c.get("source") == pipeline_fingerprint() else False
+        except (OSError, EOFError):
+            _COMPILED = False
+    return _COMPILED or None
+
+def _grams(c, text):
+    toks = re.findall(c["token_pattern"], text.lower() if c["lowercase"] else text)
+    lo, hi = c["ngram_range"]
+    out = list(toks) if lo == 1 else []
+    for k in range(max(lo, 2), hi + 1):
+        out += [" ".join(toks[i:i + k]) for i in range(len(toks) - k + 1)]
+    return out
+
+def classify_compiled(c, texts):
+    """Same output as classify_batch, from an exported compiled classifier."""
+    vocab, W, b, idf = c["vocab"], c["W"], c["b"], c["idf"]
+    (cat_cls, pri_cls), k = c["classes"], len(c["classes"][0])
+    if len(texts) == 1:  # one short text: plain numpy on its few terms beats building a sparse matrix
+        ids, cnt = np.unique(np.array([j for j in map(vocab.get, _grams(c, texts[0])) if j is not None], dtype=np.int64),
+                             return_counts=True)
+        cnt = cnt.astype(np.float32)
+        norm = np.sqrt(np.square(cnt[:, None] * idf[ids]).sum(axis=0, keepdims=True))
+        z = (cnt @ W[ids])[None, :]
+    else:
+        indptr, indices = [0], []
+        for text in texts:
+            indices += [j for j in map(vocab.get, _grams(c, text)) if j is not None]
+            indptr.append(len(indices))
+        X = sp.csr_matrix((np.ones(len(indices), dtype=np.float32), indices, indptr), shape=(len(indptr) - 1, W.shape[0]))
+        X.sum_duplicates()
+        norm = np.sqrt(X.multiply(X) @ np.square(idf))  # per head l2 norm of the tf-idf vector
+        z = X @ W
+    norm[norm == 0] = 1.0
+    z[:, :k] /= norm[:, :1]
+    z[:, k:] /= norm[:, 1:]
+    z += b
+    out = []
+    for cp, pp in zip(_softmax(z[:, :k]), _softmax(z[:, k:])):
+        ci, pi = int(cp.argmax()), int(pp.argmax())
+        out.append({'category': cat_cls[ci], 'category_conf': float(cp[ci]),
+                    'priority': pri_cls[pi], 'priority_conf': float(pp[pi])})
+    return out
+
+def _softmax(z):
+    e = np.exp(z - z.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
 def suggest_similar_solutions(text, top_k=3):
-    cat_pipe, pri_pipe, vect, nn, tickets = load_pipelines()
-    x = vect.transform([text])
-    dists, idxs = nn.kneighbors(x, n_neighbors=top_k)
-    suggestions = []
-    for dist, idx in zip(dists[0], idxs[0]):
-        row = tickets.iloc[idx]
-        suggestions.append({
-            'ticket_id': int(row['ticket_id']),  # <-- cast to int!
-            'category': row['category'],
-            'priority': row['priority'],
-            'text': row['text'],
-            'solution': row.get('solution', '')
-        })
-    return suggestions
+    return suggest_similar_batch([text], top_k)[0]
+
+def suggest_similar_batch(texts, top_k=3):
+    """Nearest past tickets for many texts with one transform and one kneighbors call."""
+    cat_pipe, pri_pipe, vect, nn, tickets = get_pipelines()
+    dists, idxs = nn.kneighbors(vect.transform(texts), n_neighbors=top_k)
+    out = []
+    for row_idxs in idxs:
+        suggestions = []
+        for idx in row_idxs:
+            row = tickets.iloc[idx]
+            suggestions.append({
+                'ticket_id': int(row['ticket_id']),  # <-- cast to int!
+                'category': row['category'],
+                'priority': row['priority'],
+                'text': row['text'],
+                'solution': row.get('solution', '')
+            })
+        out.append(suggestions)
+    return out
 
 def classify_ticket(text):
-    cat_pipe, pri_pipe, *_ = load_pipelines()
+    m = online_model()
+    if m is not None:
+        return m.classify_batch([text])[0]
+    c = get_compiled()
+    if c is not None:
+        return classify_compiled(c, [text])[0]
+    cat_pipe, pri_pipe, *_ = get_pipelines()
     category = cat_pipe.predict([text])[0]
     priority = pri_pipe.predict([text])[0]
     cat_prob = max(cat_pipe.predict_proba([text])[0]) if hasattr(cat_pipe, "predict_proba") else None
     pri_prob = max(pri_pipe.predict_proba([text])[0]) if hasattr(pri_pipe, "predict_proba") else None
     return {'category': category, 'category_conf': float(cat_prob) if cat_prob is not None else None,
-            'priority': priority, 'priority_conf': float(pri_prob) if pri_prob is not None else None}
\ No newline at end of file
+            'priority': priority, 'priority_conf': float(pri_prob) if pri_prob is not None else None}
+
+def classify_batch(texts):
+    m = online_model()
+    if m is not None:
+        return m.classify_batch(list(texts))
+    return classify_batch_offline(texts)
+
+def offline_classes():
+    """Labels per head of the offline classifier, which the online model must stay within."""
+    c = get_compiled()
+    if c is not None:
+        cat, pri = c["classes"]
+    else:
+        cat_pipe, pri_pipe, *_ = get_pipelines()
+        cat, pri = cat_pipe.classes_, pri_pipe.classes_
+    return {"category": [str(x) for x in cat], "priority": [str(x) for x in pri]}
+
+def classify_batch_offline(texts):
+    c = get_compiled()
+    if c is not None:
+        return classify_compiled(c, texts)
+    cat_pipe, pri_pipe, *_ = get_pipelines()
+    cat_p = cat_pipe.predict_proba(texts)
+    pri_p = pri_pipe.predict_proba(texts)
+    out = []
+    for cp, pp in zip(cat_p, pri_p):
+        out.append({'category': cat_pipe.classes_[cp.argmax()], 'category_conf': float(cp.max()),
+                    'priority': pri_pipe.classes_[pp.argmax()], 'priority_conf': float(pp.max())})
+    return out
@@ -0,0 +1,104 @@
+# backend/worklogs.py
+import os, threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Tuple
+import fastjson
+
+class WorklogStore:
+    """Worklog notes for all tickets in one append-only JSON-lines file. Memory holds only
+    (offset, length) of each note per ticket; a page of notes is a few seeks into the log,
+    and appending is one write no matter how many notes a ticket or the store already has.
+    `_lock` keeps the id, offset and write of one append together across request threads."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.RLock()
+        self.load()
+
+    def load(self, repair: bool = False):
+        """Index the log. A torn last line (a crash mid-write, or another process appending
+        right now) is left out; with `repair` it is cut off, which is only safe while holding
+        the lock every writer appends under."""
+        with self._lock:
+            self._load(repair)
+
+    def _load(self, repair: bool):
+        self._spans: Dict[int, List[Tuple[int, int]]] = {}
+        self.count = 0
+        self.offset = 0
+        if self.path.exists():
+            size = self.path.stat().st_size
+            self._index_from(0)
+            if repair and self.offset < size:
+                os.truncate(self.path, self.offset)
+
+    def _index_from(self, offset: int):
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        pos, end = 0, data.rfind(b"\n") + 1
+        while pos < end:
+            nl = data.index(b"\n", pos)
+            if nl > pos:
+                rec = fastjson.loads(data[pos:nl])
+                self._spans.setdefault(rec["ticket_id"], []).append((offset + pos, nl - pos))
+                self.count = max(self.count, rec.get("id", 0))
+            pos = nl + 1
+        self.offset = offset + end
+
+    def sync(self):
+        """Index whatever another process appended since we last looked."""
+        with self._lock:
+            try:
+                size = self.path.stat().st_size
+            except FileNotFoundError:
+                size = 0
+            if size < self.offset:
+                self._load(False)
+            elif size > self.offset:
+                self._index_from(self.offset)
+
+    def append(self, ticket_id: int, author: str, note: str) -> Dict[str, Any]:
+        with self._lock:
+            rec = {"id": self.count + 1, "ticket_id": ticket_id, "author": author, "note": note,
+                   "ts": datetime.now(timezone.utc).isoformat()}
+            line = fastjson.dumps(rec)
+            with open(self.path, "ab") as f:
+                f.write(line + b"\n")
+            self._spans.setdefault(ticket_id, []).append((self.offset, len(line)))
+            self.offset += len(line) + 1
+            self.count += 1
+        return rec
+
+    def extend(self, items: Iterable[Dict[str, Any]]):
+        """Bulk append pre-built notes (migration); ids are reassigned from the sequence."""
+        with self._lock:
+            parts = []
+            for w in items:
+                rec = dict(w, id=self.count + 1)
+                line = fastjson.dumps(rec)
+                self._spans.setdefault(rec["ticket_id"], []).append((self.offset, len(line)))
+                self.offset += len(line) + 1
+                self.count += 1
+                parts.append(line + b"\n")
+            if parts:
+                with open(self.path, "ab") as f:
+                    f.write(b"".join(parts))
+
+    def total(self, ticket_id: int) -> int:
+        return len(self._spans.get(ticket_id, ()))
+
+    def page(self, ticket_id: int, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest first, skipping `offset` notes."""
+        spans = self._spans.get(ticket_id, [])
+        stop = len(spans) - offset
+        sel = spans[max(0, stop - limit):max(0, stop)][::-1]
+        if not sel:
+            return []
+        out = []
+        with open(self.path, "rb") as f:
+            for pos, n in sel:
+                f.seek(pos)
+                out.append(fastjson.loads(f.read(n)))
+        return out
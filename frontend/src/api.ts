@@ -0,0 +1,13 @@
+import axios from "axios"
+
+// Pages share one way to reach the API: every request carries the session token login
+// issued, and the server works out who is calling from that.
+export function client(timeout = 8000){
+  const api = axios.create({ baseURL:"/api", timeout })
+  api.interceptors.request.use(cfg=>{
+    const token = localStorage.getItem("session")
+    if(token) cfg.headers.Authorization = `Bearer ${token}`
+    return cfg
+  })
+  return api
+}
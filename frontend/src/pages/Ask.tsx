@@ -1,9 +1,9 @@
 import React, { useEffect, useState, type ChangeEvent, type KeyboardEvent } from "react"
-import axios from "axios"
+import { client } from "../api"
 import ChatBot from "./ChatBot"
 import { JaroWinklerDistance } from "natural"
 
-const api = axios.create({ baseURL: "/api", timeout: 12000 })
+const api = client(12000)
 
 type LocalImage = { file: File; preview: string; ocr?: string; error?: string }
 
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from "react"
-import axios from "axios"
-const api = axios.create({ baseURL:"/api", timeout:8000 })
+import { client } from "../api"
+const api = client()
 
 type Notice = { id:number; username:string; message:string; type:string; ts:string; link?:string }
 
@@ -1,5 +1,5 @@
 import { useEffect, useMemo, useState } from "react"
-import axios from "axios"
+import { client } from "../api"
 import {
   ResponsiveContainer,
   LineChart, Line, XAxis, YAxis, Tooltip, CartesianGrid,
@@ -8,7 +8,7 @@ import {
   RadialBarChart, RadialBar, Legend
 } from "recharts"
 
-const api = axios.create({ baseURL: "/api", timeout: 8000 })
+const api = client()
 
 type SeriesPoint = { ts: string; total: number; by_service?: Record<string, number> }
 
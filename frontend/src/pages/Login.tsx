@@ -1,7 +1,7 @@
 import React, { useEffect, useState } from "react"
-import axios from "axios"
+import { client } from "../api"
 import { useNavigate } from "react-router-dom"
-const api = axios.create({ baseURL:"/api", timeout:8000 })
+const api = client()
 
 export default function Login(){
   const [username,setUsername]=useState("tech2345")
@@ -22,6 +22,7 @@ export default function Login(){
       const r=await api.post("/auth/login",{username,password})
       if(r.data?.ok){
         localStorage.setItem("role", r.data?.role || "user")
+        localStorage.setItem("session", r.data?.token || "")
         nav(`/dashboard?user=${encodeURIComponent(username)}`)
       }else{
         const reason = r.data?.reason
@@ -1,11 +1,16 @@
 import { useEffect } from "react"
 import { useNavigate } from "react-router-dom"
+import { client } from "../api"
+const api = client()
 
 export default function Logout(){
   const nav = useNavigate()
   useEffect(() => {
-    localStorage.removeItem("role")
-    nav("/login", { replace: true })
+    api.post("/auth/logout").catch(()=>{}).finally(()=>{
+      localStorage.removeItem("role")
+      localStorage.removeItem("session")
+      nav("/login", { replace: true })
+    })
   }, [nav])
   return (
     <div className="container">
@@ -1,6 +1,6 @@
 import React, { useEffect, useMemo, useState } from "react"
-import axios from "axios"
-const api = axios.create({ baseURL:"/api", timeout:8000 })
+import { client } from "../api"
+const api = client()
 
 const ACTIONS = [
   { id: "clear_spooler", label: "Clear Spooler" },
@@ -60,6 +60,9 @@ export default function Resolve(){
     // Get MI membership
     const miRes = await api.get(`/mi/for_ticket/${t.id}`)
     setMi(miRes.data?.mi || null)
+    // Get worklogs (newest first from the API; shown oldest first)
+    const wlRes = await api.get(`/tickets/${t.id}/worklog`, { params: { limit: 50 } })
+    const worklogs = (wlRes.data?.items || []).slice().reverse()
     // Get similar tickets
     const simRes = await api.get(`/tickets/similar/${t.id}?k=5`)
     setSimilar(simRes.data || [])
@@ -71,7 +74,7 @@ export default function Resolve(){
     } else {
       setMiMembers([])
     }
-    setDrawer(t)
+    setDrawer({ ...t, worklogs })
   }
 
   // Merge similar tickets
@@ -6,6 +6,6 @@ export default defineConfig({
   server: {
     port: 5173,
     host: true,
-    proxy: { "/api": { target: "http://localhost:8000", changeOrigin: true } }
+    proxy: { "/api": { target: "http://localhost:8000", changeOrigin: true, xfwd: true } }  // X-Forwarded-For: admission keys anonymous callers by it
   }
 })
\ No newline at end of file